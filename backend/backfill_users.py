@@ -7,15 +7,36 @@ Backfill `uid` field in RSVP docs:
 Usage:
   export GOOGLE_APPLICATION_CREDENTIALS=/path/to/service-account.json
   pip install firebase-admin
-  python backfill_rsvps_uid.py [--dry-run] [--batch-size 400] [--limit N]
+  python backfill_users.py [--dry-run] [--batch-size 400] [--limit N]
+  python backfill_users.py --stream [--page-size 1000] [--checkpoint FILE] [--reset]
+  python backfill_users.py --friend-requests [--dry-run] [--page-size 1000] [--checkpoint FILE] [--reset]
+
+--stream pages through the collection group with start_after cursors, reads
+only the `uid` field, writes through a concurrent BulkWriter and saves the
+last cursor to --checkpoint after every page, so an interrupted run picks up
+where it stopped. A --dry-run never writes the checkpoint, and a page with
+writes that failed is not checkpointed past, so the next run retries it.
+
+--friend-requests sets `fromUid` (the doc id) on /users/*/friendRequests/*
+docs created before it was written, so account deletion can find a user's
+outgoing requests. It always runs in --stream mode.
+
+Other migrations can reuse `Backfill`: subclass it, set `collection_group`
+and `fields`, and implement `fix(snap)` to return the update (or None).
 """
 
 import argparse
+import json
 import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
 from typing import Optional
 
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions
 
 def init_firebase():
     # Requires GOOGLE_APPLICATION_CREDENTIALS env var to be set.
@@ -65,15 +86,170 @@ def backfill(db, dry_run: bool = False, batch_size: int = 400, limit: Optional[i
 
     print(f"Done. Updated {updated} RSVP docs with `uid`.")
 
+# --- Streaming backfill framework ---
+
+class Backfill(ABC):
+    """
+    Cursor-paged, checkpointed, concurrent backfill over a collection group.
+
+    Pages are ordered by document path. Once every write of a page has landed,
+    the path of its last doc is written to the checkpoint file, and a rerun
+    with the same file starts right after it. If any write of a page failed,
+    the run stops there without moving the checkpoint.
+    """
+
+    collection_group: str = ""
+    fields: list = []  # projection; only these fields are read
+
+    def __init__(self, db, checkpoint: Optional[str] = None, page_size: int = 1000,
+                 dry_run: bool = False, limit: Optional[int] = None, max_ops_per_second: int = 5000):
+        self.db = db
+        self.checkpoint = checkpoint
+        self.page_size = page_size
+        self.dry_run = dry_run
+        self.limit = limit
+        self.max_ops_per_second = max_ops_per_second
+        self.stats = {"scanned": 0, "updated": 0, "failed": 0}
+        self._stats_lock = threading.Lock()  # BulkWriter callbacks run on its worker threads
+
+    @abstractmethod
+    def fix(self, snap) -> Optional[dict]:
+        """Return the merge-update for one doc, or None to leave it alone."""
+
+    def _load_cursor(self) -> Optional[str]:
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as f:
+                return json.load(f).get("lastPath")
+        return None
+
+    def _save_cursor(self, path: str):
+        if not self.checkpoint or self.dry_run:
+            return
+        tmp = self.checkpoint + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"lastPath": path, "stats": self.stats, "savedAt": time.time()}, f)
+        os.replace(tmp, self.checkpoint)  # atomic, so a crash never leaves a torn file
+
+    def run(self):
+        query = (
+            self.db.collection_group(self.collection_group)
+            .order_by("__name__")
+            .select(self.fields)
+            .limit(self.page_size)
+        )
+        last_path = self._load_cursor()
+        if last_path:
+            print(f"Resuming after {last_path}")
+
+        writer = None
+        if not self.dry_run:
+            writer = self.db.bulk_writer(BulkWriterOptions(max_ops_per_second=self.max_ops_per_second))
+
+            def on_result(_ref, _result, _writer):
+                with self._stats_lock:
+                    self.stats["updated"] += 1
+
+            def on_error(failure, _writer):
+                if failure.attempts < 5:
+                    return True
+                with self._stats_lock:
+                    self.stats["failed"] += 1
+                return False
+
+            writer.on_write_result(on_result)
+            writer.on_write_error(on_error)
+
+        started = time.monotonic()
+        try:
+            while self.limit is None or self.stats["scanned"] < self.limit:
+                page_query = query.start_after({"__name__": self.db.document(last_path)}) if last_path else query
+                page = list(page_query.stream())
+                if not page:
+                    break
+                failed_before = self.stats["failed"]
+                for snap in page:
+                    update = self.fix(snap)
+                    if update is None:
+                        continue
+                    if writer is not None:
+                        writer.set(snap.reference, update, merge=True)
+                    else:
+                        self.stats["updated"] += 1  # dry run: would be updated
+                self.stats["scanned"] += len(page)
+                if writer is not None:
+                    writer.flush()  # don't checkpoint past writes that haven't landed
+                if self.stats["failed"] > failed_before:
+                    print(f"{self.stats['failed'] - failed_before} writes failed after {last_path or 'the start'}; "
+                          f"stopping so the next run retries this page")
+                    break
+                last_path = page[-1].reference.path
+                self._save_cursor(last_path)
+
+                elapsed = time.monotonic() - started
+                print(f"scanned={self.stats['scanned']} updated={self.stats['updated']} "
+                      f"({self.stats['scanned'] / elapsed:.0f} docs/sec)")
+                if len(page) < self.page_size:
+                    break
+        finally:
+            if writer is not None:
+                writer.close()
+
+        elapsed = time.monotonic() - started
+        rate = self.stats["scanned"] / elapsed if elapsed > 0 else 0.0
+        print(f"Done. {self.stats} in {elapsed:.1f}s ({rate:.0f} docs/sec)"
+              + (" [dry run]" if self.dry_run else ""))
+        return self.stats
+
+class RsvpUidBackfill(Backfill):
+    collection_group = "rsvps"
+    fields = ["uid"]
+
+    def fix(self, snap):
+        # users/{uid}/rsvps/{eventId} mirrors share the collection group; their id is the event's
+        if not snap.reference.path.startswith("events/"):
+            return None
+        # In RSVP subcollection, doc.id is the user's uid
+        if (snap.to_dict() or {}).get("uid"):
+            return None
+        return {"uid": snap.id}
+
+class FriendRequestFromUidBackfill(Backfill):
+    collection_group = "friendRequests"
+    fields = ["fromUid"]
+
+    def fix(self, snap):
+        # requests live in the recipient's inbox under the sender's uid
+        if (snap.to_dict() or {}).get("fromUid"):
+            return None
+        return {"fromUid": snap.id}
+
 def main():
     parser = argparse.ArgumentParser(description="Backfill `uid` field in /events/*/rsvps/* docs.")
     parser.add_argument("--dry-run", action="store_true", help="Scan only; do not write.")
     parser.add_argument("--batch-size", type=int, default=400, help="Writes per batch (<=500).")
     parser.add_argument("--limit", type=int, default=None, help="Optional limit on RSVP docs to scan.")
+    parser.add_argument("--stream", action="store_true", help="Paged, checkpointed, concurrent mode.")
+    parser.add_argument("--page-size", type=int, default=1000, help="Docs per page in --stream mode.")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Cursor file for --stream mode (default: one per backfill).")
+    parser.add_argument("--reset", action="store_true", help="Ignore any saved checkpoint and start over.")
+    parser.add_argument("--friend-requests", action="store_true",
+                        help="Backfill `fromUid` in /users/*/friendRequests/* instead (implies --stream).")
     args = parser.parse_args()
 
     db = init_firebase()
-    backfill(db, dry_run=args.dry_run, batch_size=args.batch_size, limit=args.limit)
+    if args.stream or args.friend_requests:
+        if args.friend_requests:
+            cls, default_checkpoint = FriendRequestFromUidBackfill, "backfill_requests_from_uid.checkpoint.json"
+        else:
+            cls, default_checkpoint = RsvpUidBackfill, "backfill_rsvps_uid.checkpoint.json"
+        checkpoint = args.checkpoint or default_checkpoint
+        if args.reset and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        cls(db, checkpoint=checkpoint, page_size=args.page_size,
+            dry_run=args.dry_run, limit=args.limit).run()
+    else:
+        backfill(db, dry_run=args.dry_run, batch_size=args.batch_size, limit=args.limit)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,12 @@
+"""
+Microbenchmarks for the backend's pure hot paths (no Firestore, no credentials).
+
+    cd backend
+    python -m benchmarks                 # run everything, compare with baselines.json
+    python -m benchmarks -k compressor   # only names containing "compressor"
+    python -m benchmarks --save          # record the current numbers as the baseline
+
+Fixtures are built from a fixed seed and a fixed clock, so runs are repeatable.
+Baselines are machine-specific: re-save them on the machine you compare on
+before measuring a change.
+"""
@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+
+from benchmarks.cases import BENCHMARKS
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+# Slower than baseline by more than this fraction counts as a regression
+DEFAULT_TOLERANCE = 0.25
+REPEAT = 7
+
+
+def measure(fn) -> float:
+    """Best-of-REPEAT time per call in microseconds."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(REPEAT, number)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run backend microbenchmarks.")
+    parser.add_argument("-k", dest="filter", default="", help="Only run benchmarks whose name contains this.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file to compare with / save to.")
+    parser.add_argument("--save", action="store_true", help="Write these results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown before flagging, as a fraction (default 0.25).")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+
+    results = {}
+    regressions = []
+    print(f"{'benchmark':48} {'us/op':>12} {'baseline':>12} {'change':>8}")
+    for name, factory in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        fn = factory()
+        us = measure(fn)
+        base = baseline.get(name)
+        if base and us / base - 1 > args.tolerance:
+            # shared machines are noisy: confirm before flagging
+            us = min(us, measure(fn))
+        results[name] = round(us, 3)
+        if base:
+            change = us / base - 1
+            flag = ""
+            if change > args.tolerance:
+                flag = "  REGRESSION"
+                regressions.append(name)
+            print(f"{name:48} {us:12.2f} {base:12.2f} {change:+8.1%}{flag}")
+        else:
+            print(f"{name:48} {us:12.2f} {'-':>12} {'new':>8}")
+
+    if args.save:
+        saved = dict(baseline)
+        saved.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "results": saved}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved {len(results)} results to {args.baseline}")
+
+    if regressions and not args.save:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
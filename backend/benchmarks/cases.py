@@ -0,0 +1,218 @@
+"""
+Benchmark cases. Each `@bench(name)` function does its setup and returns the
+zero-argument callable that gets timed.
+"""
+
+import random
+from datetime import datetime, timezone
+from typing import Callable, Dict
+
+import json
+
+from fastapi.encoders import jsonable_encoder
+
+import recurrence
+from json_response import dumps, model_response
+from profiles import UserProfile, _defaults_for_new_user, _doc_to_profile
+from string_compressor import FMIndex, RankBitVector, string_compressor
+from user_index import merge_search_results
+
+SEED = 1234
+NOW = datetime(2025, 3, 5, 12, 0, tzinfo=timezone.utc)
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def bench(name: str):
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+
+class _Snap:
+    """Just enough of a DocumentSnapshot for the helpers under test."""
+    __slots__ = ("id", "_data")
+
+    def __init__(self, doc_id: str, data: dict):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+def _rules(rng: random.Random, n: int):
+    days = list(recurrence.DAY_CODES)
+    out = []
+    for _ in range(n):
+        slots = rng.sample(days, rng.randint(1, 4))
+        out.append("".join(f"{d}{rng.randint(0, 23):02d}{rng.choice((0, 15, 30, 45)):02d}" for d in slots))
+    return out
+
+
+def _text(rng: random.Random, n: int) -> str:
+    words = ("club meeting study group workshop free pizza music night campus library career "
+             "fair hackathon room hall students join talk lecture yoga basketball 2025").split()
+    out = []
+    size = 0
+    while size < n:
+        w = rng.choice(words)
+        out.append(w)
+        size += len(w) + 1
+    return " ".join(out)[:n]
+
+
+# --- recurrence ---
+
+@bench("recurrence.getNextOccurance")
+def _():
+    rule = _rules(random.Random(SEED), 1)[0]
+    return lambda: recurrence.getNextOccurance(rule, NOW)
+
+
+@bench("recurrence.compile_rule[uncached]")
+def _():
+    rule = _rules(random.Random(SEED), 1)[0]
+    compile_uncached = recurrence.compile_rule.__wrapped__
+    return lambda: compile_uncached(rule)
+
+
+@bench("recurrence.next_occurrences[1000 events]")
+def _():
+    rng = random.Random(SEED)
+    rules = _rules(rng, 50)
+    pairs = [(f"e{i}", rng.choice(rules)) for i in range(1000)]
+    return lambda: recurrence.next_occurrences(pairs, NOW)
+
+
+# --- users ---
+
+@bench("users.merge_search_results[2x20]")
+def _():
+    rng = random.Random(SEED)
+    people = [_Snap(f"u{i}", {"name": f"user {i}", "email": f"user{i}@umass.edu", "photoURL": "",
+                              "visibility": rng.choice(("campus", "public", "private"))}) for i in range(30)]
+    by_name = people[:20]
+    by_email = people[10:30]
+    return lambda: merge_search_results(by_name + by_email, exclude_uid="u3", limit=20)
+
+
+@bench("users._defaults_for_new_user")
+def _():
+    return lambda: _defaults_for_new_user("uid123", "jdoe@umass.edu", "Jane Doe", "https://example.com/p.png")
+
+
+@bench("users._doc_to_profile")
+def _():
+    data = _defaults_for_new_user("uid123", "jdoe@umass.edu", "Jane Doe", "https://example.com/p.png")
+    data.update(createdAt=NOW, updatedAt=NOW)
+    snap = _Snap("uid123", data)
+    return lambda: _doc_to_profile(snap)
+
+
+@bench("users.UserProfile.model_dump")
+def _():
+    data = _defaults_for_new_user("uid123", "jdoe@umass.edu", "Jane Doe", None)
+    data.update(createdAt=NOW, updatedAt=NOW)
+    profile = UserProfile(**data)
+    return profile.model_dump
+
+
+# --- responses ---
+
+def _friends_page(n: int) -> dict:
+    rng = random.Random(SEED)
+    return {"friends": [{"uid": f"u{i}", "name": f"user {i}", "photoURL": rng.choice((None, f"https://example.com/{i}.png")),
+                         "since": NOW} for i in range(n)], "nextCursor": f"u{n - 1}"}
+
+
+@bench("responses.friends_page[200] jsonable_encoder+json")
+def _():
+    body = _friends_page(200)
+    # what FastAPI did for a returned dict: encoder walk, then JSONResponse's json.dumps
+    return lambda: json.dumps(jsonable_encoder(body), ensure_ascii=False, allow_nan=False,
+                              separators=(",", ":")).encode()
+
+
+@bench("responses.friends_page[200] orjson")
+def _():
+    body = _friends_page(200)
+    return lambda: dumps(body)
+
+
+@bench("responses.profile[response_model]")
+def _():
+    from fastapi._compat import ModelField
+    from pydantic.fields import FieldInfo
+
+    data = _defaults_for_new_user("uid123", "jdoe@umass.edu", "Jane Doe", None)
+    data.update(createdAt=NOW, updatedAt=NOW)
+    profile = UserProfile(**data)
+    field = ModelField(field_info=FieldInfo(annotation=UserProfile), name="Response", mode="serialization")
+    # FastAPI's response_model path: validate the returned model again, then dump it
+    return lambda: json.dumps(field.serialize(field.validate(profile, {}, loc=("response",))[0], mode="json")).encode()
+
+
+@bench("responses.profile[model_response]")
+def _():
+    data = _defaults_for_new_user("uid123", "jdoe@umass.edu", "Jane Doe", None)
+    data.update(createdAt=NOW, updatedAt=NOW)
+    profile = UserProfile(**data)
+    return lambda: model_response(profile).body
+
+
+# --- string_compressor ---
+
+@bench("compressor.RankBitVector.rank1")
+def _():
+    rng = random.Random(SEED)
+    bv = RankBitVector(rng.random() < 0.5 for _ in range(100_000))
+    positions = [rng.randrange(100_000) for _ in range(100)]
+    return lambda: [bv.rank1(i) for i in positions]
+
+
+@bench("compressor.compress[10k chars]")
+def _():
+    text = _text(random.Random(SEED), 10_000)
+    return lambda: string_compressor.balanced(text)
+
+
+@bench("compressor.decompress[10k chars]")
+def _():
+    sc = string_compressor.balanced(_text(random.Random(SEED), 10_000))
+    return sc.decompress
+
+
+@bench("compressor.access+rank+select[100 each]")
+def _():
+    rng = random.Random(SEED)
+    text = _text(rng, 10_000)
+    sc = string_compressor.balanced(text)
+    positions = [rng.randrange(len(text)) for _ in range(100)]
+    chars = [text[i] for i in positions]
+
+    def run():
+        for i, c in zip(positions, chars):
+            sc.access(i)
+            sc.rank(c, i)
+            sc.select(c, 1)
+    return run
+
+
+@bench("compressor.FMIndex.build[20k chars]")
+def _():
+    text = _text(random.Random(SEED), 20_000)
+    return lambda: FMIndex(text)
+
+
+@bench("compressor.FMIndex.count")
+def _():
+    fm = FMIndex(_text(random.Random(SEED), 50_000))
+    return lambda: fm.count("career fair")
+
+
+@bench("compressor.FMIndex.locate[50]")
+def _():
+    fm = FMIndex(_text(random.Random(SEED), 50_000))
+    return lambda: list(fm.locate("pizza", 50))
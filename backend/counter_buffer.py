@@ -0,0 +1,225 @@
+"""
+Write-behind buffer for the friendsCount / pendingCount counters on user docs.
+
+The friend endpoints used to bump these with Increment inside their
+transactions, so every request, accept and unfriend also wrote (and locked) both
+user docs, and popular users' docs became hotspots. Now the transactions only
+touch request and edge docs. The counter deltas are added here once they commit,
+merged per user, and written FLUSH_SECONDS later as one Increment per field,
+many users per batch commit.
+
+Deltas still buffered when a worker dies are lost, and a retried commit whose
+first attempt actually landed counts twice. `reconcile_counts` (a scheduler job)
+recomputes the counters from the subcollections and fixes that drift.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from google.api_core import exceptions as gexc
+from google.cloud import firestore
+
+# Counter field -> subcollection of users/{uid} it counts
+COUNTER_FIELDS = {"friendsCount": "friends", "pendingCount": "friendRequests"}
+# Set with every flush; the reconciler leaves recently touched users alone
+COUNTS_UPDATED_FIELD = "countsUpdatedAt"
+# How long deltas are merged before they are written
+FLUSH_SECONDS = 1.0
+# Users per batch commit (Firestore limit is 500 writes); a full buffer flushes early
+FLUSH_MAX_USERS = 400
+# A user's deltas are dropped (left to the reconciler) after this many failed flushes
+FLUSH_MAX_ATTEMPTS = 5
+
+RECONCILE_PAGE_SIZE = 300
+RECONCILE_WORKERS = 8
+# Users whose counters changed this recently may still have deltas in flight
+RECONCILE_QUIET_SECONDS = 60
+
+
+class CounterBuffer:
+    def __init__(self, client, collection: str = "users", window: float = FLUSH_SECONDS):
+        self._db = client
+        self._col = collection
+        self._window = window
+        self._pending: Dict[str, Dict[str, int]] = {}  # uid -> field -> delta
+        self._attempts: Dict[str, int] = {}  # uid -> failed flushes so far
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats = {"added": 0, "coalesced": 0, "flushes": 0, "writes": 0, "dropped": 0, "errors": 0}
+
+    def add(self, uid: str, **deltas: int):
+        """Queue counter deltas for uid, e.g. add(uid, friendsCount=1, pendingCount=-1)."""
+        deltas = {field: d for field, d in deltas.items() if d}
+        if not deltas:
+            return
+        entry = self._pending.get(uid)
+        if entry is None:
+            entry = self._pending[uid] = {}
+        else:
+            self.stats["coalesced"] += 1
+        for field, d in deltas.items():
+            entry[field] = entry.get(field, 0) + d
+        self.stats["added"] += 1
+        self._wakeup.set()
+        if len(self._pending) >= FLUSH_MAX_USERS:
+            self._full.set()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Stop the worker, flushing anything still buffered."""
+        if self._task is not None:
+            # not cancelled: a commit in flight would lose its deltas
+            self._stopping = True
+            self._wakeup.set()
+            self._full.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _loop(self):
+        while not self._stopping:
+            await self._wakeup.wait()
+            # merge for one window from the first delta, unless the buffer fills up first
+            try:
+                await asyncio.wait_for(self._full.wait(), self._window)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        items = [(uid, deltas) for uid, deltas in pending.items() if any(deltas.values())]
+        if not items:
+            return
+        self.stats["flushes"] += 1
+        for i in range(0, len(items), FLUSH_MAX_USERS):
+            chunk = items[i:i + FLUSH_MAX_USERS]
+            failed = {uid for uid, _ in await self._commit(chunk)}
+            for uid, deltas in chunk:
+                if uid in failed:
+                    self._requeue(uid, deltas)
+                else:
+                    self._attempts.pop(uid, None)
+
+    def _fields(self, deltas: Dict[str, int]) -> dict:
+        fields = {field: firestore.Increment(d) for field, d in deltas.items() if d}
+        fields[COUNTS_UPDATED_FIELD] = firestore.SERVER_TIMESTAMP
+        return fields
+
+    async def _commit(self, chunk: List[Tuple[str, Dict[str, int]]]) -> List[Tuple[str, Dict[str, int]]]:
+        """Write one chunk; returns the entries that weren't written."""
+        users = self._db.collection(self._col)
+        batch = self._db.batch()
+        for uid, deltas in chunk:
+            # update, not set: a deleted user must not come back as a doc holding only counters
+            batch.update(users.document(uid), self._fields(deltas))
+        try:
+            await batch.commit()
+            self.stats["writes"] += len(chunk)
+            return []
+        except gexc.NotFound:
+            pass  # one deleted user fails the whole batch; write the rest one by one
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Counter flush failed for {len(chunk)} users: {e}")
+            return chunk
+
+        failed = []
+        for uid, deltas in chunk:
+            try:
+                await users.document(uid).update(self._fields(deltas))
+                self.stats["writes"] += 1
+            except gexc.NotFound:
+                self.stats["dropped"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Counter flush failed for {uid}: {e}")
+                failed.append((uid, deltas))
+        return failed
+
+    def _requeue(self, uid: str, deltas: Dict[str, int]):
+        attempts = self._attempts.get(uid, 0) + 1
+        if attempts >= FLUSH_MAX_ATTEMPTS:
+            self._attempts.pop(uid, None)
+            self.stats["dropped"] += 1
+            print(f"Dropping counter deltas for {uid} after {attempts} attempts: {deltas}")
+            return
+        self._attempts[uid] = attempts
+        entry = self._pending.setdefault(uid, {})
+        for field, d in deltas.items():
+            entry[field] = entry.get(field, 0) + d
+        self._wakeup.set()
+
+
+def _count(col) -> int:
+    return int(col.count().get()[0][0].value)
+
+
+def reconcile_counts(db, collection: str = "users", keep_going: Callable[[], bool] = lambda: True) -> dict:
+    """
+    Recompute every user's counters from their subcollections (sync client, runs
+    in the threadpool) and fix the ones that drifted.
+
+    Users are paged by id with counts taken in parallel. A fix is written only if
+    the user doc hasn't changed since it was read (last_update_time precondition),
+    and users touched in the last RECONCILE_QUIET_SECONDS are skipped. Stops
+    between pages once keep_going() is false.
+    """
+    started = time.monotonic()
+    now = datetime.now(timezone.utc)
+    stats = {"users": 0, "fixed": 0, "skipped": 0, "complete": False}
+    users = db.collection(collection)
+    query = (
+        users.order_by("__name__")
+        .select([*COUNTER_FIELDS, COUNTS_UPDATED_FIELD])
+        .limit(RECONCILE_PAGE_SIZE)
+    )
+
+    def check(snap) -> Optional[str]:
+        data = snap.to_dict() or {}
+        touched = data.get(COUNTS_UPDATED_FIELD)
+        if touched and (now - touched).total_seconds() < RECONCILE_QUIET_SECONDS:
+            return "skipped"
+        actual = {field: _count(snap.reference.collection(sub)) for field, sub in COUNTER_FIELDS.items()}
+        if all(data.get(field) == n for field, n in actual.items()):
+            return None
+        try:
+            snap.reference.update({**actual, COUNTS_UPDATED_FIELD: firestore.SERVER_TIMESTAMP},
+                                  option=db.write_option(last_update_time=snap.update_time))
+        except (gexc.FailedPrecondition, gexc.NotFound):
+            return "skipped"  # changed or deleted meanwhile; next run looks again
+        return "fixed"
+
+    cursor = None
+    with ThreadPoolExecutor(max_workers=RECONCILE_WORKERS) as pool:
+        while keep_going():
+            page = list((query.start_after(cursor) if cursor else query).stream())
+            if not page:
+                stats["complete"] = True
+                break
+            cursor = page[-1]
+            for outcome in pool.map(check, page):
+                if outcome:
+                    stats[outcome] += 1
+            stats["users"] += len(page)
+            if len(page) < RECONCILE_PAGE_SIZE:
+                stats["complete"] = True
+                break
+
+    stats["seconds"] = round(time.monotonic() - started, 3)
+    print(f"Reconciled user counters: {stats}")
+    return stats
@@ -0,0 +1,377 @@
+"""
+In-memory copy of the `events` collection for the read API.
+
+One `on_snapshot` listener per worker keeps the cache current, so serving
+GET /events costs no Firestore reads. Each listener callback becomes a new
+`version`: the snapshot read time in microseconds, so every worker converges on
+the same numbers. The change log maps versions to touched event ids, which lets
+clients poll with `?since=<version>` and get only what changed.
+"""
+
+import math
+import threading
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from google.cloud.firestore_v1 import GeoPoint
+
+import recurrence
+
+# Versions of history kept for delta responses; older `since` gets a full response
+CHANGELOG_MAX = 10_000
+
+# Events longer than this live outside the sorted-start array, see IntervalIndex
+LONG_EVENT = timedelta(days=7).total_seconds()
+# Occurrence length for recurring events whose own start/end span isn't usable
+DEFAULT_OCCURRENCE_LENGTH = timedelta(hours=1)
+
+# Spatial grid cell size in degrees (~1.1 km of latitude)
+GRID_CELL_DEG = 0.01
+EARTH_RADIUS_M = 6_371_000
+METERS_PER_DEG_LAT = 111_320
+
+
+def to_json(value):
+    """Firestore value -> JSON-safe value (timestamps as ISO strings, GeoPoints as lat/lng)."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, GeoPoint):
+        return {"lat": value.latitude, "lng": value.longitude}
+    if isinstance(value, dict):
+        return {k: to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    return value
+
+
+def _lat_lng(location) -> Optional[Tuple[float, float]]:
+    if isinstance(location, GeoPoint):
+        return location.latitude, location.longitude
+    if isinstance(location, dict) and "lat" in location and "lng" in location:
+        return float(location["lat"]), float(location["lng"])
+    return None
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class CachedEvent:
+    __slots__ = ("id", "doc", "start", "end", "tags", "rule", "length", "point")
+
+    def __init__(self, event_id: str, data: dict, fieldnames: Iterable[str]):
+        self.id = event_id
+        # serialized once here so responses are just list building
+        self.doc = {"id": event_id, **{f: to_json(data.get(f)) for f in fieldnames}}
+        start = data.get("start")
+        end = data.get("end")
+        self.start: Optional[datetime] = start if isinstance(start, datetime) else None
+        self.end: Optional[datetime] = end if isinstance(end, datetime) else self.start
+        self.tags = frozenset(t.lower() for t in (data.get("tags") or []) if isinstance(t, str))
+        self.point = _lat_lng(data.get("location"))
+        try:
+            self.rule = recurrence.compile_rule(data.get("recurs"))
+        except ValueError:
+            self.rule = recurrence.compile_rule(None)
+        # recur_events keeps moving `end`, so a span over a day isn't the real length
+        span = (self.end - self.start) if self.start and self.end else None
+        self.length = span if span and timedelta(0) < span < timedelta(days=1) else DEFAULT_OCCURRENCE_LENGTH
+
+    def occurrence(self, when: datetime) -> dict:
+        """This event's doc moved to one occurrence of its rule."""
+        return {
+            **self.doc,
+            "start": when.isoformat(),
+            "end": (when + self.length).isoformat(),
+            "occurrenceOf": self.id,
+        }
+
+
+class IntervalIndex:
+    """
+    Overlap queries over one-off events in O(log n + k).
+
+    Events are kept as (start, end, id) sorted by start. Anything overlapping
+    [lo, hi) must start in [lo - max_len, hi), so one bisect bounds the scan.
+    max_len only ever grows, which is why events longer than LONG_EVENT go to
+    a small side table that is scanned in full instead of widening every query.
+    Recurring events are tracked separately and expanded lazily per query.
+    """
+
+    def __init__(self):
+        self._by_start: List[Tuple[float, float, str]] = []
+        self._keys: Dict[str, Tuple[float, float, str]] = {}
+        self._long: Dict[str, Tuple[float, float]] = {}
+        self._recurring: Dict[str, CachedEvent] = {}
+        self._max_len = 0.0
+
+    def add(self, ev: CachedEvent):
+        self.remove(ev.id)
+        if ev.rule:
+            self._recurring[ev.id] = ev
+            return
+        if ev.start is None:
+            return
+        s = ev.start.timestamp()
+        e = ev.end.timestamp() if ev.end else s
+        if e - s > LONG_EVENT:
+            self._long[ev.id] = (s, e)
+            return
+        key = (s, e, ev.id)
+        insort(self._by_start, key)
+        self._keys[ev.id] = key
+        self._max_len = max(self._max_len, e - s)
+
+    def remove(self, event_id: str):
+        self._recurring.pop(event_id, None)
+        self._long.pop(event_id, None)
+        key = self._keys.pop(event_id, None)
+        if key is not None:
+            i = bisect_left(self._by_start, key)
+            if i < len(self._by_start) and self._by_start[i] == key:
+                del self._by_start[i]
+
+    def overlapping(self, lo: datetime, hi: datetime) -> Iterator[str]:
+        """Ids of one-off events overlapping [lo, hi), in start order (long events last)."""
+        lo_ts, hi_ts = lo.timestamp(), hi.timestamp()
+        i = bisect_left(self._by_start, (lo_ts - self._max_len,))
+        j = bisect_left(self._by_start, (hi_ts,), i)
+        for k in range(i, j):
+            s, e, event_id = self._by_start[k]
+            if e >= lo_ts:
+                yield event_id
+        for event_id, (s, e) in self._long.items():
+            if s < hi_ts and e >= lo_ts:
+                yield event_id
+
+    def occurrences(self, lo: datetime, hi: datetime) -> Iterator[Tuple[CachedEvent, datetime]]:
+        """(event, occurrence start) for every recurring occurrence overlapping [lo, hi)."""
+        for ev in self._recurring.values():
+            for when in ev.rule.expand(lo - ev.length, hi):
+                if when + ev.length > lo:
+                    yield ev, when
+
+
+class SpatialGrid:
+    """
+    Uniform lat/lng grid over event locations.
+
+    Each event sits in one GRID_CELL_DEG square cell. A box query visits only the
+    cells the box covers, falling back to a straight scan of all points when the
+    box is so large that it covers more cells than there are events.
+    """
+
+    def __init__(self, cell_deg: float = GRID_CELL_DEG):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[int, int], set] = {}
+        self._points: Dict[str, Tuple[float, float, Tuple[int, int]]] = {}
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def add(self, event_id: str, point: Optional[Tuple[float, float]]):
+        self.remove(event_id)
+        if point is None:
+            return
+        lat, lng = point
+        cell = self._cell(lat, lng)
+        self._cells.setdefault(cell, set()).add(event_id)
+        self._points[event_id] = (lat, lng, cell)
+
+    def remove(self, event_id: str):
+        old = self._points.pop(event_id, None)
+        if old is None:
+            return
+        ids = self._cells.get(old[2])
+        if ids is not None:
+            ids.discard(event_id)
+            if not ids:
+                del self._cells[old[2]]
+
+    def in_box(self, south: float, west: float, north: float, east: float) -> Iterator[Tuple[str, float, float]]:
+        """(id, lat, lng) for points inside the box (west <= east; no antimeridian wrap)."""
+        (r0, c0), (r1, c1) = self._cell(south, west), self._cell(north, east)
+        if (r1 - r0 + 1) * (c1 - c0 + 1) > len(self._points):
+            candidates = self._points.keys()
+        else:
+            candidates = (
+                event_id
+                for r in range(r0, r1 + 1)
+                for c in range(c0, c1 + 1)
+                for event_id in self._cells.get((r, c), ())
+            )
+        for event_id in candidates:
+            lat, lng, _cell = self._points[event_id]
+            if south <= lat <= north and west <= lng <= east:
+                yield event_id, lat, lng
+
+    def near(self, lat: float, lng: float, radius_m: float) -> List[Tuple[float, str]]:
+        """(distance_m, id) within radius_m of the point, nearest first."""
+        dlat = radius_m / METERS_PER_DEG_LAT
+        dlng = radius_m / (METERS_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        hits = []
+        for event_id, plat, plng in self.in_box(lat - dlat, lng - dlng, lat + dlat, lng + dlng):
+            d = haversine_m(lat, lng, plat, plng)
+            if d <= radius_m:
+                hits.append((d, event_id))
+        hits.sort()
+        return hits
+
+
+class EventCache:
+    def __init__(self, fieldnames: Iterable[str]):
+        self.fieldnames = tuple(fieldnames)
+        self.version = 0
+        # version of the first applied batch; the change log says nothing about
+        # what changed before it (e.g. a `since` from another worker or a restart)
+        self._first_version: Optional[int] = None
+        self.ready = threading.Event()
+        self._events: Dict[str, CachedEvent] = {}
+        self._changelog = deque(maxlen=CHANGELOG_MAX)  # (version, event_id)
+        self._intervals = IntervalIndex()
+        self._grid = SpatialGrid()
+        self._lock = threading.RLock()
+        self._watch = None
+        self._listeners: List[Callable[[List[str]], None]] = []
+
+    def __len__(self):
+        return len(self._events)
+
+    # --- mutation ---
+
+    def subscribe(self, listener: Callable[[List[str]], None]):
+        """Call listener(touched event ids) after every applied batch."""
+        self._listeners.append(listener)
+
+    def apply(self, upserts: Iterable[Tuple[str, dict]] = (), removals: Iterable[str] = (),
+              version: Optional[int] = None):
+        """Apply one batch of changes as a single new version (always increasing)."""
+        touched = []
+        with self._lock:
+            self.version = max(self.version + 1, version or 0)
+            if self._first_version is None:
+                self._first_version = self.version
+            for event_id, data in upserts:
+                ev = self._events[event_id] = CachedEvent(event_id, data, self.fieldnames)
+                self._intervals.add(ev)
+                self._grid.add(event_id, ev.point)
+                self._changelog.append((self.version, event_id))
+                touched.append(event_id)
+            for event_id in removals:
+                self._events.pop(event_id, None)
+                self._intervals.remove(event_id)
+                self._grid.remove(event_id)
+                self._changelog.append((self.version, event_id))
+                touched.append(event_id)
+        for listener in self._listeners:
+            listener(touched)
+
+    def _on_snapshot(self, _docs, changes, read_time):
+        upserts, removals = [], []
+        for change in changes:
+            if change.type.name == "REMOVED":
+                removals.append(change.document.id)
+            else:
+                upserts.append((change.document.id, change.document.to_dict() or {}))
+        version = int(read_time.timestamp() * 1_000_000) if read_time else None
+        self.apply(upserts, removals, version)
+        self.ready.set()
+
+    def watch(self, events_col):
+        self._watch = events_col.on_snapshot(self._on_snapshot)
+        return self._watch
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        self.ready.clear()
+
+    # --- queries ---
+
+    def docs(self, event_ids: Iterable[str]) -> Dict[str, dict]:
+        """Cached docs for those of event_ids that exist."""
+        with self._lock:
+            return {event_id: self._events[event_id].doc for event_id in event_ids if event_id in self._events}
+
+    @staticmethod
+    def matches(ev: CachedEvent, tags: frozenset, start: Optional[datetime], end: Optional[datetime]) -> bool:
+        """Tag filter is any-of; the date window keeps events overlapping [start, end)."""
+        if tags and not (ev.tags & tags):
+            return False
+        if start is not None and (ev.end is None or ev.end < start):
+            return False
+        if end is not None and (ev.start is None or ev.start >= end):
+            return False
+        return True
+
+    def query(self, tags: Iterable[str] = (), start: Optional[datetime] = None,
+              end: Optional[datetime] = None) -> Tuple[int, List[dict]]:
+        tags = frozenset(t.lower() for t in tags)
+        with self._lock:
+            out = [ev.doc for ev in self._events.values() if self.matches(ev, tags, start, end)]
+            return self.version, out
+
+    def range(self, start: datetime, end: datetime) -> Tuple[int, List[dict]]:
+        """
+        Events overlapping [start, end): one-off events by start, then recurring
+        events expanded into one entry per occurrence inside the window, by time.
+        """
+        with self._lock:
+            out = [self._events[event_id].doc for event_id in self._intervals.overlapping(start, end)]
+            occurrences = sorted(self._intervals.occurrences(start, end), key=lambda pair: pair[1])
+            out.extend(ev.occurrence(when) for ev, when in occurrences)
+            return self.version, out
+
+    def near(self, lat: float, lng: float, radius_m: float, limit: int) -> Tuple[int, List[dict]]:
+        """Events within radius_m of a point, nearest first, with `distanceM` added."""
+        with self._lock:
+            hits = self._grid.near(lat, lng, radius_m)[:limit]
+            return self.version, [{**self._events[event_id].doc, "distanceM": round(d, 1)} for d, event_id in hits]
+
+    def in_bounds(self, south: float, west: float, north: float, east: float, limit: int) -> Tuple[int, List[dict]]:
+        """Events located inside a map viewport."""
+        with self._lock:
+            out = []
+            for event_id, _lat, _lng in self._grid.in_box(south, west, north, east):
+                out.append(self._events[event_id].doc)
+                if len(out) >= limit:
+                    break
+            return self.version, out
+
+    def delta(self, since: int, tags: Iterable[str] = (), start: Optional[datetime] = None,
+              end: Optional[datetime] = None) -> Optional[Tuple[int, List[dict], List[str]]]:
+        """
+        Changes after version `since` as (version, changed docs, removed ids).
+        Ids that no longer match the filters are reported as removed.
+        Returns None when `since` is older than the change log or than this cache's
+        first snapshot (caller sends everything).
+        """
+        tags = frozenset(t.lower() for t in tags)
+        with self._lock:
+            if self._first_version is None or not self._first_version <= since <= self.version:
+                return None
+            # once the log has wrapped, only versions >= its oldest entry are complete
+            if len(self._changelog) == self._changelog.maxlen and since < self._changelog[0][0]:
+                return None
+            touched = []
+            seen = set()
+            for version, event_id in reversed(self._changelog):
+                if version <= since:
+                    break
+                if event_id not in seen:
+                    seen.add(event_id)
+                    touched.append(event_id)
+            changed, removed = [], []
+            for event_id in reversed(touched):
+                ev = self._events.get(event_id)
+                if ev is not None and self.matches(ev, tags, start, end):
+                    changed.append(ev.doc)
+                else:
+                    removed.append(event_id)
+            return self.version, changed, removed
@@ -0,0 +1,250 @@
+"""
+Substring search over event titles, descriptions and tags.
+
+Event text is normalized (lowercased, accents stripped, every run of anything
+that isn't a letter or digit becomes one space) and stored in FM-index segments
+(string_compressor.FMIndex). Only the index is kept, not the text, but it is not
+much smaller: about 0.75x the raw normalized text (538KB for 704KB of text).
+
+A query stops after SEARCH_MAX_HITS distinct events; search() says whether the
+result is complete.
+
+Segments are immutable and hold at most SEGMENT_MAX_CHARS. When events change,
+a background thread indexes just those events into a new small segment; their
+copies in older segments are masked out via `_owner`. Small or mostly stale
+segments are merged on later passes. Until an event has been indexed again it is
+matched by a plain scan of its cached text, so results are never stale.
+"""
+
+import threading
+import time
+import unicodedata
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from string_compressor import FMIndex
+
+FIELD_SEP = "\x01"  # between title, desc and tags; keeps matches inside one field
+DOC_SEP = "\x02"
+# Segment size cap; also bounds how long one build holds the GIL in big sorts
+SEGMENT_MAX_CHARS = 1 << 16
+# Segments smaller than this are merged together once there are a few of them
+SEGMENT_MERGE_BELOW = SEGMENT_MAX_CHARS // 4
+SEGMENT_MERGE_COUNT = 4
+# Quiet period after a change before it is indexed
+REINDEX_DEBOUNCE_SECONDS = 2.0
+REINDEX_MAX_DELAY_SECONDS = 20.0
+# Distinct events one query collects before it stops (the result is then partial).
+# Also the largest page /events/search serves, so a full page is always ranked.
+SEARCH_MAX_HITS = 200
+
+
+def normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    out = []
+    space = True  # drop leading spaces
+    for c in decomposed:
+        if c.isalnum():
+            out.append(c)
+            space = False
+        elif not space and not unicodedata.combining(c):
+            out.append(" ")
+            space = True
+    return "".join(out).rstrip()
+
+
+def event_text(doc: dict) -> Tuple[str, int]:
+    """(indexed text, length of its title part)."""
+    title = normalize(doc.get("title") or "")
+    desc = normalize(doc.get("desc") or "")
+    tags = " ".join(normalize(t) for t in (doc.get("tags") or []) if isinstance(t, str))
+    return f"{title}{FIELD_SEP}{desc}{FIELD_SEP}{tags}", len(title)
+
+
+class _Segment:
+    __slots__ = ("fm", "ids", "chars")
+
+    def __init__(self, entries: List[Tuple[str, str]]):
+        # entries: (event id, text)
+        self.ids = [event_id for event_id, _ in entries]
+        text = DOC_SEP.join(text for _, text in entries)
+        self.chars = len(text)
+        self.fm = FMIndex(text, DOC_SEP)
+
+    def find(self, q: str) -> Iterator[str]:
+        """Ids of the events in this segment matching q, each once."""
+        seen = set()
+        for doc, _ in self.fm.locate_docs(q):
+            if doc not in seen:
+                seen.add(doc)
+                yield self.ids[doc]
+                # a common q has many occurrences per event; stop once every event has matched
+                if len(seen) == len(self.ids):
+                    return
+
+
+class EventSearchIndex:
+    """
+    @param load: returns {event id: doc} for those of the given ids that still exist (EventCache.docs).
+    """
+
+    def __init__(self, load: Callable[[Iterable[str]], Dict[str, dict]],
+                 debounce: float = REINDEX_DEBOUNCE_SECONDS):
+        self._load = load
+        self._debounce = debounce
+        self._segments: List[_Segment] = []
+        self._owner: Dict[str, _Segment] = {}  # event id -> segment holding its current text
+        self._dirty: Dict[str, int] = {}  # event id -> change generation, not indexed yet
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.stats = {"builds": 0, "merges": 0, "indexedEvents": 0, "errors": 0}
+
+    # --- changes ---
+
+    def mark_changed(self, event_ids: Iterable[str]):
+        """Queue events (upserted or removed) for re-indexing."""
+        with self._lock:
+            for event_id in event_ids:
+                self._generation += 1
+                self._dirty[event_id] = self._generation
+        self._wakeup.set()
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._loop, name="event-search-index", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stopping:
+            self._wakeup.wait()
+            if self._stopping:
+                break
+            # let a burst of changes settle into one pass, but don't wait forever on a steady stream
+            deadline = time.monotonic() + REINDEX_MAX_DELAY_SECONDS
+            self._wakeup.clear()
+            while (not self._stopping and time.monotonic() < deadline
+                   and self._wakeup.wait(self._debounce)):
+                self._wakeup.clear()
+            try:
+                self.reindex()
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Event search reindex failed: {e}")
+
+    # --- building ---
+
+    @staticmethod
+    def _pack(docs: Dict[str, dict]) -> List[_Segment]:
+        segments, entries, size = [], [], 0
+        for event_id, doc in docs.items():
+            text, _ = event_text(doc)
+            if entries and size + len(text) > SEGMENT_MAX_CHARS:
+                segments.append(_Segment(entries))
+                entries, size = [], 0
+            entries.append((event_id, text))
+            size += len(text) + 1
+        if entries:
+            segments.append(_Segment(entries))
+        return segments
+
+    def reindex(self):
+        """Index everything changed since the last pass, then merge small/stale segments."""
+        with self._lock:
+            taken = dict(self._dirty)
+            segments = list(self._segments)
+            owner = dict(self._owner)
+        if taken:
+            # read after taking the dirty set: anything changed later keeps a newer generation
+            docs = self._load(list(taken))
+            built = self._pack(docs)
+            self.stats["builds"] += len(built)
+            self.stats["indexedEvents"] += len(docs)
+            for seg in built:
+                for event_id in seg.ids:
+                    owner[event_id] = seg
+            for event_id in taken:
+                if event_id not in docs:
+                    owner.pop(event_id, None)
+            segments.extend(built)
+
+        # merge segments that hold mostly replaced/removed events, or once there are several small ones
+        live = {id(seg): 0 for seg in segments}
+        for seg in owner.values():
+            live[id(seg)] += 1
+        stale = [seg for seg in segments if live[id(seg)] * 2 < len(seg.ids)]
+        small = [seg for seg in segments if seg.chars < SEGMENT_MERGE_BELOW]
+        if stale or len(small) >= SEGMENT_MERGE_COUNT:
+            merging = {id(seg) for seg in stale + small}
+            moved = [event_id for event_id, seg in owner.items() if id(seg) in merging]
+            docs = self._load(moved)
+            rebuilt = self._pack(docs)
+            self.stats["merges"] += 1
+            for event_id in moved:
+                owner.pop(event_id, None)
+            for seg in rebuilt:
+                for event_id in seg.ids:
+                    owner[event_id] = seg
+            segments = [seg for seg in segments if id(seg) not in merging] + rebuilt
+
+        with self._lock:
+            self._segments = segments
+            self._owner = owner
+            for event_id, generation in taken.items():
+                if self._dirty.get(event_id) == generation:
+                    del self._dirty[event_id]
+
+    # --- queries ---
+
+    @staticmethod
+    def _indexed_ids(q: str, segments: List[_Segment], owner: Dict[str, _Segment],
+                     pending: Set[str]) -> Iterator[str]:
+        """Ids of indexed events matching q, skipping stale copies."""
+        for seg in segments:
+            for event_id in seg.find(q):
+                if event_id not in pending and owner.get(event_id) is seg:
+                    yield event_id
+
+    def search(self, q: str, max_hits: int = SEARCH_MAX_HITS) -> Tuple[Dict[str, bool], bool]:
+        """
+        ({matching event id: whether the title matched}, complete). q is normalized
+        here. Once max_hits events are found the rest aren't looked for, and
+        complete is False.
+        """
+        q = normalize(q)
+        if not q:
+            return {}, True
+        with self._lock:
+            segments = list(self._segments)
+            owner = self._owner
+            pending = list(self._dirty)
+        found = list(islice(self._indexed_ids(q, segments, owner, set(pending)), max_hits + 1))
+        complete = len(found) <= max_hits
+        found = found[:max_hits]
+
+        hits: Dict[str, bool] = {}
+        for event_id, doc in self._load(found).items():
+            hits[event_id] = q in normalize(doc.get("title") or "")
+        # not indexed yet: scan their current text
+        for event_id, doc in self._load(pending).items():
+            if len(hits) >= max_hits:
+                complete = False
+                break
+            text, title_len = event_text(doc)
+            if q in text:
+                hits[event_id] = q in text[:title_len]
+        return hits, complete
+
+    def size_in_bytes(self) -> int:
+        with self._lock:
+            return sum(seg.fm.size_in_bytes() for seg in self._segments)
@@ -0,0 +1,205 @@
+"""
+Compact in-memory friend graph for "people you may know".
+
+Uids are mapped to dense ints and the adjacency lists are stored CSR-style in
+two `array('i')`s (offsets + neighbors), about 4 bytes per directed edge. Edges
+added or removed after the last build go to small overlay sets; once those grow
+past COMPACT_AFTER the CSR arrays are rebuilt, which folds them back in.
+
+A full build streams every edge, which takes a while. Changes made meanwhile
+are journaled and replayed on top of the new arrays, since the stream may or
+may not have seen them.
+"""
+
+import heapq
+import threading
+from array import array
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# Overlay edge count that triggers a CSR rebuild
+COMPACT_AFTER = 50_000
+
+
+class FriendGraph:
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._uids: List[str] = []
+        self._offsets = array("i", [0])
+        self._neighbors = array("i")
+        self._added: Dict[int, Set[int]] = defaultdict(set)
+        self._removed: Dict[int, Set[int]] = defaultdict(set)
+        self._overlay = 0
+        # (method, args) of changes made while a build is streaming; None when not building
+        self._journal: Optional[List[Tuple[Callable, tuple]]] = None
+        self._lock = threading.RLock()
+        self.ready = threading.Event()
+
+    def __len__(self):
+        return len(self._uids)
+
+    def _id(self, uid: str) -> int:
+        i = self._ids.get(uid)
+        if i is None:
+            i = self._ids[uid] = len(self._uids)
+            self._uids.append(uid)
+        return i
+
+    def _base(self, i: int):
+        if i + 1 >= len(self._offsets):
+            return ()
+        return self._neighbors[self._offsets[i]:self._offsets[i + 1]]
+
+    def _adjacent(self, i: int) -> Set[int]:
+        out = set(self._base(i))
+        removed = self._removed.get(i)
+        if removed:
+            out -= removed
+        added = self._added.get(i)
+        if added:
+            out |= added
+        return out
+
+    # --- building ---
+
+    def build(self, edges: Iterable[Tuple[str, str]]):
+        """
+        Replace the graph with the given directed (uid, friend_uid) edges.
+        Changes made while `edges` is consumed are re-applied afterwards.
+        """
+        with self._lock:
+            self._journal = []
+        try:
+            ids: Dict[str, int] = {}
+            uids: List[str] = []
+            src, dst = array("i"), array("i")
+            for a, b in edges:
+                for u in (a, b):
+                    if u not in ids:
+                        ids[u] = len(uids)
+                        uids.append(u)
+                src.append(ids[a])
+                dst.append(ids[b])
+            offsets, neighbors = self._csr(len(uids), src, dst)
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._ids, self._uids = ids, uids
+            self._offsets, self._neighbors = offsets, neighbors
+            self._added.clear()
+            self._removed.clear()
+            self._overlay = 0
+            for method, args in journal:
+                method(*args)
+        self.ready.set()
+
+    @staticmethod
+    def _csr(n: int, src: array, dst: array) -> Tuple[array, array]:
+        # counting sort by source
+        counts = array("i", bytes(4 * (n + 1)))
+        for a in src:
+            counts[a + 1] += 1
+        for i in range(n):
+            counts[i + 1] += counts[i]
+        offsets = array("i", counts)
+        fill = array("i", counts)
+        neighbors = array("i", bytes(4 * len(src)))
+        for a, b in zip(src, dst):
+            neighbors[fill[a]] = b
+            fill[a] += 1
+        return offsets, neighbors
+
+    def load(self, db):
+        """Build from every users/{uid}/friends/{friend} doc (ids only)."""
+        def edges():
+            for snap in db.collection_group("friends").select([]).stream():
+                owner = snap.reference.parent.parent
+                if owner is not None:
+                    yield owner.id, snap.id
+        self.build(edges())
+
+    def _compact(self):
+        src, dst = array("i"), array("i")
+        for i in range(len(self._uids)):
+            for j in self._adjacent(i):
+                src.append(i)
+                dst.append(j)
+        self._offsets, self._neighbors = self._csr(len(self._uids), src, dst)
+        self._added.clear()
+        self._removed.clear()
+        self._overlay = 0
+
+    # --- incremental updates (mirror the friends endpoints) ---
+
+    def _record(self, method: Callable, *args):
+        if self._journal is not None:
+            self._journal.append((method, args))
+
+    def add_friendship(self, a: str, b: str):
+        with self._lock:
+            self._record(self.add_friendship, a, b)
+            ia, ib = self._id(a), self._id(b)
+            for x, y in ((ia, ib), (ib, ia)):
+                self._removed[x].discard(y)
+                self._added[x].add(y)
+            self._overlay += 2
+            if self._overlay > COMPACT_AFTER:
+                self._compact()
+
+    def remove_friendship(self, a: str, b: str):
+        with self._lock:
+            self._record(self.remove_friendship, a, b)
+            ia, ib = self._ids.get(a), self._ids.get(b)
+            if ia is None or ib is None:
+                return
+            for x, y in ((ia, ib), (ib, ia)):
+                self._added[x].discard(y)
+                self._removed[x].add(y)
+            self._overlay += 2
+            if self._overlay > COMPACT_AFTER:
+                self._compact()
+
+    def remove_user(self, uid: str):
+        with self._lock:
+            self._record(self.remove_user, uid)
+            i = self._ids.get(uid)
+            if i is None:
+                return
+            for j in self._adjacent(i):
+                self._added[j].discard(i)
+                self._removed[j].add(i)
+                self._added[i].discard(j)
+                self._removed[i].add(j)
+                self._overlay += 2
+            if self._overlay > COMPACT_AFTER:
+                self._compact()
+
+    # --- queries ---
+
+    def friends_of(self, uid: str) -> Set[str]:
+        with self._lock:
+            i = self._ids.get(uid)
+            return set() if i is None else {self._uids[j] for j in self._adjacent(i)}
+
+    def suggestions(self, uid: str, limit: int = 20, exclude: Optional[Set[str]] = None) -> List[Tuple[str, int]]:
+        """(uid, mutual friend count) for friends-of-friends, most mutuals first."""
+        with self._lock:
+            i = self._ids.get(uid)
+            if i is None:
+                return []
+            mine = self._adjacent(i)
+            counts: Dict[int, int] = defaultdict(int)
+            for f in mine:
+                for c in self._adjacent(f):
+                    if c != i and c not in mine:
+                        counts[c] += 1
+            skip = {self._ids[u] for u in (exclude or ()) if u in self._ids}
+            top = heapq.nlargest(
+                limit,
+                ((n, c) for c, n in counts.items() if c not in skip),
+                key=lambda nc: (nc[0], -nc[1]),
+            )
+            return [(self._uids[c], n) for n, c in top]
@@ -0,0 +1,340 @@
+"""
+Runs background jobs once per deployment instead of once per uvicorn worker.
+
+Workers compete for one lease document (scheduler/leader). The holder renews it
+every HEARTBEAT_SECONDS and runs the singleton jobs; if it dies, the lease
+lapses after LEASE_SECONDS and the next heartbeat of another worker takes over.
+A clean shutdown releases the lease, so handover is immediate.
+
+Each job's schedule is kept in scheduler/leader/jobs/{name} ({nextRunAt,
+running, lastRun}), so it survives restarts and leader changes. A run is
+claimed in a transaction that also checks the lease, and it is recorded in
+.../jobs/{name}/runs/{runId}, with the newest JOB_HISTORY_KEEP runs kept. A run
+left `running` by a leader that died is marked abandoned and started again.
+A leader that loses the lease cancels its running singleton jobs, since the new
+leader may claim them; jobs that run in a thread should also poll `is_leader`
+between steps (cancelling the awaiting task doesn't stop the thread).
+
+Jobs registered with singleton=False run on every worker, with no Firestore
+state (e.g. reloading a per-worker cache).
+
+Everything goes through the client it is given, so it runs unchanged against
+the emulator (FIRESTORE_EMULATOR_HOST).
+"""
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from google.cloud import firestore
+
+SCHEDULER_COLLECTION = "scheduler"
+LEASE_DOC = "leader"
+# Lease length, and how often it is renewed (and how often followers look for a lapsed one)
+LEASE_SECONDS = 30
+HEARTBEAT_SECONDS = 10
+# Runs kept per job in .../runs
+JOB_HISTORY_KEEP = 50
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class _Job:
+    __slots__ = ("name", "fn", "interval", "singleton", "next_run", "task")
+
+    def __init__(self, name: str, fn: Callable[[], Awaitable], interval: timedelta, singleton: bool):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.singleton = singleton
+        # singleton: nextRunAt as last read from Firestore (None = unknown, ask)
+        # local: wall-clock due time
+        self.next_run: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class JobCoordinator:
+    """
+    @param client: async Firestore client.
+    @param worker_id: defaults to host:pid:random, unique per process.
+    """
+
+    def __init__(self, client, worker_id: Optional[str] = None,
+                 lease_seconds: float = LEASE_SECONDS, heartbeat_seconds: float = HEARTBEAT_SECONDS):
+        self._db = client
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._lease_seconds = lease_seconds
+        self._heartbeat = heartbeat_seconds
+        self._jobs: Dict[str, _Job] = {}
+        self._lease_until = 0.0  # monotonic; we lead until then unless renewed
+        self._leader: Optional[str] = None  # holder seen at the last heartbeat
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self.stats = {"heartbeats": 0, "acquired": 0, "lost": 0, "runs": 0, "errors": 0, "abandoned": 0,
+                      "cancelled": 0}
+
+    @property
+    def _lease_ref(self):
+        return self._db.collection(SCHEDULER_COLLECTION).document(LEASE_DOC)
+
+    def _job_ref(self, name: str):
+        return self._lease_ref.collection("jobs").document(name)
+
+    @property
+    def is_leader(self) -> bool:
+        return time.monotonic() < self._lease_until
+
+    def register(self, name: str, fn: Callable[[], Awaitable], interval: timedelta, singleton: bool = True):
+        """
+        Run `await fn()` every `interval`. A singleton job that has never run
+        starts on the first heartbeat; a local one first runs after one interval.
+        A dict returned by fn is stored with the run.
+        """
+        job = _Job(name, fn, interval, singleton)
+        if not singleton:
+            job.next_run = _now() + interval
+        self._jobs[name] = job
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Stop heartbeating and release the lease; jobs still running are cancelled."""
+        if self._task is None:
+            return
+        self._stopping.set()
+        # cancelled rather than awaited: a heartbeat stuck in retries shouldn't hold up shutdown
+        running = [self._task] + [job.task for job in self._jobs.values() if job.task is not None]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        self._task = None
+        if self.is_leader:
+            try:
+                await asyncio.wait_for(self._release(), self._heartbeat)
+            except Exception as e:
+                print(f"Releasing scheduler lease failed: {e}")
+        self._lease_until = 0.0
+
+    async def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                await self._beat()
+                self._start_due()
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Scheduler heartbeat failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self._heartbeat)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- lease ---
+
+    async def _beat(self):
+        """Renew our lease, or take it over if it is free or lapsed."""
+        self.stats["heartbeats"] += 1
+        was_leader = self.is_leader
+        started = time.monotonic()
+        try:
+            acquired = await self._acquire()
+        except Exception:
+            # can't renew: keep leading only until the lease we already have runs out
+            if was_leader and not self.is_leader:
+                self._lost()
+            raise
+        if acquired:
+            # count from before the round trip, so we stop before anyone else may start
+            self._lease_until = started + self._lease_seconds
+            if not was_leader:
+                self.stats["acquired"] += 1
+                for job in self._jobs.values():
+                    if job.singleton:
+                        job.next_run = None  # re-read: the old leader may have run it since
+                print(f"Scheduler: {self.worker_id} is now the leader")
+        elif was_leader:
+            self._lost()
+
+    def _lost(self):
+        self._lease_until = 0.0
+        self.stats["lost"] += 1
+        print(f"Scheduler: {self.worker_id} lost the lease to {self._leader}")
+        for job in self._jobs.values():
+            if job.singleton and job.task is not None:
+                job.task.cancel()
+                self.stats["cancelled"] += 1
+
+    async def _acquire(self) -> bool:
+        @firestore.async_transactional
+        async def txn(tx):
+            snap = await self._lease_ref.get(transaction=tx)
+            lease = snap.to_dict() if snap.exists else {}
+            now = _now()
+            holder = lease.get("holder")
+            mine = holder == self.worker_id
+            if holder and not mine and lease.get("expiresAt") and lease["expiresAt"] > now:
+                return False, holder
+            tx.set(self._lease_ref, {
+                "holder": self.worker_id,
+                "expiresAt": now + timedelta(seconds=self._lease_seconds),
+                "renewedAt": firestore.SERVER_TIMESTAMP,
+                "acquiredAt": lease.get("acquiredAt") if mine else firestore.SERVER_TIMESTAMP,
+            })
+            return True, self.worker_id
+
+        acquired, self._leader = await txn(self._db.transaction())
+        return acquired
+
+    async def _release(self):
+        @firestore.async_transactional
+        async def txn(tx):
+            snap = await self._lease_ref.get(transaction=tx)
+            if snap.exists and (snap.to_dict() or {}).get("holder") == self.worker_id:
+                tx.delete(self._lease_ref)
+
+        await txn(self._db.transaction())
+
+    # --- jobs ---
+
+    def _start_due(self):
+        now = _now()
+        for job in self._jobs.values():
+            if job.task is not None:
+                continue
+            if job.singleton:
+                if not self.is_leader or (job.next_run is not None and job.next_run > now):
+                    continue
+                job.task = asyncio.create_task(self._run_singleton(job))
+            elif job.next_run <= now:
+                job.next_run = now + job.interval
+                job.task = asyncio.create_task(self._run_local(job))
+
+    async def _run_local(self, job: _Job):
+        try:
+            await job.fn()
+            self.stats["runs"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Job {job.name} failed: {e}")
+        finally:
+            job.task = None
+
+    async def _claim(self, job: _Job):
+        """Start a run if we still hold the lease and the job is due. Returns the run ref or None."""
+        job_ref = self._job_ref(job.name)
+        run_ref = job_ref.collection("runs").document()
+
+        @firestore.async_transactional
+        async def txn(tx):
+            lease_snap = await self._lease_ref.get(transaction=tx)
+            job_snap = await job_ref.get(transaction=tx)
+            now = _now()
+            lease = lease_snap.to_dict() if lease_snap.exists else {}
+            if lease.get("holder") != self.worker_id or lease["expiresAt"] <= now:
+                return None, None, False
+            state = job_snap.to_dict() if job_snap.exists else {}
+            running = state.get("running")
+            if not running and state.get("nextRunAt") and state["nextRunAt"] > now:
+                return None, state["nextRunAt"], False
+            if running:
+                # left running by a leader whose lease has since lapsed
+                tx.update(job_ref.collection("runs").document(running["runId"]),
+                          {"status": "abandoned", "abandonedBy": self.worker_id})
+            tx.set(run_ref, {"worker": self.worker_id, "startedAt": now, "status": "running"})
+            tx.set(job_ref, {
+                "interval": job.interval.total_seconds(),
+                "running": {"runId": run_ref.id, "worker": self.worker_id, "startedAt": now},
+            }, merge=True)
+            return run_ref, None, bool(running)
+
+        run, next_run, abandoned = await txn(self._db.transaction())
+        job.next_run = next_run
+        self.stats["abandoned"] += abandoned
+        return run
+
+    async def _run_singleton(self, job: _Job):
+        try:
+            run_ref = await self._claim(job)
+            if run_ref is None:
+                return
+            print(f"Job {job.name} started on {self.worker_id}")
+            started_at, started = _now(), time.monotonic()
+            run = {"status": "ok"}
+            try:
+                result = await job.fn()
+                if isinstance(result, dict):
+                    run["result"] = result
+                self.stats["runs"] += 1
+            except Exception as e:
+                run = {"status": "error", "error": repr(e)}
+                self.stats["errors"] += 1
+                print(f"Job {job.name} failed: {e}")
+            run["finishedAt"] = _now()
+            run["seconds"] = round(time.monotonic() - started, 3)
+            await self._finish(job, run_ref, run, started_at)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Job {job.name} bookkeeping failed: {e}")
+        finally:
+            job.task = None
+
+    async def _finish(self, job: _Job, run_ref, run: dict, started_at: datetime):
+        await run_ref.update(run)
+        job_ref = self._job_ref(job.name)
+        # keep the cadence, but never schedule into the past after an overrun
+        next_run = max(started_at + job.interval, run["finishedAt"] + job.interval / 10)
+
+        @firestore.async_transactional
+        async def txn(tx):
+            snap = await job_ref.get(transaction=tx)
+            running = (snap.to_dict() or {}).get("running") if snap.exists else None
+            if not running or running.get("runId") != run_ref.id:
+                return None  # another leader took the job over meanwhile
+            tx.update(job_ref, {
+                "running": firestore.DELETE_FIELD,
+                "nextRunAt": next_run,
+                "lastRun": {"runId": run_ref.id, "worker": self.worker_id, "startedAt": started_at,
+                            "status": run["status"], "seconds": run["seconds"]},
+            })
+            return next_run
+
+        job.next_run = await txn(self._db.transaction())
+        await self._prune(job_ref)
+
+    async def _prune(self, job_ref):
+        old = await (job_ref.collection("runs").order_by("startedAt", direction=firestore.Query.DESCENDING)
+                     .offset(JOB_HISTORY_KEEP).select([]).get())
+        if old:
+            batch = self._db.batch()
+            for snap in old:
+                batch.delete(snap.reference)
+            await batch.commit()
+
+    # --- status ---
+
+    async def history(self, name: str, limit: int = 10) -> List[dict]:
+        """Newest runs of a singleton job, newest first."""
+        runs = await (self._job_ref(name).collection("runs")
+                      .order_by("startedAt", direction=firestore.Query.DESCENDING).limit(limit).get())
+        return [{"runId": snap.id, **(snap.to_dict() or {})} for snap in runs]
+
+    def status(self) -> dict:
+        return {
+            "worker": self.worker_id,
+            "leader": self._leader,
+            "isLeader": self.is_leader,
+            "jobs": {
+                job.name: {"singleton": job.singleton, "intervalSeconds": job.interval.total_seconds(),
+                           "nextRun": job.next_run, "runningHere": job.task is not None}
+                for job in self._jobs.values()
+            },
+            **self.stats,
+        }
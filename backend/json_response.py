@@ -0,0 +1,39 @@
+"""
+orjson-backed JSON responses.
+
+FastJSONResponse is the app's default response class, so every handler's body
+is rendered by orjson instead of json.dumps. Handlers with large list bodies
+return one directly: FastAPI then skips its jsonable_encoder walk (and any
+response_model validation) over data that is already plain JSON types.
+"""
+
+from datetime import date, datetime
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+
+def _default(value: Any):
+    # Firestore timestamps are a datetime subclass orjson won't take as is;
+    # isoformat() matches what jsonable_encoder produced for them
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def model_response(model: BaseModel, **kwargs) -> Response:
+    """A model that was validated when it was built, serialized by pydantic-core without validating it again."""
+    return Response(model.model_dump_json(), media_type="application/json", **kwargs)
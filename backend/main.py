@@ -1,27 +1,51 @@
+import time
+# Process start for the startup timings in /ready; taken before the heavy imports below
+_PROCESS_STARTED = time.perf_counter()
+
 import os
 from dotenv import load_dotenv
-from typing import Optional, Literal, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
 
-from fastapi import FastAPI, Depends, HTTPException, status, Request, Body, Path
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Body, Path, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from fastapi.routing import APIRouter
-from pydantic import BaseModel, Field
-from starlette.concurrency import run_in_threadpool
-from datetime import datetime, timezone
+from pydantic import BaseModel, Field, ValidationError
+from datetime import datetime, timedelta, timezone
 from contextlib import asynccontextmanager
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.interval import IntervalTrigger
 
 import asyncio
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import threading
+from cachetools import TLRUCache, TTLCache
 from firebase_admin.auth import ActionCodeSettings 
+from google.api_core import exceptions as gexc
 from google.cloud.firestore_v1 import Increment
 from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions
 import firebase_admin
-from firebase_admin import auth as fb_auth, credentials, firestore
+from firebase_admin import auth as fb_auth, credentials, firestore, firestore_async
+import recurrence
+from counter_buffer import CounterBuffer, reconcile_counts
+from event_cache import CachedEvent, EventCache
+from event_search import SEARCH_MAX_HITS, EventSearchIndex
+import metrics
+from metrics import MetricsMiddleware, instrument_client, run_in_threadpool, timed_job
+from friend_graph import FriendGraph
+from job_coordinator import JobCoordinator
+from json_response import FastJSONResponse, model_response
+from profile_fanout import DENORMALIZED_EDGE_FIELDS, ProfileFanout, edge_fields, update_edges
+from profiles import ALLOWED_DOMAIN, ALLOWED_USER_FIELDS, UserProfile, _defaults_for_new_user, _doc_to_profile
+from user_index import UserPrefixIndex, merge_search_results
 
 # Alias for clarity in transactional sections
 afs = firestore
 
+log = logging.getLogger(__name__)
+
 auth_router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 class PasswordResetRequest(BaseModel):
@@ -38,7 +62,6 @@ class EmailVerificationRequest(BaseModel):
 load_dotenv()
 
 ALLOWED_ORIGIN = "http://localhost:5173"
-ALLOWED_DOMAIN = "umass.edu"
 
 EVENT_FIELDNAMES = []
 
@@ -75,154 +98,291 @@ if not firebase_admin._apps:
     cred = credentials.Certificate(cred_path)
     firebase_admin.initialize_app(cred)
 
-db = firestore.client()
+# Sync client: scheduler jobs (run in the threadpool) and scripts.
+db = instrument_client(firestore.client(), "sync", is_async=False)
+# Async client: every request handler, so in-flight requests don't pin threadpool threads.
+adb = instrument_client(firestore_async.client(), "async", is_async=True)
 
-def getNextOccurance(recurs):
-    earliestDate = datetime(9999,1,1)
-    now = datetime.now(timezone.utc)
-    day = now.weekday()
-    month = now.month
-    year = now.year
-    i = 0
-    j = 0
-    k = 0
-    flag = False
-    dayInc = 0
-    for char in recurs:
-        match char:
-            case "M":
-                dayInc = -day
-                break
-            case "T":
-                dayInc = -day + 1
-                break
-            case "W":
-                dayInc = -day + 2
-                break
-            case "t":
-                dayInc = -day + 3
-                break
-            case "F":
-                dayInc = -day + 4
-                break
-            case "S":
-                dayInc = -day + 5
-                break
-            case "s":
-                dayInc = -day + 6
-                break
-            case _:
-                if i==0:
-                    j+=int(char)*10
-                    i+=1
-                elif i ==1: 
-                    j+=int(char)
-                    i+=1
-                elif i ==2:
-                    k+=10*int(char)
-                    i+=1
-                else:
-                    k+=int(char)
-                    flag = True
-                    i = 0
-                break
-        if flag:
-            if dayInc <= 0:
-                dayInc +=7
-            newDay = day + dayInc
-            occurrance = datetime(year,month,newDay,j,k)
-            j=0
-            k=0
-            flag = False
-            if occurrance < earliestDate:
-                earliestDate = occurrance
-    return earliestDate
-
-
-            
-#TODO after testing, we need to implement this function
-#TODO completely untested
+# Max writes per batch commit (Firestore limit is 500)
+BATCH_WRITE_LIMIT = 500
+
+@timed_job("recur_events")
 def recur_events():
-    time = firestore.SERVER_TIMESTAMP
+    """
+    Move every recurring event's `end` to its next occurrence.
+    Rules are compiled once per distinct string and the updates go out in batches.
+    """
     try:
-        recurring_events = db.collection('events').where(EVENT_IS_RECURRING_FIELDNAME, "!=", "0").get()
+        recurring_events = list(
+            db.collection('events')
+            .where(filter=FieldFilter(EVENT_IS_RECURRING_FIELDNAME, "!=", recurrence.NOT_RECURRING))
+            .select([EVENT_IS_RECURRING_FIELDNAME, EVENT_END_FIELDNAME])
+            .stream()
+        )
     except Exception as e:
         print(f"Unexpected {e=}, {type(e)=}")
         return
-    for event in recurring_events:
-        doc = event.data()
-        event.update({EVENT_END_FIELDNAME : getNextOccurance(doc[EVENT_IS_RECURRING_FIELDNAME])})
-        event.update({EVENT_UPDATED_AT_FIELDNAME:time})
+
+    now = datetime.now(timezone.utc)
+    snaps = {snap.id: snap for snap in recurring_events}
+    next_ends = recurrence.next_occurrences(
+        ((snap.id, snap.get(EVENT_IS_RECURRING_FIELDNAME)) for snap in recurring_events), now
+    )
+
+    batch = db.batch()
+    pending = 0
+    updated = 0
+    for event_id, next_end in next_ends.items():
+        snap = snaps[event_id]
+        if next_end is None or (snap.to_dict() or {}).get(EVENT_END_FIELDNAME) == next_end:
+            continue
+        batch.update(snap.reference, {
+            EVENT_END_FIELDNAME: next_end,
+            EVENT_UPDATED_AT_FIELDNAME: firestore.SERVER_TIMESTAMP,
+        })
+        pending += 1
+        updated += 1
+        if pending == BATCH_WRITE_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    print(f"Advanced {updated} of {len(recurring_events)} recurring events.")
     
 
 # --- deleting expired events ---
 
-def delete_expired_events():
+# Events fetched per page of the expired-events query
+REAPER_PAGE_SIZE = 500
+# Per-run budget; whatever is left is picked up by the next run
+REAPER_MAX_SECONDS = 15 * 60
+REAPER_MAX_OPS = 1_000_000
+# Threads listing rsvps subcollections for a page of events
+REAPER_LIST_WORKERS = 16
+
+# RSVP counts live in events/{id}/rsvpShards/{0..RSVP_SHARDS-1} as {count}, so a
+# popular event's RSVP writes spread over several documents
+RSVP_SHARDS = 10
+RSVP_SHARDS_SUBCOLLECTION = "rsvpShards"
+# Set on shard 0 once the shards hold a full recount; until then ±1 increments
+# are relative to nothing (e.g. events with RSVPs from before the shards existed)
+RSVP_SEEDED_FIELD = "seeded"
+
+def _event_child_refs(event_ref):
+    """
+    (rsvp count, refs) to delete along with an event: events/{id}/rsvps/{uid},
+    the users/{uid}/rsvps/{id} mirrors and the event's RSVP counter shards.
+    """
+    refs = []
+    rsvps = 0
+    for rsvp_ref in event_ref.collection("rsvps").list_documents(page_size=REAPER_PAGE_SIZE):
+        refs.append(rsvp_ref)
+        refs.append(db.collection("users").document(rsvp_ref.id).collection("rsvps").document(event_ref.id))
+        rsvps += 1
+    refs.extend(event_ref.collection(RSVP_SHARDS_SUBCOLLECTION).list_documents())
+    return rsvps, refs
+
+def _is_recurring(snap) -> bool:
+    """True if recur_events will move this event's `end` forward (malformed rules never are)."""
+    try:
+        return bool(recurrence.compile_rule((snap.to_dict() or {}).get(EVENT_IS_RECURRING_FIELDNAME)))
+    except ValueError:
+        return False
+
+
+@timed_job("delete_expired_events")
+def delete_expired_events(max_seconds: float = REAPER_MAX_SECONDS, max_ops: int = REAPER_MAX_OPS,
+                          keep_going: Callable[[], bool] = lambda: True) -> dict:
     """
     Background task to find and delete expired events from Firestore.
+
+    Pages through expired events by cursor (ids only), lists each page's rsvps
+    subcollections in parallel, and hands the event, its RSVPs, the mirrored
+    users/{uid}/rsvps docs and its counter shards to a BulkWriter. Stops early once the time or op budget
+    is spent, or once keep_going() is false (this worker lost the scheduler lease). Deleted events drop out of the query, so the next run resumes
+    where this one stopped.
+
+    Recurring events are skipped: their `end` is only the current occurrence,
+    which recur_events rolls forward, possibly after this job has run.
     """
     print("Running background task to delete expired events...")
-    # Define the collection where your events are stored
-    events_ref = db.collection('events')
-
-    # Use a standard datetime object for the query comparison
     now_utc = datetime.now(timezone.utc)
+    started = time.monotonic()
+    stats = {"events": 0, "rsvps": 0, "recurring": 0, "ops": 0, "failed": 0, "complete": False}
 
-    # Query for events where 'endDate' is less than the current time
-    try:
-        expired_events_query = events_ref.where(filter=FieldFilter('end', '<', now_utc))
-        snapshots = expired_events_query.stream() # This returns a sync generator
-
-        # A batch allows you to delete multiple documents in a single request.
-        batch = db.batch()
-        count = 0
-
-        # Loop over the synchronous generator
-        for doc_snapshot in snapshots:
-            batch.delete(doc_snapshot.reference)
-            count += 1
-            if count % 500 == 0:
-                batch.commit() # Commit synchronously
-                batch = db.batch()
-
-        if count > 0:
-            batch.commit() # Commit the final batch
-            print(f"Deleted {count} expired events.")
-        else:
-            print("No expired events found.")
+    query = (
+        db.collection("events")
+        .where(filter=FieldFilter(EVENT_END_FIELDNAME, "<", now_utc))
+        .order_by(EVENT_END_FIELDNAME)
+        .select([EVENT_END_FIELDNAME, EVENT_IS_RECURRING_FIELDNAME])
+        .limit(REAPER_PAGE_SIZE)
+    )
 
-    except Exception as e:
-        print(f"Error during expired event cleanup: {e}")
+    writer = db.bulk_writer(BulkWriterOptions(initial_ops_per_second=500, max_ops_per_second=10_000))
+
+    def on_error(failure, _writer):
+        if failure.attempts < 5:
+            return True
+        stats["failed"] += 1
+        return False
 
+    writer.on_write_error(on_error)
 
-# Initialize the scheduler globally to be accessed in the lifespan context manager
-scheduler = AsyncIOScheduler()
+    try:
+        cursor = None
+        with ThreadPoolExecutor(max_workers=REAPER_LIST_WORKERS) as pool:
+            while True:
+                if time.monotonic() - started > max_seconds or stats["ops"] >= max_ops or not keep_going():
+                    break
+                page_query = query.start_after(cursor) if cursor else query
+                page = list(page_query.stream())
+                if not page:
+                    stats["complete"] = True
+                    break
+                cursor = page[-1]
+
+                expired = [snap for snap in page if not _is_recurring(snap)]
+                stats["recurring"] += len(page) - len(expired)
+                event_refs = [snap.reference for snap in expired]
+                for event_ref, (rsvps, child_refs) in zip(event_refs, pool.map(_event_child_refs, event_refs)):
+                    for ref in child_refs:
+                        writer.delete(ref)
+                    writer.delete(event_ref)
+                    stats["rsvps"] += rsvps
+                    stats["ops"] += len(child_refs) + 1
+                stats["events"] += len(expired)
+
+                if len(page) < REAPER_PAGE_SIZE:
+                    stats["complete"] = True
+                    break
+    except Exception as e:
+        print(f"Error during expired event cleanup: {e}")
+    finally:
+        writer.close()  # flushes everything still queued
+
+    elapsed = time.monotonic() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["opsPerSec"] = round(stats["ops"] / elapsed, 1) if elapsed > 0 else 0.0
+    if stats["events"]:
+        print(
+            f"Deleted {stats['events']} expired events and {stats['rsvps']} RSVPs "
+            f"({stats['ops']} ops, {stats['failed']} failed) in {stats['seconds']}s "
+            f"= {stats['opsPerSec']} ops/s{'' if stats['complete'] else '; budget reached, will resume next run'}."
+        )
+    else:
+        print("No expired events found.")
+    return stats
+
+
+@timed_job("reconcile_counts")
+def reconcile_user_counts(keep_going: Callable[[], bool] = lambda: True) -> dict:
+    """Fix friendsCount/pendingCount that drifted from the subcollections (lost or doubled write-behind deltas)."""
+    return reconcile_counts(db, keep_going=keep_going)
+
+# Background jobs: the singleton ones run on whichever worker holds the Firestore lease
+jobs = JobCoordinator(adb)
+# Cleanup also runs on the first heartbeat of a fresh deployment, then daily
+# The long ones stop between pages once this worker is no longer the leader
+jobs.register("delete_expired_events",
+              lambda: run_in_threadpool(delete_expired_events, keep_going=lambda: jobs.is_leader),
+              timedelta(hours=24))
+jobs.register("recur_events", lambda: run_in_threadpool(recur_events), timedelta(hours=1))
+jobs.register("reconcile_counts",
+              lambda: run_in_threadpool(reconcile_user_counts, keep_going=lambda: jobs.is_leader),
+              timedelta(hours=6))
+
+# Typeahead index for /friends/search, fed by a listener on `users`
+user_index = UserPrefixIndex()
+# Read model for /events, fed by a listener on `events`
+event_cache = EventCache(EVENT_FIELDNAMES)
+# Full-text index for /events/search, re-indexed in the background as event_cache changes
+event_search = EventSearchIndex(event_cache.docs)
+event_cache.subscribe(event_search.mark_changed)
+# Debounced rewrite of friend edges after name/photoURL edits
+profile_fanout = ProfileFanout(adb)
+# Write-behind friendsCount/pendingCount deltas from the friends endpoints
+counters = CounterBuffer(adb)
+# Friend graph for /friends/suggestions; loaded at startup, kept in step by the friends endpoints
+friend_graph = FriendGraph()
+# Other workers' friend changes only reach this worker's graph on reload
+jobs.register("friend_graph_reload", lambda: run_in_threadpool(friend_graph.load, db), timedelta(hours=6),
+              singleton=False)
+
+# Startup timings in ms (see /ready); warm-ups record their time or their error
+STARTUP: Dict[str, Any] = {"importMs": None, "lifespanMs": None, "readyMs": None, "warmups": {}}
+# A warm-up attempt still running after this is abandoned and counts as failed
+WARMUP_TIMEOUT_SECONDS = 10
+# Failed warm-ups are retried with this backoff (doubling up to the max); /ready is 503 until all succeed
+WARMUP_RETRY_SECONDS = 1.0
+WARMUP_RETRY_MAX_SECONDS = 30.0
+
+def _since_start_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+async def _warm_firestore():
+    """One cheap read on the async client: opens its gRPC channel and fetches an access token."""
+    await adb.collection("users").document("_warmup").get()
+
+def _warm_token_certs():
+    """Fetch the ID-token signing keys into firebase_admin's HTTP cache before the first verify_id_token."""
+    verifier = fb_auth._get_client(None)._token_verifier
+    verifier.request(url=verifier.id_token_verifier.cert_url)
+
+async def _warm_up():
+    async def timed(name, warm):
+        delay = WARMUP_RETRY_SECONDS
+        while True:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(warm(), WARMUP_TIMEOUT_SECONDS)
+                STARTUP["warmups"][name] = _since_start_ms(started)
+                return
+            except Exception as e:
+                # shown by /ready, which stays 503 until a retry succeeds
+                STARTUP["warmups"][name] = f"failed: {e!r}"
+                print(f"Warm-up {name} failed, retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+
+    await asyncio.gather(
+        timed("firestore", _warm_firestore),
+        timed("tokenCerts", lambda: run_in_threadpool(_warm_token_certs)),
+    )
+    STARTUP["readyMs"] = _since_start_ms(_PROCESS_STARTED)
+    print(f"Warm-up done: {STARTUP['warmups']}, ready {STARTUP['readyMs']}ms after start")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Application startup...")
-
-    # Your existing startup logic
-    if not firebase_admin._apps:
-        cred_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
-        if not cred_path:
-            raise RuntimeError("GOOGLE_APPLICATION_CREDENTIALS env var is not set")
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-    
-    # 1. Run initial cleanup immediately in a threadpool
-    await run_in_threadpool(delete_expired_events)
-
-    # 2. Start the periodic scheduler, which will also use run_in_threadpool
-    scheduler.add_job(lambda: asyncio.create_task(run_in_threadpool(delete_expired_events)), IntervalTrigger(hours=24))
-    scheduler.start()
-    
+    started = time.perf_counter()
+    STARTUP["importMs"] = _since_start_ms(_PROCESS_STARTED)
+
+    # Nothing here waits on Firestore: listeners and loads fill in behind the ready signal
+    warm_up = _spawn(_warm_up())
+    # Start the users listener first; its initial snapshot builds the search index
+    user_index.watch(db.collection("users"))
+    event_search.start()
+    event_cache.watch(db.collection("events"))
+    profile_fanout.start()
+    counters.start()
+    _spawn(run_in_threadpool(friend_graph.load, db))
+    # Cleanup and recurrence run in the background on the leader only
+    jobs.start()
+
+    STARTUP["lifespanMs"] = _since_start_ms(started)
     yield
 
-    # 3. Shut down the scheduler gracefully
-    scheduler.shutdown()
+    warm_up.cancel()  # still retrying if a warm-up never succeeded
+    # Releases the lease, so another worker takes the jobs over on its next heartbeat
+    await jobs.stop()
+    user_index.stop()
+    event_cache.stop()
+    event_search.stop()
+    await profile_fanout.stop()
+    await counters.stop()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 app.include_router(auth_router)
 app.add_middleware(
     CORSMiddleware,
@@ -231,91 +391,131 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last so it is outermost and times everything, CORS included
+app.add_middleware(MetricsMiddleware)
+
+# Optional bearer token for scrapers; /metrics is open when unset
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+def _require_metrics_token(req: Request):
+    if METRICS_TOKEN and req.headers.get("Authorization", "") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or bad metrics token")
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(req: Request):
+    """Prometheus text exposition of request, Firestore, threadpool and job metrics."""
+    _require_metrics_token(req)
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/ready", include_in_schema=False)
+def ready():
+    """
+    Readiness probe: 200 once every warm-up has succeeded and the events cache has
+    its first snapshot, 503 before (failed warm-ups are retried and listed with
+    their error). The body carries the startup timings either way.
+    """
+    caches = {"events": event_cache.ready.is_set(), "users": user_index.ready.is_set(),
+              "friendGraph": friend_graph.ready.is_set()}
+    is_ready = STARTUP["readyMs"] is not None and caches["events"]
+    return JSONResponse({"ready": is_ready, **STARTUP, "caches": caches},
+                        status_code=status.HTTP_200_OK if is_ready else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+@app.get("/jobs", include_in_schema=False)
+async def job_status(req: Request, history: int = Query(5, ge=0, le=50)):
+    """This worker's view of the scheduler, plus the latest runs of each singleton job. Same token as /metrics."""
+    _require_metrics_token(req)
+    out = jobs.status()
+    if history:
+        for name, job in out["jobs"].items():
+            if job["singleton"]:
+                job["runs"] = await jobs.history(name, history)
+    return out
 
 # --- Auth dependency ---
-def verify_token(req: Request):
-    hdr = req.headers.get("Authorization", "")
-    if not hdr.startswith("Bearer "):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing bearer token")
-    token = hdr.split(" ", 1)[1]
-    try:
-        decoded = fb_auth.verify_id_token(token)
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid ID token")
 
+# Verified tokens are cached until their own `exp`, keyed by a hash of the raw token,
+# so repeat requests skip the RSA check. The cached verdict includes the domain /
+# email-verified checks: (decoded_claims, None) or (None, (status_code, detail)).
+TOKEN_CACHE_MAXSIZE = 10_000
+_token_cache = TLRUCache(maxsize=TOKEN_CACHE_MAXSIZE, ttu=lambda _key, value, _now: value[0], timer=time.time)
+_token_cache_lock = threading.Lock()
+TOKEN_CACHE_STATS = {"hits": 0, "misses": 0}
+
+def _check_claims(decoded: dict):
+    """Return None if the claims may use the API, else (status_code, detail)."""
     email = (decoded.get("email") or "").lower()
     if not email.endswith(f"@{ALLOWED_DOMAIN}"):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="UMass email required")
+        return (status.HTTP_403_FORBIDDEN, "UMass email required")
 
     provider = (decoded.get("firebase") or {}).get("sign_in_provider")
     if provider == "password" and not decoded.get("email_verified", False):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Verify your email to continue")
-    return decoded
+        return (status.HTTP_403_FORBIDDEN, "Verify your email to continue")
+    return None
 
-# --- Models ---
-Role = Literal["student","staff","admin","professor","ta","club_officer"]
-Year = Literal["freshman","sophomore","junior","senior","grad","alumni","staff","faculty","other"]
-Visibility = Literal["public","campus","private"]
-Preference_Types = Literal["defaultPreference","preference1","preference2"]
-
-class UserProfile(BaseModel):
-    uid: str
-    email: str
-    name: Optional[str] = None
-    photoURL: Optional[str] = None
-    primaryRole: Optional[Role] = None
-    roles: List[Role] = Field(default_factory=list)
-    year: Optional[Year] = None
-    major: Optional[str] = None
-    bio: Optional[str] = ""
-    pronouns: Optional[str] = None
-    phone: Optional[str] = None
-    visibility: Visibility = "campus"
-    notificationPrefs: Dict[str, bool] = Field(default_factory=lambda: {"eventReminders": True, "emailUpdates": False, "push": True})
-    domainOk: bool = True
-    isStaffVerified: bool = False
-    createdAt: Optional[Any] = None
-    updatedAt: Optional[Any] = None
-    #TODO something may be wrong...
-    preferences: List[Preference_Types] = Field(default_factory=list)
-# Fields users are allowed to update via PATCH
-ALLOWED_USER_FIELDS = {
-    "name","photoURL","year","major","bio","pronouns","phone","visibility","notificationPrefs","preferences"
-}
-
-def _defaults_for_new_user(uid: str, email: str, name: Optional[str], photo: Optional[str]) -> dict:
-    return {
-        "uid": uid,
-        "email": email,
-        "name": name or "",
-        "photoURL": photo or "",
-        "primaryRole": "student",
-        "roles": ["student"],
-        "year": None,
-        "major": None,
-        "bio": "",
-        "pronouns": None,
-        "phone": None,
-        #TODO something may be wrong...
-        "preferences": ["defaultPreference"],
-        "visibility": "campus",
-        "notificationPrefs": {"eventReminders": True, "emailUpdates": False, "push": True},
-        "domainOk": email.endswith(f"@{ALLOWED_DOMAIN}"),
-        "isStaffVerified": False,
-        "createdAt": afs.SERVER_TIMESTAMP,
-        "updatedAt": afs.SERVER_TIMESTAMP,
-        # Useful for search (optional but recommended)
-        "nameLower": (name or "").lower(),
-        "emailLower": (email or "").lower(),
-        # Counters
-        "friendsCount": 0,
-        "pendingCount": 0,
-    }
+async def verify_token(req: Request):
+    hdr = req.headers.get("Authorization", "")
+    if not hdr.startswith("Bearer "):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing bearer token")
+    token = hdr.split(" ", 1)[1]
+    key = hashlib.sha256(token.encode()).digest()
+
+    with _token_cache_lock:
+        entry = _token_cache.get(key)
+        TOKEN_CACHE_STATS["hits" if entry else "misses"] += 1
+
+    if entry is None:
+        try:
+            # only a miss pays for a thread hop; hits are answered on the event loop
+            decoded = await run_in_threadpool(fb_auth.verify_id_token, token)
+        except Exception:
+            # not cached: a bad token shouldn't take a slot, and key-fetch errors are transient
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid ID token")
+        entry = (decoded["exp"], decoded, _check_claims(decoded))
+        with _token_cache_lock:
+            _token_cache[key] = entry
+
+    _exp, decoded, error = entry
+    if error:
+        raise HTTPException(status_code=error[0], detail=error[1])
+    return decoded
 
-def _doc_to_profile(doc) -> UserProfile:
-    data = doc.to_dict()
-    return UserProfile(**data)
+@app.get("/auth/token-cache", include_in_schema=False)
+def token_cache_stats(req: Request):
+    """Hit/miss counters for the verified-token cache. Same token as /metrics."""
+    _require_metrics_token(req)
+    with _token_cache_lock:
+        return {**TOKEN_CACHE_STATS, "size": len(_token_cache), "maxsize": TOKEN_CACHE_MAXSIZE}
+
+def _token_cache_gauges():
+    with _token_cache_lock:
+        yield {"stat": "hits"}, TOKEN_CACHE_STATS["hits"]
+        yield {"stat": "misses"}, TOKEN_CACHE_STATS["misses"]
+        yield {"stat": "size"}, len(_token_cache)
+
+metrics.register_gauges("token_cache", "Verified-token cache counters and size.", _token_cache_gauges)
+metrics.register_gauges("profile_cache", "GET /users/me profile cache counters and size.",
+                        lambda: [*(({"stat": k}, v) for k, v in PROFILE_CACHE_STATS.items()),
+                                 ({"stat": "size"}, len(_profile_cache))])
+metrics.register_gauges("profile_fanout", "Friend-edge fan-out counters.",
+                        lambda: (({"stat": k}, v) for k, v in profile_fanout.stats.items()))
+metrics.register_gauges("friend_counters", "Write-behind friend counter buffer; pending is users not yet flushed.",
+                        lambda: [*(({"stat": k}, v) for k, v in counters.stats.items()),
+                                 ({"stat": "pending"}, len(counters))])
+metrics.register_gauges("event_search_index", "Event search index counters.",
+                        lambda: [*(({"stat": k}, v) for k, v in event_search.stats.items()),
+                                 ({"stat": "bytes"}, event_search.size_in_bytes())])
+metrics.register_gauges("startup_milliseconds", "Startup phase timings; warm-ups that failed are left out.",
+                        lambda: [*(({"phase": k}, v) for k, v in STARTUP.items() if isinstance(v, float)),
+                                 *(({"phase": f"warmup_{k}"}, v) for k, v in STARTUP["warmups"].items()
+                                   if isinstance(v, float))])
+metrics.register_gauges("scheduler", "Job coordinator counters; leader is 1 on the worker holding the lease.",
+                        lambda: [({"stat": "leader"}, int(jobs.is_leader)),
+                                 *(({"stat": k}, v) for k, v in jobs.stats.items())])
+metrics.register_gauges("cache_entries", "Entries in the in-memory read models.",
+                        lambda: [({"cache": "users"}, len(user_index)), ({"cache": "events"}, len(event_cache)),
+                                 ({"cache": "friend_graph_users"}, len(friend_graph))])
 
+# --- Models ---
 # --- Core user routes ---
 
 @app.get("/me")
@@ -329,73 +529,280 @@ def me(decoded: dict = Depends(verify_token)):
         "domain_ok": True,
     }
 
+# Per-worker cache of validated profiles for GET /users/me. Writes through this
+# worker's PATCH/DELETE; the TTL bounds staleness from writes on other workers.
+PROFILE_CACHE_MAXSIZE = 10_000
+PROFILE_CACHE_TTL_SECONDS = 60
+_profile_cache = TTLCache(maxsize=PROFILE_CACHE_MAXSIZE, ttl=PROFILE_CACHE_TTL_SECONDS)
+PROFILE_CACHE_STATS = {"hits": 0, "misses": 0}
+
+def _with_commit_time(data: dict, write_result) -> dict:
+    """Replace SERVER_TIMESTAMP sentinels with the commit time they resolve to."""
+    return {k: write_result.update_time if v is afs.SERVER_TIMESTAMP else v for k, v in data.items()}
+
+def _validated_profile(data: dict) -> UserProfile:
+    try:
+        return UserProfile(**data)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
 @app.get("/users/me", response_model=UserProfile)
-def get_or_create_me(decoded: dict = Depends(verify_token)):
+async def get_or_create_me(decoded: dict = Depends(verify_token)):
     uid = decoded["uid"]
-    email = decoded.get("email") or ""
-    name = decoded.get("name")
-    picture = decoded.get("picture")
-
-    
-    ref = db.collection("users").document(uid)
-    snap = ref.get()  
-    if not snap.exists:
-        #some things are wrong so this is a temporary fix
-        
-        snap = ref.get(_defaults_for_new_user(uid, email, name, picture))
-    return _doc_to_profile(snap)
+    profile = _profile_cache.get(uid)
+    PROFILE_CACHE_STATS["hits" if profile is not None else "misses"] += 1
+    if profile is not None:
+        return model_response(profile)
+
+    ref = adb.collection("users").document(uid)
+    snap = await ref.get()
+    if snap.exists:
+        profile = _doc_to_profile(snap)
+    else:
+        data = _defaults_for_new_user(uid, decoded.get("email") or "", decoded.get("name"), decoded.get("picture"))
+        try:
+            # create-if-absent: fails instead of overwriting if a concurrent request got there first
+            profile = UserProfile(**_with_commit_time(data, await ref.create(data)))
+        except gexc.Conflict:
+            profile = _doc_to_profile(await ref.get())
+    _profile_cache[uid] = profile
+    return model_response(profile)
 
 @app.patch("/users/me", response_model=UserProfile)
-def update_me(payload: dict = Body(...), decoded: dict = Depends(verify_token)):
-    uid = decoded["uid"]
-    ref = db.collection("users").document(uid)
-    snap = ref.get()
-    if not snap.exists:
-        email = decoded.get("email") or ""
-        name = decoded.get("name")
-        picture = decoded.get("picture")
-        ref.set(_defaults_for_new_user(uid, email, name, picture))
+async def update_me(payload: dict = Body(...), decoded: dict = Depends(verify_token)):
     update_data = {k: v for k, v in payload.items() if k in ALLOWED_USER_FIELDS}
     if not update_data:
         raise HTTPException(status_code=400, detail="No writable fields provided.")
+    if "name" in update_data:
+        update_data["nameLower"] = (update_data["name"] or "").lower()
     update_data["updatedAt"] = afs.SERVER_TIMESTAMP
-    ref.set(update_data, merge=True)
-    return _doc_to_profile(ref.get())
 
-@app.delete("/users/me")
-def delete_me(decoded: dict = Depends(verify_token)):
-    """Deletes the authenticated user's account and all associated data."""
     uid = decoded["uid"]
+    ref = adb.collection("users").document(uid)
+    snap = await ref.get()
+    if snap.exists:
+        current = snap.to_dict() or {}
+        # validate before writing, so a bad value is a 422 instead of a stored profile that no longer parses
+        _validated_profile({**current, **update_data, "updatedAt": None})
+        result = await ref.set(update_data, merge=True)
+        merged = {**current, **_with_commit_time(update_data, result)}
+    else:
+        current = {}
+        data = {**_defaults_for_new_user(uid, decoded.get("email") or "", decoded.get("name"), decoded.get("picture")),
+                **update_data}
+        _validated_profile({**data, "createdAt": None, "updatedAt": None})
+        try:
+            merged = _with_commit_time(data, await ref.create(data))
+        except gexc.Conflict:
+            # created by a concurrent GET /users/me; apply on top of it
+            _profile_cache.pop(uid, None)
+            return await update_me(payload, decoded)
+    profile = _profile_cache[uid] = UserProfile(**merged)
+    if any(f in update_data and update_data[f] != current.get(f) for f in DENORMALIZED_EDGE_FIELDS):
+        profile_fanout.schedule(uid)
+    return model_response(profile)
+
+# --- Account deletion ---
+
+# Subcollections of users/{uid} removed wholesale on account deletion
+USER_SUBCOLLECTIONS = ["friends", "friendRequests", "posts", "events", "rsvps"]
+
+# Per-worker progress of account deletions, keyed by uid
+_deletion_jobs: Dict[str, dict] = {}
+# uid -> monotonic time its deletion finished; entries are dropped DELETION_KEEP_SECONDS later
+_deletion_finished: Dict[str, float] = {}
+# Start and outcome of each deletion are also kept in accountDeletions/{uid}, so any
+# worker can answer GET /users/me/deletion (set a TTL policy on `expiresAt` to clean them up)
+DELETIONS_COLLECTION = "accountDeletions"
+DELETION_KEEP_SECONDS = 15 * 60
+# Strong refs so running teardown tasks aren't garbage collected
+_background_tasks = set()
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+def _teardown_account(uid: str, job: dict):
+    """
+    Delete everything a user owns, then the Auth account. Runs in the threadpool.
 
+    All subcollections (plus the events/*/rsvps/{uid} docs) are listed in parallel,
+    then every delete goes through one BulkWriter. So do the mirrored edges in
+    friends' subcollections and their friendsCount decrements, the user's
+    outgoing requests in other inboxes and those users' pendingCount
+    decrements, and one RSVP shard decrement per event RSVP that still existed.
+    """
+    user_ref = db.collection("users").document(uid)
+    users = db.collection("users")
+
+    def list_ids(sub):
+        return [ref.id for ref in user_ref.collection(sub).list_documents(page_size=REAPER_PAGE_SIZE)]
+
+    def warn(message: str):
+        log.warning("Account deletion for %s: %s", uid, message)
+        job["warnings"].append(message)
+
+    # Both collection-group lookups need the single-field indexes in
+    # firestore.indexes.json; without them (FAILED_PRECONDITION) the teardown
+    # carries on and the deletion reports what it could not clean up.
+    def event_rsvps_by_uid():
+        # events/*/rsvps/{uid} carry `uid`; this also catches RSVPs without a users/{uid}/rsvps mirror
+        try:
+            qry = db.collection_group("rsvps").where(filter=FieldFilter("uid", "==", uid)).select([])
+            return [snap.reference for snap in qry.stream()]
+        except Exception as e:
+            warn(f"RSVP lookup failed, only RSVPs with a users/{{uid}}/rsvps mirror are removed: {e}")
+            return []
+
+    def outgoing_requests():
+        # users/*/friendRequests/{uid} carry `fromUid` (backfill_users.py --friend-requests adds it to older ones)
+        try:
+            qry = db.collection_group("friendRequests").where(filter=FieldFilter("fromUid", "==", uid)).select([])
+            return [snap.reference for snap in qry.stream()]
+        except Exception as e:
+            warn(f"Outgoing friend request lookup failed, sent requests are left in place: {e}")
+            return []
+
+    job["phase"] = "listing"
+    with ThreadPoolExecutor(max_workers=len(USER_SUBCOLLECTIONS) + 2) as pool:
+        cg_rsvps = pool.submit(event_rsvps_by_uid)
+        sent = pool.submit(outgoing_requests)
+        listed = dict(zip(USER_SUBCOLLECTIONS, pool.map(list_ids, USER_SUBCOLLECTIONS)))
+        cg_rsvps, sent = cg_rsvps.result(), sent.result()
+
+    deletes = {}
+    for sub, ids in listed.items():
+        for doc_id in ids:
+            ref = user_ref.collection(sub).document(doc_id)
+            deletes[ref.path] = ref
+    for ref in sent:
+        deletes[ref.path] = ref
+    event_rsvps = {ref.path: ref for ref in cg_rsvps}
+    for event_id in listed["rsvps"]:
+        ref = db.collection("events").document(event_id).collection("rsvps").document(uid)
+        event_rsvps.setdefault(ref.path, ref)
+    # mirrors can outlive their RSVP; only decrement the counts of RSVPs that are really there
+    live_rsvps = [snap.reference for snap in db.get_all(list(event_rsvps.values()), field_paths=[])
+                  if snap.exists] if event_rsvps else []
+    deletes.update(event_rsvps)
+    friend_ids = listed["friends"]
+    for fuid in friend_ids:
+        ref = users.document(fuid).collection("friends").document(uid)
+        deletes[ref.path] = ref
+
+    job["phase"] = "deleting"
+    job["total"] = len(deletes) + len(friend_ids) + len(sent) + len(live_rsvps) + 1
+    writer = db.bulk_writer(BulkWriterOptions(initial_ops_per_second=500, max_ops_per_second=10_000))
+
+    def on_result(_ref, _result, _writer):
+        job["done"] += 1
+
+    def on_error(failure, _writer):
+        # NOT_FOUND: the other user's profile is already gone, nothing to decrement
+        if failure.code != 5 and failure.attempts < 5:
+            return True
+        job["failed"] += 1
+        return False
+
+    writer.on_write_result(on_result)
+    writer.on_write_error(on_error)
+    for ref in deletes.values():
+        writer.delete(ref)
+    for fuid in friend_ids:
+        writer.update(users.document(fuid), {"friendsCount": Increment(-1)})
+    for ref in sent:
+        writer.update(ref.parent.parent, {"pendingCount": Increment(-1)})
+    for rsvp_ref in live_rsvps:
+        shard_ref = rsvp_ref.parent.parent.collection(RSVP_SHARDS_SUBCOLLECTION).document(
+            str(random.randrange(RSVP_SHARDS)))
+        writer.set(shard_ref, {"count": Increment(-1)}, merge=True)
+    writer.delete(user_ref)
+    writer.close()
+
+    job["phase"] = "auth"
+    fb_auth.delete_user(uid)
+
+def _deletion_doc(uid: str):
+    return adb.collection(DELETIONS_COLLECTION).document(uid)
+
+async def _save_deletion(uid: str, job: dict):
+    """Best effort: without it only the worker running the deletion can report on it."""
+    expires = datetime.now(timezone.utc) + timedelta(seconds=DELETION_KEEP_SECONDS)
     try:
-        user_ref = db.collection("users").document(uid)
-
-        # delete subcollections (friends, friendRequests, posts)
-        subcollections = ["friends", "friendRequests", "posts", "events"]
-        for sub in subcollections:
-            sub_ref = user_ref.collection(sub)
-            for doc in sub_ref.stream():
-                doc.reference.delete()
-
-        # delete Firestore user document
-        user_ref.delete()
-
-        # delete from Firebase Authentication
-        fb_auth.delete_user(uid)
+        await _deletion_doc(uid).set({**job, "expiresAt": expires})
+    except Exception as e:
+        print(f"Saving account deletion state for {uid} failed: {e}")
 
-        return {"ok": True, "message": "Account deleted successfully."}
+def _prune_deletion_jobs():
+    cutoff = time.monotonic() - DELETION_KEEP_SECONDS
+    for uid in [uid for uid, finished in _deletion_finished.items() if finished < cutoff]:
+        del _deletion_finished[uid]
+        _deletion_jobs.pop(uid, None)
 
+async def _run_teardown(uid: str, job: dict):
+    started = time.monotonic()
+    try:
+        await run_in_threadpool(_teardown_account, uid, job)
+        friend_graph.remove_user(uid)
+        _profile_cache.pop(uid, None)
+        job["state"] = "done"
     except fb_auth.UserNotFoundError:
-        raise HTTPException(status_code=404, detail="User not found.")
+        job["state"] = "failed"
+        job["error"] = "User not found."
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to delete account: {str(e)}")
+        job["state"] = "failed"
+        job["error"] = f"Failed to delete account: {str(e)}"
+    job["phase"] = None
+    job["seconds"] = round(time.monotonic() - started, 3)
+    _deletion_finished[uid] = time.monotonic()
+    await _save_deletion(uid, job)
+
+@app.delete("/users/me", status_code=202)
+async def delete_me(decoded: dict = Depends(verify_token)):
+    """
+    Start deleting the authenticated user's account and all associated data.
+    Returns immediately; poll GET /users/me/deletion until its state is done or failed.
+    """
+    uid = decoded["uid"]
+    _profile_cache.pop(uid, None)
+    _prune_deletion_jobs()
+    job = _deletion_jobs.get(uid)
+    if job is None or job["state"] == "failed":
+        job = _deletion_jobs[uid] = {
+            "state": "running", "phase": "queued", "done": 0, "failed": 0, "total": None, "error": None,
+            "warnings": [],
+        }
+        _deletion_finished.pop(uid, None)
+        await _save_deletion(uid, job)
+        _spawn(_run_teardown(uid, job))
+    return {"ok": True, "message": "Account deletion started.", "deletion": job}
+
+@app.get("/users/me/deletion")
+async def deletion_progress(decoded: dict = Depends(verify_token)):
+    """
+    Progress of this user's account deletion. The worker running it reports live
+    counts; any other worker returns the state saved at its start or end.
+    """
+    uid = decoded["uid"]
+    _prune_deletion_jobs()
+    job = _deletion_jobs.get(uid)
+    if job is not None:
+        return job
+    snap = await _deletion_doc(uid).get()
+    if not snap.exists:
+        raise HTTPException(status_code=404, detail="No account deletion in progress.")
+    job = snap.to_dict() or {}
+    job.pop("expiresAt", None)
+    return job
 
 # --- Friends system API ---
 
 friends = APIRouter(prefix="/friends", tags=["friends"])
 
 def _user_doc(uid: str):
-    return db.collection("users").document(uid)
+    return adb.collection("users").document(uid)
 
 def _friends_col(uid: str):
     return _user_doc(uid).collection("friends")
@@ -404,30 +811,86 @@ def _requests_col(uid: str):
     # inbox on recipient
     return _user_doc(uid).collection("friendRequests")
 
+# Page size bounds for GET /friends
+FRIENDS_PAGE_DEFAULT = 50
+FRIENDS_PAGE_MAX = 200
+# Safety net only: profile_fanout keeps edges current, so this can be long.
+# Denormalized name/photoURL on a friend edge older than this gets re-joined from
+# the profile, and the joined values are written back to the edge
+FRIEND_EDGE_MAX_AGE = timedelta(days=30)
+# Projections for list and join reads: only what the responses show
+FRIEND_EDGE_READ_FIELDS = ["name", "photoURL", "since", "lastUpdated"]
+USER_CARD_FIELDS = ["name", "email", "photoURL"]
+
+def _display_name(data: dict) -> str:
+    return data.get("name") or (data.get("email") or "").split("@")[0]
+
+def _edge_is_stale(edge: dict, now: datetime) -> bool:
+    if not edge.get("name"):
+        return True
+    updated = edge.get("lastUpdated")
+    if not isinstance(updated, datetime):
+        return True
+    return now - updated > FRIEND_EDGE_MAX_AGE
+
+async def _refresh_edges(me: str, profiles: Dict[str, dict]):
+    """Write joined name/photoURL back to me's edges, so they stop counting as stale."""
+    updates = [(_friends_col(me).document(fuid), edge_fields(data)) for fuid, data in profiles.items()]
+    try:
+        await update_edges(adb, updates)
+    except Exception as e:
+        print(f"Refreshing friend edges for {me} failed: {e}")
+
 @friends.get("")
-def list_friends(decoded: dict = Depends(verify_token)):
-    """Return current user's friends with basic display fields."""
+async def list_friends(
+    limit: int = Query(FRIENDS_PAGE_DEFAULT, ge=1, le=FRIENDS_PAGE_MAX),
+    startAfter: Optional[str] = Query(None, description="Friend uid cursor from a previous page's nextCursor"),
+    decoded: dict = Depends(verify_token),
+):
+    """
+    Return one page of the current user's friends with basic display fields.
+    Display fields come from the denormalized edge; only edges that are missing
+    them or are stale get joined against the profile, in a single batched read,
+    and the joined fields are then written back to those edges in the background.
+    """
     me = decoded["uid"]
-    snaps = list(_friends_col(me).stream())
+    qry = _friends_col(me).order_by("__name__").select(FRIEND_EDGE_READ_FIELDS).limit(limit)
+    if startAfter:
+        qry = qry.start_after({"__name__": startAfter})
+    snaps = [s async for s in qry.stream()]
+
+    now = datetime.now(timezone.utc)
+    edges = [(s.id, s.to_dict() or {}) for s in snaps]
+    stale = [fuid for fuid, edge in edges if _edge_is_stale(edge, now)]
+
+    profiles = {}
+    if stale:
+        refs = [_user_doc(fuid) for fuid in stale]
+        async for u in adb.get_all(refs, field_paths=USER_CARD_FIELDS):
+            if u.exists:
+                profiles[u.id] = u.to_dict() or {}
+        if profiles:
+            _spawn(_refresh_edges(me, profiles))
+
     out = []
-    for s in snaps:
-        fuid = s.id
-        # join minimal profile info
-        u = _user_doc(fuid).get()
-        udata = u.to_dict() or {}
+    for fuid, edge in edges:
+        src = profiles.get(fuid, edge)
         out.append({
             "uid": fuid,
-            "name": udata.get("name") or (udata.get("email") or "").split("@")[0],
-            "photoURL": udata.get("photoURL"),
-            "since": (s.to_dict() or {}).get("since"),
+            "name": _display_name(src),
+            "photoURL": src.get("photoURL"),
+            "since": edge.get("since"),
         })
-    return {"friends": out}
+
+    next_cursor = snaps[-1].id if len(snaps) == limit else None
+    return FastJSONResponse({"friends": out, "nextCursor": next_cursor})
 
 @friends.get("/requests")
-def list_requests(decoded: dict = Depends(verify_token)):
+async def list_requests(decoded: dict = Depends(verify_token)):
     """Return incoming friend requests (pending)."""
     me = decoded["uid"]
-    snaps = list(_requests_col(me).order_by("createdAt", direction=afs.Query.DESCENDING).stream())
+    qry = _requests_col(me).order_by("createdAt", direction=afs.Query.DESCENDING).select(["createdAt"])
+    snaps = [s async for s in qry.stream()]
     out = []
     for s in snaps:
         data = s.to_dict() or {}
@@ -435,44 +898,206 @@ def list_requests(decoded: dict = Depends(verify_token)):
             "fromUid": s.id,
             "createdAt": data.get("createdAt"),
         })
-    return {"requests": out}
+    return FastJSONResponse({"requests": out})
+
+# Requests handled per transaction by the bulk endpoints. Counters go through the
+# write-behind buffer, so a transaction only writes request and edge docs: up to 3
+# per accepted request (request delete plus both edges), 1 per sent or declined
+# one. Accept also reads 3 docs per request, hence the smaller chunk.
+ACCEPT_CHUNK = 100
+SEND_CHUNK = 200
+DECLINE_CHUNK = 400
+FRIEND_BULK_MAX_UIDS = 500
+
+class FriendBulkRequest(BaseModel):
+    uids: List[str] = Field(default_factory=list, max_length=FRIEND_BULK_MAX_UIDS,
+                            description="Users to act on; for accept/decline, empty means every pending request")
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+async def _get_many(refs: list, transaction=None, field_paths=None) -> Dict[str, Any]:
+    """Fetch many documents in one batched read, keyed by document path."""
+    out = {}
+    if refs:
+        async for snap in adb.get_all(refs, field_paths=field_paths, transaction=transaction):
+            out[snap.reference.path] = snap
+    return out
+
+async def _pending_from(me: str, uids: List[str]) -> List[str]:
+    if uids:
+        return list(dict.fromkeys(u for u in uids if u and u != me))
+    return [s.id async for s in _requests_col(me).select([]).stream()]
+
+@friends.post("/requests")
+async def send_requests_bulk(payload: FriendBulkRequest, decoded: dict = Depends(verify_token)):
+    """Send friend requests to many users; one transaction per SEND_CHUNK recipients."""
+    me = decoded["uid"]
+    targets = list(dict.fromkeys(u for u in payload.uids if u and u != me))
+    # recipients are checked outside the transactions, which only touch request/edge docs
+    users = await _get_many([_user_doc(u) for u in targets], field_paths=[])
+    sent = []
+    skipped = [u for u in targets if not users[_user_doc(u).path].exists]
+    targets = [u for u in targets if users[_user_doc(u).path].exists]
+
+    for chunk in _chunks(targets, SEND_CHUNK):
+        @afs.async_transactional
+        async def txn(tx: afs.AsyncTransaction):
+            refs = []
+            for to_uid in chunk:
+                refs += [_friends_col(me).document(to_uid), _requests_col(to_uid).document(me)]
+            snaps = await _get_many(refs, transaction=tx, field_paths=[])
+            done, skip = [], []
+            for to_uid in chunk:
+                req_ref = _requests_col(to_uid).document(me)
+                if snaps[_friends_col(me).document(to_uid).path].exists or snaps[req_ref.path].exists:
+                    skip.append(to_uid)
+                    continue
+                tx.set(req_ref, {"createdAt": afs.SERVER_TIMESTAMP, "fromUid": me})
+                done.append(to_uid)
+            return done, skip
+
+        done, skip = await txn(adb.transaction())
+        for to_uid in done:
+            counters.add(to_uid, pendingCount=1)
+        sent += done
+        skipped += skip
+    return {"ok": True, "sent": sent, "skipped": skipped}
+
+@friends.post("/requests/accept")
+async def accept_requests_bulk(payload: FriendBulkRequest = Body(FriendBulkRequest()), decoded: dict = Depends(verify_token)):
+    """
+    Accept many incoming requests (all pending if `uids` is empty).
+    One transaction per ACCEPT_CHUNK requests; the counters go through the
+    write-behind buffer, with one net delta for the current user.
+    """
+    me = decoded["uid"]
+    me_doc = _user_doc(me)
+    from_uids = await _pending_from(me, payload.uids)
+    accepted, skipped = [], []
+
+    for chunk in _chunks(from_uids, ACCEPT_CHUNK):
+        # names for the edges, read outside the transaction; fan-out corrects a racing rename
+        profiles = await _get_many([me_doc] + [_user_doc(f) for f in chunk],
+                                   field_paths=list(DENORMALIZED_EDGE_FIELDS))
+        me_data = profiles[me_doc.path].to_dict() or {}
+
+        @afs.async_transactional
+        async def txn(tx: afs.AsyncTransaction):
+            refs = []
+            for f in chunk:
+                refs += [_requests_col(me).document(f), _friends_col(me).document(f), _friends_col(f).document(me)]
+            snaps = await _get_many(refs, transaction=tx, field_paths=[])
+            now = afs.SERVER_TIMESTAMP
+            done, skip, them_added = [], [], []
+            friends_added = 0
+            requests_removed = 0
+            for f in chunk:
+                req_ref = _requests_col(me).document(f)
+                if not snaps[req_ref.path].exists:
+                    skip.append(f)
+                    continue
+                tx.delete(req_ref)
+                requests_removed += 1
+                them_snap = profiles[_user_doc(f).path]
+                if not them_snap.exists:
+                    # sender's account is gone; just clear the request
+                    skip.append(f)
+                    continue
+                them_data = them_snap.to_dict() or {}
+                me_edge = _friends_col(me).document(f)
+                them_edge = _friends_col(f).document(me)
+                if not snaps[me_edge.path].exists:
+                    tx.set(me_edge, {
+                        "uid": f,
+                        "since": now,
+                        "lastUpdated": now,
+                        "name": them_data.get("name", ""),
+                        "photoURL": them_data.get("photoURL"),
+                    })
+                    friends_added += 1
+                if not snaps[them_edge.path].exists:
+                    tx.set(them_edge, {
+                        "uid": me,
+                        "since": now,
+                        "lastUpdated": now,
+                        "name": me_data.get("name", ""),
+                        "photoURL": me_data.get("photoURL"),
+                    })
+                    them_added.append(f)
+                done.append(f)
+            return done, skip, them_added, friends_added, requests_removed
+
+        done, skip, them_added, friends_added, requests_removed = await txn(adb.transaction())
+        counters.add(me, friendsCount=friends_added, pendingCount=-requests_removed)
+        for f in them_added:
+            counters.add(f, friendsCount=1)
+        accepted += done
+        skipped += skip
+
+    for f in accepted:
+        friend_graph.add_friendship(me, f)
+    return {"ok": True, "accepted": accepted, "skipped": skipped}
+
+@friends.post("/requests/decline")
+async def decline_requests_bulk(payload: FriendBulkRequest = Body(FriendBulkRequest()), decoded: dict = Depends(verify_token)):
+    """Decline many incoming requests (all pending if `uids` is empty)."""
+    me = decoded["uid"]
+    from_uids = await _pending_from(me, payload.uids)
+    declined = []
+
+    for chunk in _chunks(from_uids, DECLINE_CHUNK):
+        @afs.async_transactional
+        async def txn(tx: afs.AsyncTransaction):
+            refs = [_requests_col(me).document(f) for f in chunk]
+            snaps = await _get_many(refs, transaction=tx, field_paths=[])
+            done = [f for f, ref in zip(chunk, refs) if snaps[ref.path].exists]
+            for f in done:
+                tx.delete(_requests_col(me).document(f))
+            return done
+
+        done = await txn(adb.transaction())
+        counters.add(me, pendingCount=-len(done))
+        declined += done
+    return {"ok": True, "declined": declined}
 
 @friends.post("/requests/{to_uid}")
-def send_request(to_uid: str = Path(...), decoded: dict = Depends(verify_token)):
+async def send_request(to_uid: str = Path(...), decoded: dict = Depends(verify_token)):
     """Send a friend request to to_uid (idempotent)."""
     me = decoded["uid"]
     if me == to_uid:
         raise HTTPException(400, "Cannot friend yourself.")
 
-    me_doc = _user_doc(me)
     them_doc = _user_doc(to_uid)
     req_ref = _requests_col(to_uid).document(me)  # stored under recipient inbox
 
-    @afs.transactional
-    def txn(tx: afs.Transaction):
-        # ---- READS first
-        them_exists = them_doc.get(transaction=tx).exists
-        if not them_exists:
-            raise HTTPException(404, "Recipient not found")
+    # Checked outside the transaction, so it only locks the edge and request docs
+    if not (await them_doc.get(field_paths=[])).exists:
+        raise HTTPException(404, "Recipient not found")
 
+    @afs.async_transactional
+    async def txn(tx: afs.AsyncTransaction):
+        # ---- READS first
         # If already friends, bail early
-        if _friends_col(me).document(to_uid).get(transaction=tx).exists:
-            return
+        if (await _friends_col(me).document(to_uid).get(transaction=tx)).exists:
+            return False
 
-        req_snap = req_ref.get(transaction=tx)
+        req_snap = await req_ref.get(transaction=tx)
         if req_snap.exists:
             # already pending; do nothing (idempotent)
-            return
+            return False
 
         # ---- WRITES
-        tx.set(req_ref, {"createdAt": afs.SERVER_TIMESTAMP})
-        tx.update(them_doc, {"pendingCount": Increment(1)})
+        tx.set(req_ref, {"createdAt": afs.SERVER_TIMESTAMP, "fromUid": me})
+        return True
 
-    txn(db.transaction())
+    if await txn(adb.transaction()):
+        counters.add(to_uid, pendingCount=1)
     return {"ok": True}
 
 @friends.post("/requests/{from_uid}/accept")
-def accept_request(from_uid: str = Path(...), decoded: dict = Depends(verify_token)):
+async def accept_request(from_uid: str = Path(...), decoded: dict = Depends(verify_token)):
     """
     Accept request sent by from_uid → current user.
     Creates mirrored edges, updates counts, removes request.
@@ -485,18 +1110,20 @@ def accept_request(from_uid: str = Path(...), decoded: dict = Depends(verify_tok
     me_edge = _friends_col(me).document(from_uid)
     them_edge = _friends_col(from_uid).document(me)
 
-    @afs.transactional
-    def txn(tx: afs.Transaction):
+    # Names for the edges, read outside the transaction; fan-out corrects a racing rename
+    profiles = await _get_many([me_doc, them_doc], field_paths=list(DENORMALIZED_EDGE_FIELDS))
+    me_data = profiles[me_doc.path].to_dict() or {}
+    them_data = profiles[them_doc.path].to_dict() or {}
+
+    @afs.async_transactional
+    async def txn(tx: afs.AsyncTransaction):
         # ---- READS first
-        req_snap = req_ref.get(transaction=tx)
+        req_snap = await req_ref.get(transaction=tx)
         if not req_snap.exists:
             raise HTTPException(404, "Request not found")
 
-        me_data = me_doc.get(transaction=tx).to_dict() or {}
-        them_data = them_doc.get(transaction=tx).to_dict() or {}
-
-        me_edge_exists = me_edge.get(transaction=tx).exists
-        them_edge_exists = them_edge.get(transaction=tx).exists
+        me_edge_exists = (await me_edge.get(transaction=tx)).exists
+        them_edge_exists = (await them_edge.get(transaction=tx)).exists
 
         # ---- WRITES
         now = afs.SERVER_TIMESTAMP
@@ -509,7 +1136,6 @@ def accept_request(from_uid: str = Path(...), decoded: dict = Depends(verify_tok
                 "name": them_data.get("name", ""),
                 "photoURL": them_data.get("photoURL"),
             })
-            tx.update(me_doc, {"friendsCount": Increment(1)})
 
         if not them_edge_exists:
             tx.set(them_edge, {
@@ -519,76 +1145,76 @@ def accept_request(from_uid: str = Path(...), decoded: dict = Depends(verify_tok
                 "name": me_data.get("name", ""),
                 "photoURL": me_data.get("photoURL"),
             })
-            tx.update(them_doc, {"friendsCount": Increment(1)})
 
         tx.delete(req_ref)
-        tx.update(me_doc, {"pendingCount": Increment(-1)})
+        return not me_edge_exists, not them_edge_exists
 
-    txn(db.transaction())
+    me_added, them_added = await txn(adb.transaction())
+    counters.add(me, friendsCount=int(me_added), pendingCount=-1)
+    counters.add(from_uid, friendsCount=int(them_added))
+    friend_graph.add_friendship(me, from_uid)
     return {"ok": True}
 
 @friends.post("/requests/{from_uid}/decline")
-def decline_request(from_uid: str = Path(...), decoded: dict = Depends(verify_token)):
+async def decline_request(from_uid: str = Path(...), decoded: dict = Depends(verify_token)):
     """Decline (delete) an incoming request and decrement pendingCount."""
     me = decoded["uid"]
-    me_doc = _user_doc(me)
     req_ref = _requests_col(me).document(from_uid)
 
-    @afs.transactional
-    def txn(tx: afs.Transaction):
+    @afs.async_transactional
+    async def txn(tx: afs.AsyncTransaction):
         # ---- READS first
-        snap = req_ref.get(transaction=tx)
+        snap = await req_ref.get(transaction=tx)
         if not snap.exists:
             raise HTTPException(404, "Request not found")
 
         # ---- WRITES
         tx.delete(req_ref)
-        tx.update(me_doc, {"pendingCount": Increment(-1)})
 
-    txn(db.transaction())
+    await txn(adb.transaction())
+    counters.add(me, pendingCount=-1)
     return {"ok": True}
 
 @friends.delete("/{friend_uid}")
-def unfriend(friend_uid: str, decoded: dict = Depends(verify_token)):
+async def unfriend(friend_uid: str, decoded: dict = Depends(verify_token)):
     """Remove friendship both directions and update counters appropriately (idempotent)."""
     me = decoded["uid"]
     if me == friend_uid:
         raise HTTPException(400, "Cannot unfriend yourself.")
 
-    me_doc   = _user_doc(me)
-    them_doc = _user_doc(friend_uid)
     me_edge  = _friends_col(me).document(friend_uid)
     them_edge = _friends_col(friend_uid).document(me)
     req_doc  = _requests_col(me).document(friend_uid)  # in case a pending request exists
 
-    @afs.transactional
-    def txn(tx: afs.Transaction):
+    @afs.async_transactional
+    async def txn(tx: afs.AsyncTransaction):
         # ------- READS (all reads happen before any write) -------
-        me_edge_snap   = me_edge.get(transaction=tx)
-        them_edge_snap = them_edge.get(transaction=tx)
-        req_snap       = req_doc.get(transaction=tx)
+        me_edge_snap   = await me_edge.get(transaction=tx)
+        them_edge_snap = await them_edge.get(transaction=tx)
+        req_snap       = await req_doc.get(transaction=tx)
 
         # ------- WRITES -------
         if me_edge_snap.exists:
             tx.delete(me_edge)
-            tx.update(me_doc, {"friendsCount": afs.Increment(-1)})
 
         if them_edge_snap.exists:
             tx.delete(them_edge)
-            tx.update(them_doc, {"friendsCount": afs.Increment(-1)})
 
         # Clean up any pending incoming request (edge-case) without erroring
         if req_snap.exists:
             tx.delete(req_doc)
-            tx.update(me_doc, {"pendingCount": afs.Increment(-1)})
+        return me_edge_snap.exists, them_edge_snap.exists, req_snap.exists
 
-    txn(db.transaction())
+    me_removed, them_removed, req_removed = await txn(adb.transaction())
+    counters.add(me, friendsCount=-int(me_removed), pendingCount=-int(req_removed))
+    counters.add(friend_uid, friendsCount=-int(them_removed))
+    friend_graph.remove_friendship(me, friend_uid)
     return {"ok": True}
 
 @friends.get("/search")
-def search_users(q: str, decoded: dict = Depends(verify_token)):
+async def search_users(q: str, decoded: dict = Depends(verify_token)):
     """
-    Simple user search by prefix on nameLower OR emailLower.
+    User search by word prefix on name or email, served from the in-memory index.
     Returns minimal public info; excludes the requester.
     """
     me = decoded["uid"]
@@ -596,52 +1222,335 @@ def search_users(q: str, decoded: dict = Depends(verify_token)):
     if len(q) < 2:
         return {"results": []}
 
-    users_col = db.collection("users")
     limit_n = 20
+    if user_index.ready.is_set():
+        return FastJSONResponse({"results": user_index.search(q, limit=limit_n, exclude_uid=me)})
+
+    # Index still loading: fall back to Firestore prefix queries, reading only what the results show
+    users_q = adb.collection("users").select(USER_CARD_FIELDS + ["visibility"])
 
     # Firestore has no OR — do two prefix queries and merge in Python
     end = q + "\uf8ff"
 
     # nameLower prefix
-    by_name = users_col.where("nameLower", ">=", q).where("nameLower", "<=", end).limit(limit_n).stream()
+    by_name = users_q.where("nameLower", ">=", q).where("nameLower", "<=", end).limit(limit_n).get()
     # emailLower prefix
-    by_email = users_col.where("emailLower", ">=", q).where("emailLower", "<=", end).limit(limit_n).stream()
+    by_email = users_q.where("emailLower", ">=", q).where("emailLower", "<=", end).limit(limit_n).get()
+    # both queries in flight at once
+    by_name, by_email = await asyncio.gather(by_name, by_email)
+
+    return FastJSONResponse({"results": merge_search_results(list(by_name) + list(by_email), exclude_uid=me, limit=limit_n)})
+
+FRIEND_STATUS_MAX_UIDS = 100
+
+class FriendStatusRequest(BaseModel):
+    uids: List[str] = Field(..., max_length=FRIEND_STATUS_MAX_UIDS, description="Other users to resolve status for")
+
+def _status_refs(me: str, other_uid: str) -> list:
+    """The four documents that decide friendship status: both edges, both pending requests."""
+    return [
+        _friends_col(me).document(other_uid),
+        _friends_col(other_uid).document(me),
+        _requests_col(me).document(other_uid),
+        _requests_col(other_uid).document(me),
+    ]
+
+async def _friend_statuses(me: str, other_uids: List[str]) -> Dict[str, dict]:
+    """Resolve status for every uid with a single batched read."""
+    refs_by_uid = {o: _status_refs(me, o) for o in dict.fromkeys(other_uids)}
+    snaps = await _get_many([r for rs in refs_by_uid.values() for r in rs], field_paths=[])
+    existing = {path for path, snap in snaps.items() if snap.exists}
+
+    out = {}
+    for o, (me_edge, them_edge, incoming, outgoing) in refs_by_uid.items():
+        out[o] = {
+            "friend": me_edge.path in existing and them_edge.path in existing,
+            "incomingPending": incoming.path in existing,
+            "iSentPending": outgoing.path in existing,
+        }
+    return out
+
+@friends.get("/status/{other_uid}")
+async def friend_status(other_uid: str, decoded: dict = Depends(verify_token)):
+    me = decoded["uid"]
+    return (await _friend_statuses(me, [other_uid]))[other_uid]
 
-    seen = set()
+@friends.post("/status")
+async def friend_status_bulk(payload: FriendStatusRequest, decoded: dict = Depends(verify_token)):
+    """Status for many users at once, as {"statuses": {uid: {...}}}."""
+    me = decoded["uid"]
+    uids = [u for u in payload.uids if u and u != me]
+    return {"statuses": await _friend_statuses(me, uids)}
+
+SUGGESTIONS_DEFAULT = 20
+SUGGESTIONS_MAX = 50
+
+@friends.get("/suggestions")
+async def friend_suggestions(
+    limit: int = Query(SUGGESTIONS_DEFAULT, ge=1, le=SUGGESTIONS_MAX),
+    decoded: dict = Depends(verify_token),
+):
+    """People you may know: friends-of-friends ranked by mutual friend count."""
+    me = decoded["uid"]
+    if not friend_graph.ready.is_set():
+        return {"suggestions": []}
+
+    # the graph already leaves out friends; incoming requests come from one inbox query
+    incoming = {snap.id async for snap in _requests_col(me).select([]).stream()}
+    candidates = []
+    # over-fetch, since private profiles and requests I sent are dropped below
+    for uid, mutual in friend_graph.suggestions(me, limit=limit * 2, exclude=incoming):
+        info = user_index.get(uid) or {}
+        if info.get("visibility") != "private":
+            candidates.append((uid, mutual, info))
+    # requests I sent: one existence read per candidate of my doc in their inbox
+    sent_refs = [_requests_col(uid).document(me) for uid, _, _ in candidates]
+    sent = await _get_many(sent_refs, field_paths=[]) if sent_refs else {}
     out = []
-    for snap in list(by_name) + list(by_email):
-        if snap.id in seen or snap.id == me:
-            continue
-        seen.add(snap.id)
-        d = snap.to_dict() or {}
-        # respect basic visibility ("private" hidden)
-        if d.get("visibility") == "private":
+    for (uid, mutual, info), ref in zip(candidates, sent_refs):
+        if sent[ref.path].exists:
             continue
         out.append({
-            "uid": snap.id,
-            "name": d.get("name") or (d.get("email") or "").split("@")[0],
-            "photoURL": d.get("photoURL") or "",
+            "uid": uid,
+            "name": info.get("name", ""),
+            "photoURL": info.get("photoURL", ""),
+            "mutualCount": mutual,
         })
-        if len(out) >= limit_n:
+        if len(out) >= limit:
             break
-
-    return {"results": out}
-
-@friends.get("/status/{other_uid}")
-def status(other_uid: str, decoded: dict = Depends(verify_token)):
-    me = decoded["uid"]
-    me_edge   = _friends_col(me).document(other_uid).get()
-    them_edge = _friends_col(other_uid).document(me).get()
-    incoming  = _requests_col(me).document(other_uid).get()
-    outgoing  = _requests_col(other_uid).document(me).get()
-    return {
-        "friend": me_edge.exists and them_edge.exists,
-        "incomingPending": incoming.exists,
-        "iSentPending": outgoing.exists,
-    }
+    return FastJSONResponse({"suggestions": out})
 
 # Mount router
 app.include_router(friends)
 
+# --- Events read API ---
+
+events = APIRouter(prefix="/events", tags=["events"])
+
+def _as_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+def _require_event_cache():
+    if not event_cache.ready.is_set():
+        raise HTTPException(503, "Events are still loading, try again shortly.")
+
+@events.get("")
+async def list_events(
+    request: Request,
+    tag: List[str] = Query([], description="Keep events with any of these tags"),
+    from_: Optional[datetime] = Query(None, alias="from", description="Keep events ending at/after this time"),
+    to: Optional[datetime] = Query(None, description="Keep events starting before this time"),
+    since: Optional[int] = Query(None, description="Only changes after this version (from a previous response)"),
+    decoded: dict = Depends(verify_token),
+):
+    """
+    Events from the in-memory snapshot cache.
+    Responses carry an ETag of the cache version; a matching If-None-Match gets 304.
+    With `since`, returns only events changed after that version plus ids removed.
+    """
+    start, end = _as_utc(from_), _as_utc(to)
+
+    if not event_cache.ready.is_set():
+        # cache still loading: read straight from Firestore, uncacheable
+        tags = frozenset(t.lower() for t in tag)
+        out = []
+        async for snap in adb.collection("events").select(EVENT_FIELDNAMES).stream():
+            ev = CachedEvent(snap.id, snap.to_dict() or {}, EVENT_FIELDNAMES)
+            if EventCache.matches(ev, tags, start, end):
+                out.append(ev.doc)
+        return FastJSONResponse({"version": None, "events": out})
+
+    etag = f'"events-{event_cache.version}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    body = None
+    if since is not None:
+        delta = event_cache.delta(since, tag, start, end)
+        if delta is not None:
+            version, changed, removed = delta
+            body = {"version": version, "delta": True, "events": changed, "removed": removed}
+    if body is None:
+        version, out = event_cache.query(tag, start, end)
+        body = {"version": version, "delta": False, "events": out}
+    return FastJSONResponse(body, headers={"ETag": f'"events-{body["version"]}"', "Cache-Control": "no-cache"})
+
+# Widest window /events/range will expand recurring events over
+EVENT_RANGE_MAX = timedelta(days=366)
+
+@events.get("/range")
+async def events_in_range(
+    from_: datetime = Query(..., alias="from"),
+    to: datetime = Query(...),
+    decoded: dict = Depends(verify_token),
+):
+    """Events overlapping [from, to), with recurring events expanded per occurrence."""
+    start, end = _as_utc(from_), _as_utc(to)
+    if end <= start:
+        raise HTTPException(400, "`to` must be after `from`.")
+    if end - start > EVENT_RANGE_MAX:
+        raise HTTPException(400, f"Range is limited to {EVENT_RANGE_MAX.days} days.")
+    _require_event_cache()
+    version, out = event_cache.range(start, end)
+    return FastJSONResponse({"version": version, "events": out})
+
+# Bounds for the map endpoints
+EVENTS_NEAR_MAX_RADIUS_M = 50_000
+EVENTS_MAP_LIMIT_DEFAULT = 500
+EVENTS_MAP_LIMIT_MAX = 5000
+
+@events.get("/near")
+async def events_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius: float = Query(1000, gt=0, le=EVENTS_NEAR_MAX_RADIUS_M, description="Meters"),
+    limit: int = Query(EVENTS_MAP_LIMIT_DEFAULT, ge=1, le=EVENTS_MAP_LIMIT_MAX),
+    decoded: dict = Depends(verify_token),
+):
+    """Events within `radius` meters of a point, nearest first."""
+    _require_event_cache()
+    version, out = event_cache.near(lat, lng, radius, limit)
+    return FastJSONResponse({"version": version, "events": out})
+
+@events.get("/bounds")
+async def events_in_bounds(
+    south: float = Query(..., ge=-90, le=90),
+    west: float = Query(..., ge=-180, le=180),
+    north: float = Query(..., ge=-90, le=90),
+    east: float = Query(..., ge=-180, le=180),
+    limit: int = Query(EVENTS_MAP_LIMIT_DEFAULT, ge=1, le=EVENTS_MAP_LIMIT_MAX),
+    decoded: dict = Depends(verify_token),
+):
+    """Events inside a map viewport (Leaflet getBounds() order: south, west, north, east)."""
+    if south > north or west > east:
+        raise HTTPException(400, "Expected south <= north and west <= east.")
+    _require_event_cache()
+    version, out = event_cache.in_bounds(south, west, north, east, limit)
+    return FastJSONResponse({"version": version, "events": out})
+
+EVENTS_SEARCH_LIMIT_DEFAULT = 50
+EVENTS_SEARCH_LIMIT_MAX = SEARCH_MAX_HITS
+
+@events.get("/search")
+async def search_events(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(EVENTS_SEARCH_LIMIT_DEFAULT, ge=1, le=EVENTS_SEARCH_LIMIT_MAX),
+    decoded: dict = Depends(verify_token),
+):
+    """
+    Substring match on title, description and tags (case and accent insensitive).
+    Title matches first, then by start time. At most SEARCH_MAX_HITS events are
+    ranked; past that `total` is a lower bound and `totalIsApproximate` is set.
+    """
+    if not any(c.isalnum() for c in q):
+        raise HTTPException(400, "Query must contain a letter or digit.")
+    _require_event_cache()
+    hits, complete = await run_in_threadpool(event_search.search, q)
+    docs = event_cache.docs(hits)
+    far = datetime.max.replace(tzinfo=timezone.utc).isoformat()
+    ranked = sorted(docs.values(), key=lambda d: (not hits[d["id"]], str(d.get(EVENT_START_FIELDNAME) or far)))
+    return FastJSONResponse({"version": event_cache.version, "total": len(ranked),
+                             "totalIsApproximate": not complete, "events": ranked[:limit]})
+
+# --- RSVPs ---
+
+RSVP_COUNTS_MAX_EVENTS = 100
+
+class RsvpCountsRequest(BaseModel):
+    eventIds: List[str] = Field(..., max_length=RSVP_COUNTS_MAX_EVENTS)
+
+def _event_doc(event_id: str):
+    return adb.collection("events").document(event_id)
+
+def _rsvp_shard(event_id: str, shard: int):
+    return _event_doc(event_id).collection(RSVP_SHARDS_SUBCOLLECTION).document(str(shard))
+
+async def _set_rsvp(event_id: str, uid: str, attending: bool) -> bool:
+    """Create/delete the RSVP and its mirror, moving one shard by ±1 only on an actual change."""
+    event_ref = _event_doc(event_id)
+    rsvp_ref = event_ref.collection("rsvps").document(uid)
+    mirror_ref = _user_doc(uid).collection("rsvps").document(event_id)
+    shard_ref = _rsvp_shard(event_id, random.randrange(RSVP_SHARDS))
+
+    @afs.async_transactional
+    async def txn(tx: afs.AsyncTransaction):
+        snaps = await _get_many([event_ref, rsvp_ref], transaction=tx, field_paths=[])
+        if not snaps[event_ref.path].exists:
+            raise HTTPException(404, "Event not found")
+        if snaps[rsvp_ref.path].exists == attending:
+            return False
+        if attending:
+            now = afs.SERVER_TIMESTAMP
+            tx.set(rsvp_ref, {"uid": uid, "attending": True, "createdAt": now})
+            tx.set(mirror_ref, {"attending": True, "createdAt": now})
+        else:
+            tx.delete(rsvp_ref)
+            tx.delete(mirror_ref)
+        # blind write to a shard nobody reads in a transaction, so no contention on it
+        tx.set(shard_ref, {"count": Increment(1 if attending else -1)}, merge=True)
+        return True
+
+    return await txn(adb.transaction())
+
+async def reconcile_rsvp_count(event_id: str) -> int:
+    """
+    Recount events/{id}/rsvps and rewrite the shards to match, marking them seeded.
+
+    The shards are read in the transaction before counting, so an _set_rsvp
+    commit racing with this waits for the rewrite and lands on top of it
+    instead of being overwritten.
+    """
+    shard_refs = [_rsvp_shard(event_id, shard) for shard in range(RSVP_SHARDS)]
+    rsvps = _event_doc(event_id).collection("rsvps")
+
+    @afs.async_transactional
+    async def txn(tx: afs.AsyncTransaction):
+        await _get_many(shard_refs, transaction=tx, field_paths=[])
+        result = await rsvps.count().get()
+        count = int(result[0][0].value)
+        for shard, ref in enumerate(shard_refs):
+            tx.set(ref, {"count": count, RSVP_SEEDED_FIELD: True} if shard == 0 else {"count": 0})
+        return count
+
+    return await txn(adb.transaction())
+
+@events.put("/{event_id}/rsvp")
+async def rsvp(event_id: str, decoded: dict = Depends(verify_token)):
+    """RSVP to an event (idempotent)."""
+    changed = await _set_rsvp(event_id, decoded["uid"], True)
+    return {"ok": True, "attending": True, "changed": changed}
+
+@events.delete("/{event_id}/rsvp")
+async def cancel_rsvp(event_id: str, decoded: dict = Depends(verify_token)):
+    """Cancel an RSVP (idempotent)."""
+    changed = await _set_rsvp(event_id, decoded["uid"], False)
+    return {"ok": True, "attending": False, "changed": changed}
+
+@events.post("/rsvp-counts")
+async def rsvp_counts(payload: RsvpCountsRequest, decoded: dict = Depends(verify_token)):
+    """
+    RSVP counts for many events from one batched read of their counter shards.
+    Events whose shards were never seeded are counted once and seeded.
+    """
+    event_ids = list(dict.fromkeys(payload.eventIds))
+    refs = [_rsvp_shard(e, n) for e in event_ids for n in range(RSVP_SHARDS)]
+    snaps = await _get_many(refs, field_paths=["count", RSVP_SEEDED_FIELD])
+
+    counts, unseeded = {}, []
+    for e in event_ids:
+        shards = [snaps[_rsvp_shard(e, n).path] for n in range(RSVP_SHARDS)]
+        if not (shards[0].to_dict() or {}).get(RSVP_SEEDED_FIELD):
+            unseeded.append(e)
+            continue
+        counts[e] = max(0, sum(int((s.to_dict() or {}).get("count", 0)) for s in shards if s.exists))
+    if unseeded:
+        seeded = await asyncio.gather(*(reconcile_rsvp_count(e) for e in unseeded))
+        counts.update(zip(unseeded, seeded))
+    return {"counts": counts}
+
+app.include_router(events)
+
 
 
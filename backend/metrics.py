@@ -0,0 +1,385 @@
+"""
+Request, Firestore and job instrumentation, exposed in Prometheus text format.
+
+- `MetricsMiddleware` times every request and labels it by route template, so
+  /friends/status/{other_uid} is one series however many uids hit it.
+- `instrument_client(client)` wraps a Firestore client's RPC layer and counts
+  documents read, writes committed and transaction retries. Counts go to the
+  process totals and to the request that made the call (via a contextvar), so
+  each route gets per-request read/write distributions.
+- `run_in_threadpool` is starlette's, plus a measurement of how long the call
+  waited for a worker thread.
+- `timed_job(name)` records duration and outcome of scheduler jobs.
+
+No client library: the exposition format is a few lines of text.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from anyio import to_thread
+from starlette.concurrency import run_in_threadpool as _starlette_run_in_threadpool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUEUE_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...], labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self._series: Dict[tuple, list] = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    s[i] += 1
+                    break
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(k, list(v)) for k, v in self._series.items()]
+        for label_values, s in sorted(series):
+            base = _labels(self.labels, label_values)
+            cumulative = 0
+            for upper, n in zip(self.buckets, s):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + (_num(upper),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + ('+Inf',))} {s[-1]}")
+            lines.append(f"{self.name}_sum{base} {_num(s[-2])}")
+            lines.append(f"{self.name}_count{base} {s[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values: str):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labels, k)} {_num(v)}" for k, v in values)
+        return lines
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+# --- registry ---
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route.", LATENCY_BUCKETS,
+                            ("method", "route", "status"))
+REQUEST_READS = Histogram("http_request_firestore_reads", "Firestore documents read per request.", COUNT_BUCKETS,
+                          ("method", "route"))
+REQUEST_WRITES = Histogram("http_request_firestore_writes", "Firestore writes committed per request.",
+                           COUNT_BUCKETS, ("method", "route"))
+REQUEST_RETRIES = Counter("http_request_firestore_txn_retries_total", "Transaction retries by route.",
+                          ("method", "route"))
+REQUEST_QUEUE_WAIT = Histogram("http_request_threadpool_wait_seconds",
+                               "Time a request's threadpool calls spent waiting for a thread.",
+                               QUEUE_WAIT_BUCKETS, ("method", "route"))
+THREADPOOL_WAIT = Histogram("threadpool_queue_wait_seconds", "Wait for a worker thread, per call.",
+                            QUEUE_WAIT_BUCKETS)
+FIRESTORE_READS = Counter("firestore_documents_read_total", "Documents returned by gets and queries.", ("client",))
+FIRESTORE_WRITES = Counter("firestore_writes_total", "Writes sent in commits and batch writes.", ("client",))
+FIRESTORE_RPCS = Counter("firestore_rpcs_total", "Firestore RPCs by method.", ("client", "method"))
+FIRESTORE_TXN_RETRIES = Counter("firestore_transaction_retries_total", "Transactions begun as a retry.",
+                                ("client",))
+JOB_DURATION = Histogram("job_duration_seconds", "Scheduler job run time.", JOB_BUCKETS, ("job",))
+JOB_RUNS = Counter("job_runs_total", "Scheduler job runs by outcome.", ("job", "outcome"))
+
+_METRICS = [REQUEST_LATENCY, REQUEST_READS, REQUEST_WRITES, REQUEST_RETRIES, REQUEST_QUEUE_WAIT,
+            THREADPOOL_WAIT, FIRESTORE_READS, FIRESTORE_WRITES, FIRESTORE_RPCS, FIRESTORE_TXN_RETRIES,
+            JOB_DURATION, JOB_RUNS]
+_gauges: List[Tuple[str, str, Callable[[], Iterable[Tuple[dict, float]]]]] = []
+
+
+def register_gauges(name: str, help: str, collect: Callable[[], Iterable[Tuple[dict, float]]]):
+    """collect() returns (labels dict, value) pairs and is called on every scrape."""
+    _gauges.append((name, help, collect))
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    for name, help, collect in _gauges:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in collect():
+            lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_num(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _threadpool_gauges():
+    try:
+        stats = to_thread.current_default_thread_limiter().statistics()
+    except Exception:
+        return  # only readable from the event loop
+    yield {"state": "busy"}, stats.borrowed_tokens
+    yield {"state": "capacity"}, stats.total_tokens
+    yield {"state": "waiting"}, stats.tasks_waiting
+
+
+register_gauges("threadpool_threads", "Default threadpool (anyio limiter) usage.", _threadpool_gauges)
+
+
+# --- per-request accounting ---
+
+class RequestStats:
+    __slots__ = ("reads", "writes", "retries", "queue_wait")
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.retries = 0
+        self.queue_wait = 0.0
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware (no BaseHTTPMiddleware), so streaming and contextvars behave."""
+
+    def __init__(self, app, skip_paths: Iterable[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            # the router fills in scope["route"]; unmatched paths share one series
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope.get("method", "")
+            REQUEST_LATENCY.observe(elapsed, method, route, str(status_code))
+            REQUEST_READS.observe(stats.reads, method, route)
+            REQUEST_WRITES.observe(stats.writes, method, route)
+            REQUEST_QUEUE_WAIT.observe(stats.queue_wait, method, route)
+            if stats.retries:
+                REQUEST_RETRIES.inc(stats.retries, method, route)
+
+
+async def run_in_threadpool(func, *args, **kwargs):
+    """starlette.concurrency.run_in_threadpool, recording the wait for a free thread."""
+    submitted = time.perf_counter()
+
+    def timed():
+        wait = time.perf_counter() - submitted
+        THREADPOOL_WAIT.observe(wait)
+        stats = _current.get()
+        if stats is not None:
+            stats.queue_wait += wait
+        return func(*args, **kwargs)
+
+    return await _starlette_run_in_threadpool(timed)
+
+
+def timed_job(name: str):
+    """Decorator for scheduler jobs: duration histogram plus ok/error run counts."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                JOB_DURATION.observe(time.perf_counter() - started, name)
+                JOB_RUNS.inc(1, name, outcome)
+        return wrapper
+    return decorate
+
+
+# --- Firestore RPC accounting ---
+
+def _count(reads: int = 0, writes: int = 0, retries: int = 0, client: str = ""):
+    if reads:
+        FIRESTORE_READS.inc(reads, client)
+    if writes:
+        FIRESTORE_WRITES.inc(writes, client)
+    if retries:
+        FIRESTORE_TXN_RETRIES.inc(retries, client)
+    stats = _current.get()
+    if stats is not None:
+        stats.reads += reads
+        stats.writes += writes
+        stats.retries += retries
+
+
+def _field(request, name):
+    return request.get(name) if isinstance(request, dict) else getattr(request, name, None)
+
+
+def _request_writes(kwargs) -> int:
+    return len(_field(kwargs.get("request") or {}, "writes") or ())
+
+
+def _is_retry(kwargs) -> bool:
+    options = _field(kwargs.get("request") or {}, "options")
+    read_write = getattr(options, "read_write", None)
+    return bool(getattr(read_write, "retry_transaction", None))
+
+
+def _response_reads(method: str, response) -> int:
+    pb = getattr(response, "_pb", response)
+    if method == "batch_get_documents":
+        return 1  # found or missing, both are billed reads
+    if method == "run_query":
+        return 1 if pb.HasField("document") else 0
+    if method == "run_aggregation_query":
+        return 1
+    return 0
+
+
+class _CountingIterator:
+    __slots__ = ("_it", "_method", "_client")
+
+    def __init__(self, it, method, client):
+        self._it = it
+        self._method = method
+        self._client = client
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        response = next(self._it)
+        _count(reads=_response_reads(self._method, response), client=self._client)
+        return response
+
+    def __aiter__(self):
+        # api_core's async stream wrappers only define __aiter__
+        self._it = self._it.__aiter__()
+        return self
+
+    async def __anext__(self):
+        response = await self._it.__anext__()
+        _count(reads=_response_reads(self._method, response), client=self._client)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._it, name)  # cancel(), etc.
+
+
+_STREAMING = frozenset({"batch_get_documents", "run_query", "run_aggregation_query"})
+_COUNTED = _STREAMING | {"commit", "batch_write", "begin_transaction", "rollback", "list_documents"}
+
+
+class _CountingApi:
+    """Stands in for the GAPIC Firestore client inside a firestore.Client / AsyncClient."""
+
+    def __init__(self, api, client: str, is_async: bool):
+        self._api = api
+        self._client = client
+        self._async = is_async
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if name not in _COUNTED:
+            return attr
+        client = self._client
+
+        def before(kwargs):
+            FIRESTORE_RPCS.inc(1, client, name)
+            if name in ("commit", "batch_write"):
+                _count(writes=_request_writes(kwargs), client=client)
+            elif name == "begin_transaction" and _is_retry(kwargs):
+                _count(retries=1, client=client)
+
+        if self._async:
+            async def call(*args, **kwargs):
+                before(kwargs)
+                result = await attr(*args, **kwargs)
+                return _CountingIterator(result, name, client) if name in _STREAMING else result
+        else:
+            def call(*args, **kwargs):
+                before(kwargs)
+                result = attr(*args, **kwargs)
+                return _CountingIterator(result, name, client) if name in _STREAMING else result
+        return call
+
+
+_counting_classes: Dict[type, type] = {}
+
+
+def _counting_class(cls: type) -> type:
+    """Subclass of a firestore client class whose `_firestore_api` is wrapped in _CountingApi."""
+    if cls not in _counting_classes:
+        def _firestore_api(self):
+            api = cls._firestore_api.fget(self)  # builds the GAPIC client on first use
+            wrapped = self.__dict__.get("_counting_api")
+            if wrapped is None or wrapped._api is not api:
+                wrapped = self._counting_api = _CountingApi(api, *self._counting)
+            return wrapped
+
+        _counting_classes[cls] = type(cls.__name__, (cls,), {"_firestore_api": property(_firestore_api)})
+    return _counting_classes[cls]
+
+
+def instrument_client(client, label: str, is_async: bool):
+    """
+    Route the client's RPCs through the counters. Returns the same client.
+
+    The GAPIC client and its channel are still built lazily on first use: an
+    asyncio channel is bound to the loop it is created on, which at import time
+    is not the one serving requests.
+    """
+    if type(client) not in _counting_classes.values():
+        client.__class__ = _counting_class(type(client))
+    client._counting = (label, is_async)
+    return client
@@ -0,0 +1,137 @@
+"""
+Background fan-out of profile changes onto denormalized friend edges.
+
+`accept_request` copies a user's `name`/`photoURL` onto the edge stored under
+each friend (users/{friend}/friends/{uid}). When the user later edits those
+fields, `schedule(uid)` queues a rewrite of every such edge. Edits inside the
+debounce window collapse into one pass, and the pass reads the profile when it
+runs, so it always writes the latest values.
+
+`edge_fields` and `update_edges` are also used by GET /friends to write
+re-joined profile fields back to stale edges.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+from google.api_core import exceptions as gexc
+from google.cloud import firestore
+
+# Profile fields copied onto friend edges
+DENORMALIZED_EDGE_FIELDS = ("name", "photoURL")
+# Quiet period after the last edit before fanning out
+FANOUT_DEBOUNCE_SECONDS = 5.0
+# Edges written per batch commit (Firestore limit is 500)
+FANOUT_PAGE_SIZE = 400
+
+
+def edge_fields(profile: dict) -> dict:
+    """The edge update that copies profile's denormalized fields."""
+    fields = {f: profile.get(f) for f in DENORMALIZED_EDGE_FIELDS}
+    fields["lastUpdated"] = firestore.SERVER_TIMESTAMP
+    return fields
+
+
+async def update_edges(client, updates: List[Tuple[object, dict]]) -> int:
+    """Apply (edge ref, fields) updates in one batch; returns edges written. Missing edges are skipped."""
+    batch = client.batch()
+    for edge, fields in updates:
+        # update, not set: an edge removed by a concurrent unfriend must stay gone
+        batch.update(edge, fields)
+    try:
+        await batch.commit()
+        return len(updates)
+    except gexc.NotFound:
+        pass
+    # some edge vanished; the batch is all-or-nothing, so go one by one
+    written = 0
+    for edge, fields in updates:
+        try:
+            await edge.update(fields)
+            written += 1
+        except gexc.NotFound:
+            continue
+    return written
+
+
+class ProfileFanout:
+    def __init__(self, client, debounce: float = FANOUT_DEBOUNCE_SECONDS):
+        self._db = client
+        self._debounce = debounce
+        self._due: Dict[str, float] = {}  # uid -> monotonic deadline
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"scheduled": 0, "coalesced": 0, "runs": 0, "edges": 0, "errors": 0}
+
+    def schedule(self, uid: str):
+        """Queue a fan-out for uid; pushes back an already-queued one (coalesce)."""
+        if uid in self._due:
+            self.stats["coalesced"] += 1
+        self.stats["scheduled"] += 1
+        self._due[uid] = time.monotonic() + self._debounce
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Stop the worker, flushing anything still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for uid in list(self._due):
+            del self._due[uid]
+            await self._run(uid)
+
+    async def _loop(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            ready = [uid for uid, at in self._due.items() if at <= now]
+            for uid in ready:
+                del self._due[uid]
+            for uid in ready:
+                await self._run(uid)
+            if ready:
+                continue
+            timeout = min(self._due.values()) - now if self._due else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, uid: str):
+        try:
+            self.stats["edges"] += await self.fan_out(uid)
+            self.stats["runs"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Profile fan-out for {uid} failed: {e}")
+
+    async def fan_out(self, uid: str) -> int:
+        """Rewrite uid's denormalized fields on every friend's edge; returns edges written."""
+        users = self._db.collection("users")
+        profile = await users.document(uid).get(field_paths=list(DENORMALIZED_EDGE_FIELDS))
+        if not profile.exists:
+            return 0
+        fields = edge_fields(profile.to_dict() or {})
+
+        written = 0
+        query = users.document(uid).collection("friends").order_by("__name__").select([]).limit(FANOUT_PAGE_SIZE)
+        cursor = None
+        while True:
+            page = await (query.start_after(cursor) if cursor else query).get()
+            if not page:
+                break
+            cursor = page[-1]
+            edges = [users.document(snap.id).collection("friends").document(uid) for snap in page]
+            written += await update_edges(self._db, [(edge, fields) for edge in edges])
+            if len(page) < FANOUT_PAGE_SIZE:
+                break
+        return written
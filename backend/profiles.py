@@ -0,0 +1,76 @@
+"""
+User profile model and the pure helpers around it.
+
+Kept out of main.py so they can be imported (benchmarks, scripts) without
+initializing Firebase.
+"""
+
+from typing import Any, Dict, List, Literal, Optional
+
+from firebase_admin import firestore as afs
+from pydantic import BaseModel, Field
+
+ALLOWED_DOMAIN = "umass.edu"
+
+Role = Literal["student","staff","admin","professor","ta","club_officer"]
+Year = Literal["freshman","sophomore","junior","senior","grad","alumni","staff","faculty","other"]
+Visibility = Literal["public","campus","private"]
+Preference_Types = Literal["defaultPreference","preference1","preference2"]
+
+class UserProfile(BaseModel):
+    uid: str
+    email: str
+    name: Optional[str] = None
+    photoURL: Optional[str] = None
+    primaryRole: Optional[Role] = None
+    roles: List[Role] = Field(default_factory=list)
+    year: Optional[Year] = None
+    major: Optional[str] = None
+    bio: Optional[str] = ""
+    pronouns: Optional[str] = None
+    phone: Optional[str] = None
+    visibility: Visibility = "campus"
+    notificationPrefs: Dict[str, bool] = Field(default_factory=lambda: {"eventReminders": True, "emailUpdates": False, "push": True})
+    domainOk: bool = True
+    isStaffVerified: bool = False
+    createdAt: Optional[Any] = None
+    updatedAt: Optional[Any] = None
+    #TODO something may be wrong...
+    preferences: List[Preference_Types] = Field(default_factory=list)
+# Fields users are allowed to update via PATCH
+ALLOWED_USER_FIELDS = {
+    "name","photoURL","year","major","bio","pronouns","phone","visibility","notificationPrefs","preferences"
+}
+
+def _defaults_for_new_user(uid: str, email: str, name: Optional[str], photo: Optional[str]) -> dict:
+    return {
+        "uid": uid,
+        "email": email,
+        "name": name or "",
+        "photoURL": photo or "",
+        "primaryRole": "student",
+        "roles": ["student"],
+        "year": None,
+        "major": None,
+        "bio": "",
+        "pronouns": None,
+        "phone": None,
+        #TODO something may be wrong...
+        "preferences": ["defaultPreference"],
+        "visibility": "campus",
+        "notificationPrefs": {"eventReminders": True, "emailUpdates": False, "push": True},
+        "domainOk": email.endswith(f"@{ALLOWED_DOMAIN}"),
+        "isStaffVerified": False,
+        "createdAt": afs.SERVER_TIMESTAMP,
+        "updatedAt": afs.SERVER_TIMESTAMP,
+        # Useful for search (optional but recommended)
+        "nameLower": (name or "").lower(),
+        "emailLower": (email or "").lower(),
+        # Counters
+        "friendsCount": 0,
+        "pendingCount": 0,
+    }
+
+def _doc_to_profile(doc) -> UserProfile:
+    data = doc.to_dict()
+    return UserProfile(**data)
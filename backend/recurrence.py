@@ -0,0 +1,115 @@
+"""
+Recurrence rules for recurring events.
+
+An event's `recurs` field is a string of weekday slots, each a day letter followed
+by HHMM (UTC): "M1030W1400" means every Monday 10:30 and Wednesday 14:00.
+"0" (or empty) means the event does not recur.
+
+    M T W t F S s  ->  Monday ... Sunday
+
+A rule is parsed once into a `CompiledRule`: the sorted slot offsets in minutes
+from the start of the week. Next-occurrence lookups are a bisect over those
+offsets, and `expand` lazily yields every occurrence in a window.
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+DAY_CODES = {"M": 0, "T": 1, "W": 2, "t": 3, "F": 4, "S": 5, "s": 6}
+NOT_RECURRING = "0"
+
+MINUTES_PER_WEEK = 7 * 24 * 60
+_WEEK = timedelta(weeks=1)
+
+
+def _week_start(dt: datetime) -> datetime:
+    """Monday 00:00 of dt's week, in UTC."""
+    dt = dt.astimezone(timezone.utc)
+    return (dt - timedelta(days=dt.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class CompiledRule:
+    __slots__ = ("source", "offsets")
+
+    def __init__(self, source: str, offsets: Tuple[int, ...]):
+        self.source = source
+        self.offsets = offsets  # sorted, unique minutes since Monday 00:00
+
+    def __bool__(self):
+        return bool(self.offsets)
+
+    def __repr__(self):
+        return f"CompiledRule({self.source!r})"
+
+    def next_after(self, when: datetime) -> Optional[datetime]:
+        """First occurrence strictly after `when` (aware datetime), or None for an empty rule."""
+        if not self.offsets:
+            return None
+        week = _week_start(when)
+        minute = (when.astimezone(timezone.utc) - week) // timedelta(minutes=1)
+        i = bisect_right(self.offsets, minute)
+        if i == len(self.offsets):
+            week += _WEEK
+            i = 0
+        return week + timedelta(minutes=self.offsets[i])
+
+    def expand(self, start: datetime, end: datetime) -> Iterator[datetime]:
+        """Lazily yield occurrences in [start, end), in order."""
+        if not self.offsets or end <= start:
+            return
+        week = _week_start(start)
+        while week < end:
+            for off in self.offsets:
+                occ = week + timedelta(minutes=off)
+                if occ >= end:
+                    return
+                if occ >= start:
+                    yield occ
+            week += _WEEK
+
+
+@lru_cache(maxsize=4096)
+def compile_rule(recurs: Optional[str]) -> CompiledRule:
+    """Parse a `recurs` string. Raises ValueError on malformed rules."""
+    src = str(recurs or "").strip()
+    if src in ("", NOT_RECURRING):
+        return CompiledRule(src, ())
+    offsets = set()
+    i = 0
+    while i < len(src):
+        day = DAY_CODES.get(src[i])
+        digits = src[i + 1:i + 5]
+        if day is None or len(digits) != 4 or not digits.isdigit():
+            raise ValueError(f"Bad recurrence rule {recurs!r} at position {i}")
+        hour, minute = int(digits[:2]), int(digits[2:])
+        if hour > 23 or minute > 59:
+            raise ValueError(f"Bad time {digits!r} in recurrence rule {recurs!r}")
+        offsets.add(day * 1440 + hour * 60 + minute)
+        i += 5
+    return CompiledRule(src, tuple(sorted(offsets)))
+
+
+def getNextOccurance(recurs: Optional[str], now: Optional[datetime] = None) -> Optional[datetime]:
+    """Next occurrence of a `recurs` rule after now (UTC), or None if it never recurs."""
+    return compile_rule(recurs).next_after(now or datetime.now(timezone.utc))
+
+
+def next_occurrences(rules: Iterable[Tuple[str, str]], now: datetime) -> Dict[str, Optional[datetime]]:
+    """
+    Next occurrence after `now` for many (key, recurs) pairs in one pass.
+
+    Each distinct rule string is compiled and evaluated once, however many events
+    share it. Malformed or empty rules map to None.
+    """
+    by_rule: Dict[str, Optional[datetime]] = {}
+    out = {}
+    for key, recurs in rules:
+        if recurs not in by_rule:
+            try:
+                by_rule[recurs] = compile_rule(recurs).next_after(now)
+            except ValueError:
+                by_rule[recurs] = None
+        out[key] = by_rule[recurs]
+    return out
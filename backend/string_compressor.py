@@ -1,87 +1,336 @@
-import BitVector
-#pip install BitVector
-#idk if we even want this, but at least now we have something to present
-#no live demo (untested)
+from array import array
+from bisect import bisect_right
+
+#Wavelet tree over a fixed alphabet: n*log(sigma) bits for a string of length n, and
+#access / rank / select on the compressed form without decompressing. FMIndex at the bottom builds
+#substring search on top of it.
+
+
+class RankBitVector:
+    """
+    Static bitvector with a two-level rank directory.
+    Bits are packed into 64-bit words. _blocks[b] is the number of 1s before word 4*b and
+    _offsets[w] the number of 1s from the start of w's block to w, so rank is two lookups
+    plus one popcount for 1.25 bits per bit instead of 1.5 with a full count per word.
+    """
+    __slots__ = ("n", "_words", "_blocks", "_offsets")
+
+    def __init__(self, bits):
+        words = array("Q")
+        word = 0
+        n = 0
+        for b in bits:
+            if b:
+                word |= 1 << (n & 63)
+            n += 1
+            if n & 63 == 0:
+                words.append(word)
+                word = 0
+        words.append(word)  # partial last word, or an empty sentinel so rank(n) has a word to read
+        blocks = array("I")
+        offsets = array("B")
+        total = 0
+        for w, bits_w in enumerate(words):
+            if w & 3 == 0:
+                blocks.append(total)
+                block_start = total
+            offsets.append(total - block_start)
+            total += bits_w.bit_count()
+        blocks.append(total)
+        self.n = n
+        self._words = words
+        self._blocks = blocks
+        self._offsets = offsets
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        return (self._words[i >> 6] >> (i & 63)) & 1
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self[i]
+
+    def ones(self):
+        return self._blocks[-1]
+
+    def rank1(self, i):
+        """Number of 1s in positions [0, i)."""
+        w = i >> 6
+        r = self._blocks[w >> 2] + self._offsets[w]
+        if i & 63:
+            r += (self._words[w] & ((1 << (i & 63)) - 1)).bit_count()
+        return r
+
+    def rank0(self, i):
+        return i - self.rank1(i)
+
+    def rank(self, bit, i):
+        return self.rank1(i) if bit else i - self.rank1(i)
+
+    def _before(self, bit, w):
+        #count of `bit` in the words before w
+        ones = self._blocks[w >> 2] + self._offsets[w]
+        return ones if bit else 64 * w - ones
+
+    def select(self, bit, k):
+        """Position of the k-th (1-based) `bit`, or -1 if there are fewer than k."""
+        total = self.ones() if bit else self.n - self.ones()
+        if k < 1 or k > total:
+            return -1
+        # binary search the blocks, then step through at most 4 words
+        lo, hi = 0, (len(self._words) - 1) >> 2
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._before(bit, 4 * mid) < k:
+                lo = mid
+            else:
+                hi = mid - 1
+        w = 4 * lo
+        while w + 1 < len(self._words) and (w + 1) & 3 and self._before(bit, w + 1) < k:
+            w += 1
+        seen = self._before(bit, w)
+        word = self._words[w] if bit else ~self._words[w]
+        for j in range(64):
+            if (word >> j) & 1:
+                seen += 1
+                if seen == k:
+                    return 64 * w + j
+        return -1
+
+    def to_bytes(self):
+        return self._words.tobytes()
+
+    def size_in_bytes(self):
+        return (len(self._words) * self._words.itemsize + len(self._blocks) * self._blocks.itemsize
+                + len(self._offsets) * self._offsets.itemsize)
+
+
+class _Node:
+    __slots__ = ("lo", "hi", "split", "bits", "left", "right")
+
+    def __init__(self, lo, hi, split=None):
+        self.lo = lo  # symbol range [lo, hi) in alphabet order
+        self.hi = hi
+        #symbols below split go left. By default the first size//2 do, matching _left_right_partition
+        self.split = lo + (hi - lo) // 2 if split is None else split
+        self.bits = None
+        self.left = None
+        self.right = None
+
+    def is_leaf(self):
+        return self.hi - self.lo == 1
+
+    def mid(self):
+        return self.split
+
+
 class string_compressor:
     """
     @param alphabet: a string with all characters in the alphabet, each character exactly once. Order determines
                      how the string will be split at each layer.
+    @param weights: optional per-character weights (e.g. frequencies), same order as alphabet. Each layer is then
+                    split where the weight is most even instead of at the middle, so frequent characters sit
+                    higher in the tree and cost fewer bits. Needed again to decompress.
     """
-    #TODO theres sorta a bug in the base cases maybe we fix later
-    def __init__(self, alphabet):
+    def __init__(self, alphabet, weights=None):
         self._alphabet = string_compressor._make_alphabet(alphabet)
-        self.__compressed = [] #arr should be interpreted as for example:
-        #root, root.left, root.left.left, None(implies previous is leaf), root.left.right, None, root.right is BitVector size 0 (would imply root has 1 child).
+        self._symbols = list(alphabet)
+        if weights is not None and len(weights) != len(self._symbols):
+            raise ValueError("weights must have one entry per alphabet character")
+        self._prefix = None
+        if weights is not None:
+            self._prefix = [0]
+            for w in weights:
+                self._prefix.append(self._prefix[-1] + w)
+        self._root = None
+        self._paths = {}  # char -> [(node, bit), ...] root to leaf
+        self._n = 0
+        self.__compressed = [] #preorder list of the internal nodes' bitvectors.
+        #the tree shape only depends on the alphabet, so the list plus the alphabet is enough to rebuild the string.
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def compressed(self):
+        return self.__compressed
+
+    def _shape(self, lo, hi):
+        node = _Node(lo, hi, self._weighted_split(lo, hi))
+        if not node.is_leaf():
+            node.left = self._shape(lo, node.mid())
+            node.right = self._shape(node.mid(), hi)
+        return node
+
+    def _weighted_split(self, lo, hi):
+        if self._prefix is None or hi - lo < 2:
+            return None
+        p = self._prefix
+        half = (p[lo] + p[hi]) / 2
+        return min(range(lo + 1, hi), key=lambda m: abs(p[m] - half))
+
     def compress(self,str):
-        return self.compress(str,0)
-    def _compress(self,str,depth,base_case=false):
-        if (depth==8):
-            return #I believe this will never happen (ascii alphabet, if larger then we should delete this...)
-        if len(str)==0:
-            self.__compressed.append(BitVector(size=0))#in this case, the preceeding element has 1 child
-            return
-        bv = BitVector(size = len(str))
-        for i,char in enumerate(str):
-            bv[i]=self._alphabet.get(ord(char))
-        self.__compressed.append(bv)
-        if base_case:
-            #here, it may make sense to append null
-            #to the compressed array, to make interpreting
-            #the string (decompression) easier
-            self.__compressed.append(None)#this means the preceeding element is a leaf
-            return
-        left = ""
-        right = ""
-        base_caseL = True
-        base_caseR = True
-        lastL = ""
-        lastR = ""
-        for index,bit in enumerate(bv):
-            if bit ==0:
-                left = left + str[index]
-                base_caseL = True if lastL == "" else base_case and lastL==str[index]
-                lastL = str[index]
-            else:
-                right = right + str[index]
-                base_caseR = True if lastR == "" else base_case and lastR==str[index]
-                lastR = str[index]
-        if base_caseL:
-            self._compress(left,depth+1,True)
-            return
-        self._compress(left,depth+1)
-        if base_caseR:
-            self._compress(right,depth+1,True)
+        """Build the wavelet tree for str; returns the preorder bitvector list."""
+        try:
+            seq = [self._alphabet[c] for c in str]
+        except KeyError as e:
+            raise ValueError(f"character {e.args[0]!r} is not in the alphabet") from None
+        self._n = len(seq)
+        self._root = self._shape(0, len(self._symbols))
+        self._paths = {}
+        self.__compressed = []
+        self._compress(self._root, seq)
+        return self.__compressed
+
+    def _compress(self, node, seq):
+        if node.is_leaf():
             return
-        self.compress(right,depth+1)
-        return    
-    #TODO interpret compressed array to reconstruct string
-    def decompress(self, arr):
-        pass
-    
-    """TODO
-        add any useful string operations we want to do to the compressed string in place, e.g. longest common substring"""
-    
-    #TODO compress str according to alphabet and check against the compressed. May have false positives, so do a second check
-    #I believe, but have not proven that in general string operations will take roughly a factor of log alphaSize more time asymptotically
-    def compressed_lcss(self, str):
-        pass
-    """TODO
-        the idea for these functions is to first construct an alphabet based only on the characters in the strings
-        and for the strings to be split roughly in half at each depth
-        the compress function would also need to return the compressed string's alphabet. 
-        And balanced decompress would need to make use of it."""
-    def balanced_compress(self,str):
-        pass
-    def balanced_decompress(self,str,balanced_alphabet):
-        pass
+        mid = node.mid()
+        node.bits = RankBitVector(sym >= mid for sym in seq)
+        self.__compressed.append(node.bits)
+        self._compress(node.left, [sym for sym in seq if sym < mid])
+        self._compress(node.right, [sym for sym in seq if sym >= mid])
 
+    def decompress(self, arr=None):
+        """Rebuild the string from a preorder bitvector list (default: this instance's)."""
+        arr = self.__compressed if arr is None else arr
+        root = self._shape(0, len(self._symbols))
+        it = iter(arr)
+
+        def attach(node):
+            if node.is_leaf():
+                return
+            node.bits = next(it)
+            attach(node.left)
+            attach(node.right)
+
+        attach(root)
+        if root.is_leaf():
+            raise ValueError("cannot decompress with a one-character alphabet (no bitvectors)")
+
+        def expand(node):
+            #merge the children's sequences back together following node.bits
+            if node.is_leaf():
+                return None
+            left = expand(node.left)
+            right = expand(node.right)
+            li = ri = 0
+            out = []
+            for b in node.bits:
+                if b:
+                    out.append(right[ri] if right is not None else node.right.lo)
+                    ri += 1
+                else:
+                    out.append(left[li] if left is not None else node.left.lo)
+                    li += 1
+            return out
+
+        return "".join(self._symbols[sym] for sym in expand(root))
+
+    # --- queries on the compressed string, O(log sigma) levels each ---
+
+    def _leaf_path(self, c):
+        path = self._paths.get(c)
+        if path is not None:
+            return path
+        sym = self._alphabet.get(c)
+        if sym is None or self._root is None:
+            return None
+        path = self._paths[c] = []
+        node = self._root
+        while not node.is_leaf():
+            bit = 1 if sym >= node.mid() else 0
+            path.append((node, bit))
+            node = node.right if bit else node.left
+        return path
+
+    def access(self, i):
+        """Character at position i."""
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        node = self._root
+        while not node.is_leaf():
+            bit = node.bits[i]
+            i = node.bits.rank(bit, i)
+            node = node.right if bit else node.left
+        return self._symbols[node.lo]
+
+    def access_rank(self, i):
+        """(character at i, its occurrences in [0, i)) from a single walk down the tree."""
+        node = self._root
+        while not node.is_leaf():
+            bit = node.bits[i]
+            i = node.bits.rank(bit, i)
+            node = node.right if bit else node.left
+        return self._symbols[node.lo], i
+
+    def rank(self, c, i):
+        """Occurrences of c in positions [0, i)."""
+        path = self._leaf_path(c)
+        if path is None:
+            return 0
+        i = max(0, min(i, self._n))
+        for node, bit in path:
+            i = node.bits.rank(bit, i)
+        return i
+
+    def select(self, c, k):
+        """Position of the k-th (1-based) occurrence of c, or -1."""
+        path = self._leaf_path(c)
+        if path is None or k < 1:
+            return -1
+        if not path:
+            return k - 1 if k <= self._n else -1
+        pos = k - 1
+        for node, bit in reversed(path):
+            pos = node.bits.select(bit, pos + 1)
+            if pos < 0:
+                return -1
+        return pos
+
+    def count(self, c):
+        return self.rank(c, self._n)
+
+    #balanced mode: the alphabet is just the characters in the string, so each level splits it roughly in half
+    #and the tree is only as deep as the string needs. The alphabet is returned alongside the bitvectors.
+    @classmethod
+    def balanced(cls, str):
+        """A compressor over just the characters of str, already holding str."""
+        balanced_alphabet = "".join(sorted(set(str)))
+        if len(balanced_alphabet) < 2:
+            #pad so there is at least one level of bitvectors to decode from
+            balanced_alphabet = "".join(sorted(balanced_alphabet + ("\0" if "\0" not in balanced_alphabet else "\1")))
+        sc = cls(balanced_alphabet)
+        sc.compress(str)
+        return sc
+
+    @staticmethod
+    def balanced_compress(str):
+        """Returns (preorder bitvector list, balanced alphabet)."""
+        sc = string_compressor.balanced(str)
+        return sc.compressed, "".join(sc._symbols)
+
+    @staticmethod
+    def balanced_decompress(arr, balanced_alphabet):
+        return string_compressor(balanced_alphabet).decompress(arr)
+
+    def size_in_bytes(self):
+        """Bytes held by the bitvectors and their rank blocks."""
+        return sum(bv.size_in_bytes() for bv in self.__compressed)
+
+    @staticmethod
     def _make_alphabet(alphabet):
-        size = len(alphabet)
-        dict = {}
-        i = 1
-        for char in alphabet:
-            d[char] = string_compressor._left_right_partition(i,size)
-            i+=1
+        #char -> position in the alphabet; _left_right_partition(position+1, size) is its root-to-leaf path
+        d = {}
+        for i, char in enumerate(alphabet):
+            if char in d:
+                raise ValueError(f"character {char!r} appears twice in the alphabet")
+            d[char] = i
+        return d
+
+    @staticmethod
     def _left_right_partition(num,alphaSize):
         ans = []
         while alphaSize >= 2:
@@ -91,10 +340,140 @@ class string_compressor:
                 #this means we should go left
             else:
                 ans.append(1)
+                num -= alphaSize//2
                 alphaSize = alphaSize-alphaSize//2
                 #this means we should go right
         return ans
 
 
+#FM-index: the Burrows-Wheeler transform of a text stored in the wavelet tree above, so counting a pattern is
+#|pattern| backward-search steps of two rank calls each, O(|pattern| log sigma), without the text itself.
+
+TERMINATOR = "\0"
+#every FM_SAMPLE_RATE-th row of the sorted suffixes keeps its text position; locate walks back LF until it hits one
+FM_SAMPLE_RATE = 64
+
+
+def _suffix_array(text):
+    #prefix doubling: sort by (rank of first k chars, rank of the next k) until every rank is distinct
+    n = len(text)
+    dense = {c: r for r, c in enumerate(sorted(set(text)))}
+    rank = [dense[c] for c in text]
+    sa = sorted(range(n), key=rank.__getitem__)
+    if len(dense) == n:
+        return sa
+    k = 1
+    while True:
+        key = [rank[i] * (n + 1) + (rank[i + k] + 1 if i + k < n else 0) for i in range(n)]
+        sa.sort(key=key.__getitem__)
+        new_rank = [0] * n
+        r = 0
+        for j in range(1, n):
+            if key[sa[j]] != key[sa[j - 1]]:
+                r += 1
+            new_rank[sa[j]] = r
+        rank = new_rank
+        if r == n - 1:
+            return sa
+        k *= 2
+
+
+class FMIndex:
+    """
+    Count and locate substrings of `text`.
+
+    @param separator: optional character splitting text into documents. Patterns can't contain it,
+                      and locate_docs() reports (document index, offset) instead of raw positions.
+                      Walking back from a match also stops at a separator, so locating one
+                      occurrence takes about FM_SAMPLE_RATE steps and never more than its
+                      document's length.
+    """
+    def __init__(self, text, separator=None, sample_rate=FM_SAMPLE_RATE):
+        if TERMINATOR in text:
+            raise ValueError("text can't contain the terminator character")
+        text += TERMINATOR
+        self._n = len(text)
+        self._sep = separator
+        self._rate = sample_rate
+
+        sa = _suffix_array(text)
+        bwt = "".join(text[i - 1] for i in sa)  # text[-1] is the terminator
+
+        freq = {}
+        for c in text:
+            freq[c] = freq.get(c, 0) + 1
+        #C[c]: rows whose suffix starts with a character smaller than c
+        self._C = {}
+        total = 0
+        for c in sorted(freq):
+            self._C[c] = total
+            total += freq[c]
+        #wavelet alphabet by descending frequency, split by weight: common characters get short paths
+        by_freq = sorted(freq, key=freq.get, reverse=True)
+        self._wt = string_compressor("".join(by_freq), [freq[c] for c in by_freq])
+        self._wt.compress(bwt)
+
+        self._samples = array("I", (sa[row] for row in range(0, self._n, sample_rate)))
+        #document d starts at _starts[d]; _sep_doc[j] is the document after the j-th separator in BWT order
+        self._starts = array("I", [0])
+        self._sep_doc = array("I")
+        if separator is not None:
+            self._starts.extend(i + 1 for i, c in enumerate(text) if c == separator)
+            for row, c in enumerate(bwt):
+                if c == separator:
+                    self._sep_doc.append(bisect_right(self._starts, sa[row]) - 1)
+
+    def __len__(self):
+        return self._n - 1
+
+    def documents(self):
+        return len(self._starts)
+
+    def _range(self, pattern):
+        #backward search: rows [sp, ep) are the suffixes starting with pattern
+        sp, ep = 0, self._n
+        for c in reversed(pattern):
+            base = self._C.get(c)
+            if base is None or c == self._sep or c == TERMINATOR:
+                return 0, 0
+            sp = base + self._wt.rank(c, sp)
+            ep = base + self._wt.rank(c, ep)
+            if sp >= ep:
+                return 0, 0
+        return sp, ep
+
+    def count(self, pattern):
+        """Occurrences of pattern in the text."""
+        sp, ep = self._range(pattern)
+        return ep - sp
+
+    def _position(self, row):
+        steps = 0
+        while row % self._rate:
+            c, r = self._wt.access_rank(row)
+            if c == self._sep:
+                return self._starts[self._sep_doc[r]] + steps
+            if c == TERMINATOR:
+                return steps
+            row = self._C[c] + r
+            steps += 1
+        return self._samples[row // self._rate] + steps
+
+    def locate(self, pattern, limit=None):
+        """Start positions of pattern, in suffix order (not text order); at most limit of them."""
+        sp, ep = self._range(pattern)
+        if limit is not None:
+            ep = min(ep, sp + limit)
+        for row in range(sp, ep):
+            yield self._position(row)
 
+    def locate_docs(self, pattern, limit=None):
+        """(document index, offset in the document) for each occurrence."""
+        for pos in self.locate(pattern, limit):
+            doc = bisect_right(self._starts, pos) - 1
+            yield doc, pos - self._starts[doc]
 
+    def size_in_bytes(self):
+        """Bytes held by the index (the text itself is not kept)."""
+        return (self._wt.size_in_bytes()
+                + sum(len(a) * a.itemsize for a in (self._samples, self._starts, self._sep_doc)))
@@ -0,0 +1,40 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import firebase_admin
+import pytest
+from firebase_admin import credentials
+from google.auth.credentials import AnonymousCredentials
+
+# the backend modules are imported flat (uvicorn main:app from backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _AnonymousCredential(credentials.Base):
+    def get_credential(self):
+        return AnonymousCredentials()
+
+
+# main initialises Firebase from GOOGLE_APPLICATION_CREDENTIALS unless an app
+# already exists; this one lets tests import it without a service account.
+# Clients are created lazily and nothing here talks to Firestore.
+if not firebase_admin._apps:
+    firebase_admin.initialize_app(_AnonymousCredential(), {"projectId": "demo-test"})
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """main.app on a FakeFirestore, signed in as `me` (change api.user to switch users)."""
+    import fake_firestore
+    import main
+    from fastapi.testclient import TestClient
+
+    db = fake_firestore.FakeFirestore()
+    monkeypatch.setattr(main, "adb", db)
+    monkeypatch.setattr(main.afs, "async_transactional", fake_firestore.async_transactional)
+    user = {"uid": "me", "email": "me@umass.edu", "name": "Me"}
+    main.app.dependency_overrides[main.verify_token] = lambda: user
+    # not entered as a context manager: no lifespan, so no listeners or jobs start
+    yield SimpleNamespace(client=TestClient(main.app), db=db, user=user)
+    main.app.dependency_overrides.pop(main.verify_token, None)
@@ -0,0 +1,203 @@
+"""
+Minimal in-memory stand-in for the async Firestore client, covering what
+counter_buffer, job_coordinator, profile_fanout and the API routes under test
+use. Documents are plain dicts keyed by path. Writes in a batch or transaction
+are applied together at commit; an update of a missing document fails the whole
+commit with NotFound and a create of an existing one with AlreadyExists, like
+the real thing.
+"""
+
+import itertools
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from google.api_core import exceptions as gexc
+from google.cloud import firestore
+from google.cloud.firestore_v1.transforms import Increment
+
+
+_auto_ids = itertools.count()
+
+
+def _resolve(current, value, now):
+    if value is firestore.SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, Increment):
+        return (current or 0) + value.value
+    return value
+
+
+class Snapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.id = ref.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs = {}
+        self.commits = 0
+        self.fail_commits = 0  # next N commits raise ServiceUnavailable
+
+    def collection(self, name):
+        return CollectionRef(self, name)
+
+    async def get_all(self, refs, field_paths=None, transaction=None):
+        for ref in refs:
+            yield Snapshot(ref, self.docs.get(ref.path))
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self):
+        return WriteBatch(self)
+
+
+class DocumentRef:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return CollectionRef(self._db, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name):
+        return CollectionRef(self._db, f"{self.path}/{name}")
+
+    async def get(self, transaction=None, field_paths=None):
+        return Snapshot(self, self._db.docs.get(self.path))
+
+    async def update(self, fields):
+        batch = WriteBatch(self._db)
+        batch.update(self, fields)
+        return (await batch.commit())[0]
+
+    async def set(self, data, merge=False):
+        batch = WriteBatch(self._db)
+        batch.set(self, data, merge=merge)
+        return (await batch.commit())[0]
+
+    async def create(self, data):
+        batch = WriteBatch(self._db)
+        batch.create(self, data)
+        return (await batch.commit())[0]
+
+
+class CollectionRef:
+    def __init__(self, db, path, order=None, offset=0, limit=None):
+        self._db = db
+        self.path = path
+        self._order = order
+        self._offset = offset
+        self._limit = limit
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            doc_id = f"auto{next(_auto_ids)}"
+        return DocumentRef(self._db, f"{self.path}/{doc_id}")
+
+    def _with(self, **kw):
+        args = {"order": self._order, "offset": self._offset, "limit": self._limit, **kw}
+        return CollectionRef(self._db, self.path, **args)
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._with(order=(field, direction))
+
+    def offset(self, n):
+        return self._with(offset=n)
+
+    def limit(self, n):
+        return self._with(limit=n)
+
+    def select(self, fields):
+        return self
+
+    def count(self):
+        return _Count(self)
+
+    async def stream(self):
+        for snap in await self.get():
+            yield snap
+
+    async def get(self):
+        items = [(path, data) for path, data in self._db.docs.items() if path.rsplit("/", 1)[0] == self.path]
+        if self._order:
+            field, direction = self._order
+            if field == "__name__":
+                key = lambda item: item[0]
+            else:
+                key = lambda item: item[1].get(field)
+            items.sort(key=key, reverse=direction == firestore.Query.DESCENDING)
+        items = items[self._offset:]
+        if self._limit is not None:
+            items = items[:self._limit]
+        return [Snapshot(DocumentRef(self._db, path), data) for path, data in items]
+
+
+class _Count:
+    def __init__(self, query):
+        self._query = query
+
+    async def get(self):
+        return [[SimpleNamespace(value=len(await self._query.get()))]]
+
+
+class WriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append(("set", ref, data, merge))
+
+    def update(self, ref, data):
+        self._writes.append(("update", ref, data, False))
+
+    def create(self, ref, data):
+        self._writes.append(("create", ref, data, False))
+
+    def delete(self, ref):
+        self._writes.append(("delete", ref, None, False))
+
+    async def commit(self):
+        db = self._db
+        if db.fail_commits:
+            db.fail_commits -= 1
+            raise gexc.ServiceUnavailable("injected")
+        for op, ref, _, _ in self._writes:
+            if op == "update" and ref.path not in db.docs:
+                raise gexc.NotFound(f"No document to update: {ref.path}")
+            if op == "create" and ref.path in db.docs:
+                raise gexc.AlreadyExists(f"Document already exists: {ref.path}")
+        now = datetime.now(timezone.utc)
+        for op, ref, data, merge in self._writes:
+            if op == "delete":
+                db.docs.pop(ref.path, None)
+                continue
+            doc = dict(db.docs.get(ref.path) or {}) if op == "update" or merge else {}
+            for field, value in data.items():
+                if value is firestore.DELETE_FIELD:
+                    doc.pop(field, None)
+                else:
+                    doc[field] = _resolve(doc.get(field), value, now)
+            db.docs[ref.path] = doc
+        db.commits += 1
+        results = [SimpleNamespace(update_time=now) for _ in self._writes]
+        self._writes = []
+        return results
+
+
+def async_transactional(fn):
+    """Runs fn(tx) and commits its writes; reads see committed state only."""
+    async def run(tx):
+        result = await fn(tx)
+        await tx.commit()
+        return result
+    return run
@@ -0,0 +1,170 @@
+import json
+
+import pytest
+
+from backfill_users import FriendRequestFromUidBackfill, RsvpUidBackfill
+
+
+class _Ref:
+    def __init__(self, path):
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+
+class _Snap:
+    def __init__(self, path, data):
+        self.reference = _Ref(path)
+        self.id = self.reference.id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _Query:
+    def __init__(self, db, group, after=None, limit=None):
+        self._db, self._group, self._after, self._limit = db, group, after, limit
+
+    def order_by(self, field):
+        assert field == "__name__"
+        return self
+
+    def select(self, fields):
+        return self
+
+    def limit(self, n):
+        return _Query(self._db, self._group, self._after, n)
+
+    def start_after(self, cursor):
+        return _Query(self._db, self._group, cursor["__name__"].path, self._limit)
+
+    def stream(self):
+        self._db.pages += 1
+        paths = sorted(p for p in self._db.docs if p.rsplit("/", 2)[-2] == self._group)
+        if self._after is not None:
+            paths = [p for p in paths if p > self._after]
+        for path in paths[:self._limit]:
+            yield _Snap(path, self._db.docs[path])
+
+
+class _Failure:
+    def __init__(self, attempts):
+        self.attempts = attempts
+
+
+class _BulkWriter:
+    """Queues merge-sets and applies them on flush; paths in db.failing always fail."""
+
+    def __init__(self, db):
+        self._db = db
+        self._queued = []
+        self._on_result = self._on_error = None
+
+    def on_write_result(self, fn):
+        self._on_result = fn
+
+    def on_write_error(self, fn):
+        self._on_error = fn
+
+    def set(self, ref, data, merge=False):
+        assert merge
+        self._queued.append((ref, data))
+
+    def flush(self):
+        for ref, data in self._queued:
+            if ref.path in self._db.failing:
+                attempts = 1
+                while self._on_error(_Failure(attempts), self):
+                    attempts += 1
+                continue
+            self._db.docs[ref.path].update(data)
+            self._on_result(ref, None, self)
+        self._queued = []
+
+    def close(self):
+        self.flush()
+
+
+class _SyncDb:
+    def __init__(self, docs):
+        self.docs = docs
+        self.failing = set()
+        self.pages = 0
+
+    def collection_group(self, name):
+        return _Query(self, name)
+
+    def document(self, path):
+        return _Ref(path)
+
+    def bulk_writer(self, options=None):
+        return _BulkWriter(self)
+
+
+@pytest.fixture
+def rsvps():
+    # 8 RSVPs over 4 events; odd ones already have their uid
+    docs = {f"events/e{i // 2}/rsvps/u{i}": ({"uid": f"u{i}"} if i % 2 else {}) for i in range(8)}
+    docs["users/u0/rsvps/e0"] = {}  # the users/{uid}/rsvps mirrors are in the same collection group
+    return _SyncDb(docs)
+
+
+def _checkpoint(path):
+    with open(path) as f:
+        return json.load(f)["lastPath"]
+
+
+def test_stream_fills_missing_uids_and_checkpoints_each_page(rsvps, tmp_path):
+    checkpoint = str(tmp_path / "cp.json")
+    stats = RsvpUidBackfill(rsvps, checkpoint=checkpoint, page_size=3).run()
+    assert stats == {"scanned": 9, "updated": 4, "failed": 0}
+    assert all(doc["uid"] == path.rsplit("/", 1)[-1] for path, doc in rsvps.docs.items() if path.startswith("events/"))
+    assert rsvps.docs["users/u0/rsvps/e0"] == {}  # a mirror, keyed by event id: left alone
+    assert _checkpoint(checkpoint) == max(rsvps.docs)
+    assert rsvps.pages == 4  # the last page was full, so one more (empty) read
+
+
+def test_resume_starts_after_the_checkpoint(rsvps, tmp_path):
+    checkpoint = tmp_path / "cp.json"
+    checkpoint.write_text(json.dumps({"lastPath": "events/e1/rsvps/u3"}))
+    stats = RsvpUidBackfill(rsvps, checkpoint=str(checkpoint), page_size=100).run()
+    assert stats["scanned"] == 5
+    assert rsvps.docs["events/e0/rsvps/u0"] == {}  # before the cursor, left for the earlier run
+    assert rsvps.docs["events/e2/rsvps/u4"] == {"uid": "u4"}
+
+
+def test_dry_run_writes_nothing(rsvps, tmp_path):
+    checkpoint = tmp_path / "cp.json"
+    before = {path: dict(doc) for path, doc in rsvps.docs.items()}
+    stats = RsvpUidBackfill(rsvps, checkpoint=str(checkpoint), page_size=3, dry_run=True).run()
+    assert stats == {"scanned": 9, "updated": 4, "failed": 0}  # would be updated
+    assert rsvps.docs == before
+    assert not checkpoint.exists()
+
+
+def test_failed_write_stops_before_its_page_is_checkpointed(rsvps, tmp_path):
+    checkpoint = str(tmp_path / "cp.json")
+    rsvps.failing.add("events/e2/rsvps/u4")  # on the second page of 3
+    stats = RsvpUidBackfill(rsvps, checkpoint=checkpoint, page_size=3).run()
+    assert stats["failed"] == 1 and stats["scanned"] == 6
+    assert _checkpoint(checkpoint) == "events/e1/rsvps/u2"  # end of the first page
+
+    rsvps.failing.clear()
+    stats = RsvpUidBackfill(rsvps, checkpoint=checkpoint, page_size=3).run()
+    assert stats["failed"] == 0
+    assert rsvps.docs["events/e2/rsvps/u4"] == {"uid": "u4"}
+    assert all(doc.get("uid") for path, doc in rsvps.docs.items() if path.startswith("events/"))
+
+
+def test_limit_stops_after_enough_docs(rsvps):
+    stats = RsvpUidBackfill(rsvps, page_size=2, limit=4).run()
+    assert stats["scanned"] == 4
+
+
+def test_friend_request_backfill_sets_the_sender():
+    db = _SyncDb({"users/a/friendRequests/b": {}, "users/c/friendRequests/b": {"fromUid": "b"},
+                  "users/b/friendRequests/a": {}})
+    stats = FriendRequestFromUidBackfill(db).run()
+    assert stats["updated"] == 2
+    assert db.docs == {"users/a/friendRequests/b": {"fromUid": "b"}, "users/c/friendRequests/b": {"fromUid": "b"},
+                       "users/b/friendRequests/a": {"fromUid": "a"}}
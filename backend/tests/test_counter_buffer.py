@@ -0,0 +1,92 @@
+import asyncio
+
+import counter_buffer
+from counter_buffer import COUNTS_UPDATED_FIELD, CounterBuffer
+from fake_firestore import FakeFirestore
+
+
+def _user(db, uid, **fields):
+    db.docs[f"users/{uid}"] = {"friendsCount": 0, "pendingCount": 0, **fields}
+
+
+def test_deltas_are_merged_into_one_write_per_user():
+    async def run():
+        db = FakeFirestore()
+        for uid in ("a", "b"):
+            _user(db, uid)
+        buf = CounterBuffer(db)
+        buf.add("a", friendsCount=1, pendingCount=-1)
+        buf.add("a", friendsCount=1)
+        buf.add("b", pendingCount=1)
+        buf.add("b", pendingCount=-1)  # nets out to nothing
+        buf.add("c")  # no deltas at all
+        assert len(buf) == 2
+        await buf.flush()
+        return db, buf
+
+    db, buf = asyncio.run(run())
+    assert db.docs["users/a"]["friendsCount"] == 2
+    assert db.docs["users/a"]["pendingCount"] == -1
+    assert COUNTS_UPDATED_FIELD in db.docs["users/a"]
+    assert db.docs["users/b"] == {"friendsCount": 0, "pendingCount": 0}
+    assert db.commits == 1
+    assert buf.stats["coalesced"] == 2 and buf.stats["writes"] == 1
+
+
+def test_deleted_user_is_dropped_without_recreating_the_doc():
+    async def run():
+        db = FakeFirestore()
+        _user(db, "a")
+        buf = CounterBuffer(db)
+        buf.add("a", friendsCount=1)
+        buf.add("gone", friendsCount=-1)
+        await buf.flush()
+        return db, buf
+
+    db, buf = asyncio.run(run())
+    assert db.docs["users/a"]["friendsCount"] == 1
+    assert "users/gone" not in db.docs
+    assert buf.stats["dropped"] == 1 and len(buf) == 0
+
+
+def test_failed_flush_is_retried_then_dropped(monkeypatch):
+    monkeypatch.setattr(counter_buffer, "FLUSH_MAX_ATTEMPTS", 3)
+
+    async def run():
+        db = FakeFirestore()
+        _user(db, "a")
+        buf = CounterBuffer(db)
+        buf.add("a", friendsCount=1)
+        db.fail_commits = 1
+        await buf.flush()
+        assert len(buf) == 1  # requeued
+        buf.add("a", friendsCount=1)
+        await buf.flush()
+        assert db.docs["users/a"]["friendsCount"] == 2
+
+        buf.add("a", pendingCount=1)
+        db.fail_commits = 10
+        for _ in range(3):
+            await buf.flush()
+        return db, buf
+
+    db, buf = asyncio.run(run())
+    assert len(buf) == 0
+    assert db.docs["users/a"]["pendingCount"] == 0
+    assert buf.stats["dropped"] == 1
+
+
+def test_worker_flushes_after_the_window_and_on_stop():
+    async def run():
+        db = FakeFirestore()
+        _user(db, "a")
+        buf = CounterBuffer(db, window=0.05)
+        buf.start()
+        buf.add("a", friendsCount=1)
+        await asyncio.sleep(0.2)
+        after_window = db.docs["users/a"]["friendsCount"]
+        buf.add("a", friendsCount=1)
+        await buf.stop()
+        return after_window, db.docs["users/a"]["friendsCount"]
+
+    assert asyncio.run(run()) == (1, 2)
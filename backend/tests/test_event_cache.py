@@ -0,0 +1,142 @@
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+from event_cache import CachedEvent, EventCache, IntervalIndex, SpatialGrid, haversine_m
+
+T0 = datetime(2025, 3, 3, tzinfo=timezone.utc)  # a Monday
+FIELDS = ["title", "start", "end", "tags", "location", "recurs"]
+
+
+def _event_data(rng, i):
+    start = T0 + timedelta(minutes=rng.randrange(0, 60 * 24 * 60))
+    kind = rng.random()
+    if kind < 0.05:
+        end = start + timedelta(days=rng.randint(8, 40))  # long, goes to the side table
+    elif kind < 0.1:
+        end = None  # point event
+    else:
+        end = start + timedelta(minutes=rng.randint(0, 6 * 60))
+    data = {"title": f"event {i}", "start": start, "end": end, "tags": rng.sample(["a", "b", "c"], 1)}
+    if rng.random() < 0.15:
+        data["recurs"] = rng.choice(["M1030", "W1400F0900", "s2330"])
+    return data
+
+
+def _random_window(rng):
+    lo = T0 + timedelta(minutes=rng.randrange(-2000, 60 * 24 * 65))
+    return lo, lo + timedelta(minutes=rng.randint(1, 60 * 24 * 9))
+
+
+def _overlaps(ev, lo, hi):
+    end = ev.end or ev.start
+    return ev.start is not None and ev.start < hi and end >= lo
+
+
+def test_interval_index_matches_brute_force():
+    rng = random.Random(11)
+    idx = IntervalIndex()
+    events = {}
+    for i in range(600):
+        ev = CachedEvent(f"e{i}", _event_data(rng, i), FIELDS)
+        events[ev.id] = ev
+        idx.add(ev)
+    # replace and remove some, so stale keys must be gone
+    for event_id in rng.sample(sorted(events), 100):
+        if rng.random() < 0.5:
+            idx.remove(event_id)
+            del events[event_id]
+        else:
+            ev = events[event_id] = CachedEvent(event_id, _event_data(rng, 0), FIELDS)
+            idx.add(ev)
+
+    one_off = [ev for ev in events.values() if not ev.rule]
+    recurring = [ev for ev in events.values() if ev.rule]
+    for _ in range(200):
+        lo, hi = _random_window(rng)
+        got = list(idx.overlapping(lo, hi))
+        assert len(got) == len(set(got))
+        assert set(got) == {ev.id for ev in one_off if _overlaps(ev, lo, hi)}
+
+        expected = set()
+        for ev in recurring:
+            week = T0 - timedelta(weeks=2)
+            while week < hi:
+                for off in ev.rule.offsets:
+                    when = week + timedelta(minutes=off)
+                    if when < hi and when + ev.length > lo:
+                        expected.add((ev.id, when))
+                week += timedelta(weeks=1)
+        assert {(ev.id, when) for ev, when in idx.occurrences(lo, hi)} == expected
+
+
+def test_cache_range_agrees_with_query_for_one_off_events():
+    rng = random.Random(4)
+    cache = EventCache(FIELDS)
+    cache.apply((f"e{i}", {**_event_data(rng, i), "recurs": "0"}) for i in range(300))
+    for _ in range(50):
+        lo, hi = _random_window(rng)
+        _, ranged = cache.range(lo, hi)
+        _, queried = cache.query(start=lo, end=hi)
+        assert sorted(d["id"] for d in ranged) == sorted(d["id"] for d in queried)
+
+
+def _points(rng, n):
+    # clustered around a campus, plus a few far away
+    out = {}
+    for i in range(n):
+        if rng.random() < 0.9:
+            out[f"p{i}"] = (40.0 + rng.gauss(0, 0.02), -75.0 + rng.gauss(0, 0.02))
+        else:
+            out[f"p{i}"] = (rng.uniform(-60, 60), rng.uniform(-170, 170))
+    return out
+
+
+def test_spatial_grid_matches_brute_force():
+    rng = random.Random(8)
+    points = _points(rng, 500)
+    grid = SpatialGrid()
+    for event_id, point in points.items():
+        grid.add(event_id, point)
+    for event_id in rng.sample(sorted(points), 50):
+        grid.remove(event_id)
+        del points[event_id]
+    grid.add("none", None)  # events without a location aren't indexed
+
+    boxes = [(39.99, -75.01, 40.01, -74.99), (39.9, -75.1, 40.1, -74.9), (-60, -170, 60, 170), (10, 10, 10.5, 10.5)]
+    for south, west, north, east in boxes:
+        got = {event_id for event_id, _, _ in grid.in_box(south, west, north, east)}
+        assert got == {event_id for event_id, (lat, lng) in points.items()
+                       if south <= lat <= north and west <= lng <= east}
+
+    for radius in (50, 500, 3000, 50_000):
+        got = grid.near(40.0, -75.0, radius)
+        assert [d for d, _ in got] == sorted(d for d, _ in got)
+        expected = {event_id for event_id, (lat, lng) in points.items()
+                    if haversine_m(40.0, -75.0, lat, lng) <= radius}
+        assert {event_id for _, event_id in got} == expected
+
+
+def test_haversine_quarter_meridian():
+    assert math.isclose(haversine_m(0, 0, 90, 0), math.pi / 2 * 6_371_000, rel_tol=1e-9)
+
+
+def test_delta_reports_changes_and_removals():
+    cache = EventCache(FIELDS)
+    cache.apply([("a", {"title": "A", "start": T0}), ("b", {"title": "B", "start": T0})])
+    v = cache.version
+    cache.apply([("a", {"title": "A2", "start": T0})], ["b"])
+    version, changed, removed = cache.delta(v)
+    assert version == cache.version
+    assert [d["title"] for d in changed] == ["A2"]
+    assert removed == ["b"]
+
+
+def test_delta_from_before_the_first_snapshot_asks_for_everything():
+    # X was deleted before this worker started; its first snapshot only has Y
+    cache = EventCache(FIELDS)
+    assert cache.delta(0) is None  # nothing loaded yet
+    cache.apply([("y", {"title": "Y", "start": T0})], version=200)
+    assert cache.delta(100) is None
+    assert cache.delta(200) == (200, [], [])
+    assert cache.delta(201) is None  # from the future
@@ -0,0 +1,97 @@
+import random
+
+from event_search import EventSearchIndex, event_text, normalize
+
+WORDS = ["café", "Jazz", "night", "study", "group", "yoga", "run", "club", "Hack-a-thon", "e", "ee"]
+
+
+def _docs(n, seed=1):
+    rng = random.Random(seed)
+    return {
+        f"e{i}": {
+            "id": f"e{i}",
+            "title": " ".join(rng.choices(WORDS, k=3)),
+            "desc": " ".join(rng.choices(WORDS, k=12)),
+            "tags": rng.choices(WORDS, k=2),
+        }
+        for i in range(n)
+    }
+
+
+def _brute(docs, q):
+    q = normalize(q)
+    out = {}
+    for event_id, doc in docs.items():
+        text, title_len = event_text(doc)
+        if q in text:
+            out[event_id] = q in text[:title_len]
+    return out
+
+
+def _index(docs):
+    idx = EventSearchIndex(lambda ids: {i: docs[i] for i in ids if i in docs})
+    idx.mark_changed(list(docs))
+    idx.reindex()
+    return idx
+
+
+QUERIES = ["cafe", "CAFÉ", "jazz night", "hack a thon", "e", "ee", "run club", "xyz", "y"]
+
+
+def test_normalize():
+    assert normalize("  Café—Jazz!! Night ") == "cafe jazz night"
+
+
+def test_search_matches_brute_force():
+    docs = _docs(400)
+    idx = _index(docs)
+    for q in QUERIES:
+        hits, complete = idx.search(q, max_hits=len(docs))
+        assert complete
+        assert hits == _brute(docs, q), q
+
+
+def test_changes_are_seen_before_and_after_reindex():
+    docs = _docs(300)
+    idx = _index(docs)
+    docs["e1"] = {"id": "e1", "title": "Brand new title", "desc": "", "tags": []}
+    del docs["e2"]
+    docs["new"] = {"id": "new", "title": "another brand", "desc": "jazz", "tags": []}
+    idx.mark_changed(["e1", "e2", "new"])
+    for _ in range(2):  # pending (scanned) first, then indexed
+        for q in QUERIES + ["brand"]:
+            hits, _ = idx.search(q, max_hits=len(docs))
+            assert hits == _brute(docs, q), q
+        idx.reindex()
+
+
+def test_merges_keep_results():
+    docs = _docs(200)
+    idx = _index(docs)
+    rng = random.Random(5)
+    for _ in range(12):
+        changed = rng.sample(sorted(docs), 20)
+        for event_id in changed:
+            docs[event_id] = {**docs[event_id], "title": " ".join(rng.choices(WORDS, k=3))}
+        idx.mark_changed(changed)
+        idx.reindex()
+    assert idx.stats["merges"] > 0
+    for q in QUERIES:
+        assert idx.search(q, max_hits=len(docs))[0] == _brute(docs, q), q
+
+
+def test_capped_search_reports_partial():
+    docs = _docs(300)
+    idx = _index(docs)
+    expected = _brute(docs, "e")
+    assert len(expected) > 50
+    hits, complete = idx.search("e", max_hits=50)
+    assert not complete
+    assert len(hits) == 50
+    assert all(expected[event_id] == in_title for event_id, in_title in hits.items())
+    hits, complete = idx.search("e", max_hits=len(expected))
+    assert complete and hits == expected
+
+
+def test_blank_query():
+    assert _index(_docs(10)).search("  --  ") == ({}, True)
@@ -0,0 +1,131 @@
+import random
+from collections import Counter
+
+import friend_graph
+from friend_graph import FriendGraph
+
+
+def _random_friendships(rng, users, n):
+    pairs = set()
+    while len(pairs) < n:
+        a, b = rng.sample(users, 2)
+        pairs.add((min(a, b), max(a, b)))
+    return pairs
+
+
+def _directed(pairs):
+    for a, b in pairs:
+        yield a, b
+        yield b, a
+
+
+def _brute_suggestions(pairs, uid, exclude=()):
+    adj = {}
+    for a, b in pairs:
+        adj.setdefault(a, set()).add(b)
+        adj.setdefault(b, set()).add(a)
+    mine = adj.get(uid, set())
+    counts = Counter(c for f in mine for c in adj[f] if c != uid and c not in mine and c not in exclude)
+    return dict(counts)
+
+
+def _check(graph, pairs, users, rng):
+    for uid in users:
+        expected_friends = {b for a, b in _directed(pairs) if a == uid}
+        assert graph.friends_of(uid) == expected_friends
+    for uid in rng.sample(users, 20):
+        exclude = set(rng.sample(users, 5))
+        expected = _brute_suggestions(pairs, uid, exclude)
+        got = graph.suggestions(uid, limit=len(users), exclude=exclude)
+        assert dict(got) == expected
+        assert [n for _, n in got] == sorted(expected.values(), reverse=True)
+        top = graph.suggestions(uid, limit=3, exclude=exclude)
+        assert [n for _, n in top] == sorted(expected.values(), reverse=True)[:3]
+
+
+def test_build_and_queries_match_brute_force():
+    rng = random.Random(1)
+    users = [f"u{i}" for i in range(80)]
+    pairs = _random_friendships(rng, users, 300)
+    graph = FriendGraph()
+    graph.build(_directed(pairs))
+    assert graph.ready.is_set()
+    _check(graph, pairs, users, rng)
+
+
+def test_overlay_updates_and_compaction(monkeypatch):
+    monkeypatch.setattr(friend_graph, "COMPACT_AFTER", 40)
+    rng = random.Random(2)
+    users = [f"u{i}" for i in range(60)]
+    pairs = _random_friendships(rng, users, 150)
+    graph = FriendGraph()
+    graph.build(_directed(pairs))
+    users.append("newcomer")
+    for step in range(200):
+        a, b = rng.sample(users, 2)
+        pair = (min(a, b), max(a, b))
+        if pair in pairs:
+            graph.remove_friendship(a, b)
+            pairs.discard(pair)
+        else:
+            graph.add_friendship(a, b)
+            pairs.add(pair)
+        if step % 50 == 49:
+            gone = rng.choice(users)
+            graph.remove_user(gone)
+            pairs = {p for p in pairs if gone not in p}
+    _check(graph, pairs, users, rng)
+
+
+def test_changes_during_build_are_kept():
+    graph = FriendGraph()
+    graph.build(_directed({("a", "b"), ("b", "c")}))
+
+    def edges():
+        # the stream has already passed a-b when it is removed, and never sees a-d
+        yield "a", "b"
+        yield "b", "a"
+        graph.remove_friendship("a", "b")
+        graph.add_friendship("a", "d")
+        yield "b", "c"
+        yield "c", "b"
+
+    graph.build(edges())
+    assert graph.friends_of("a") == {"d"}
+    assert graph.friends_of("b") == {"c"}
+    assert graph.friends_of("d") == {"a"}
+    assert graph._journal is None
+
+
+def test_load_reads_collection_group():
+    class Ref:
+        def __init__(self, path):
+            self.path = path
+            self.id = path.rsplit("/", 1)[-1]
+
+        @property
+        def parent(self):
+            parent = self.path.rsplit("/", 1)[0]
+            return Ref(parent) if "/" in parent else None
+
+    class Snap:
+        def __init__(self, path):
+            self.reference = Ref(path)
+            self.id = self.reference.id
+
+    class Query:
+        def select(self, fields):
+            return self
+
+        def stream(self):
+            return iter([Snap("users/a/friends/b"), Snap("users/b/friends/a")])
+
+    class DB:
+        def collection_group(self, name):
+            assert name == "friends"
+            return Query()
+
+    graph = FriendGraph()
+    graph.load(DB())
+    assert graph.friends_of("a") == {"b"}
+    assert graph.friends_of("b") == {"a"}
@@ -0,0 +1,89 @@
+import pytest
+
+import main
+from counter_buffer import CounterBuffer
+from friend_graph import FriendGraph
+
+
+@pytest.fixture
+def friends(api, monkeypatch):
+    monkeypatch.setattr(main, "counters", CounterBuffer(api.db))
+    monkeypatch.setattr(main, "friend_graph", FriendGraph())
+    for uid in ("me", "a", "b", "c"):
+        api.db.docs[f"users/{uid}"] = {"name": uid.upper(), "photoURL": f"{uid}.png"}
+    return api
+
+
+def _request(db, sender, recipient):
+    db.docs[f"users/{recipient}/friendRequests/{sender}"] = {"fromUid": sender, "createdAt": 1}
+
+
+def _befriend(db, x, y):
+    db.docs[f"users/{x}/friends/{y}"] = {"uid": y}
+    db.docs[f"users/{y}/friends/{x}"] = {"uid": x}
+
+
+def _pending():
+    """Net counter deltas queued in the write-behind buffer."""
+    return main.counters._pending
+
+
+def test_accept_all_in_one_transaction_with_one_delta_per_counter(friends):
+    db = friends.db
+    for sender in ("a", "b", "gone"):
+        _request(db, sender, "me")
+    db.commits = 0
+
+    resp = friends.client.post("/friends/requests/accept", json={})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert sorted(body["accepted"]) == ["a", "b"]
+    assert body["skipped"] == ["gone"]  # sender deleted their account; request just cleared
+    assert db.commits == 1
+    assert not [p for p in db.docs if p.startswith("users/me/friendRequests/")]
+    for f in ("a", "b"):
+        assert db.docs[f"users/me/friends/{f}"]["name"] == f.upper()
+        assert db.docs[f"users/{f}/friends/me"]["name"] == "ME"
+        assert f in main.friend_graph.friends_of("me")
+    assert _pending() == {"me": {"friendsCount": 2, "pendingCount": -3},
+                                 "a": {"friendsCount": 1}, "b": {"friendsCount": 1}}
+
+
+def test_accept_only_counts_edges_it_creates(friends, monkeypatch):
+    db = friends.db
+    monkeypatch.setattr(main, "ACCEPT_CHUNK", 1)
+    _befriend(db, "me", "a")  # stale request from someone already a friend
+    _request(db, "a", "me")
+    _request(db, "c", "me")
+    db.commits = 0
+
+    body = friends.client.post("/friends/requests/accept", json={"uids": ["a", "c", "b", "me"]}).json()
+    assert body["accepted"] == ["a", "c"]
+    assert body["skipped"] == ["b"]  # no pending request from b
+    assert db.commits == 3  # one transaction per chunk
+    # still one merged delta for me across the chunks
+    assert _pending() == {"me": {"friendsCount": 1, "pendingCount": -2}, "c": {"friendsCount": 1}}
+
+
+def test_decline_only_removes_pending_requests(friends):
+    db = friends.db
+    for sender in ("a", "b"):
+        _request(db, sender, "me")
+
+    body = friends.client.post("/friends/requests/decline", json={"uids": ["a", "nobody"]}).json()
+    assert body["declined"] == ["a"]
+    assert "users/me/friendRequests/a" not in db.docs
+    assert "users/me/friendRequests/b" in db.docs
+    assert _pending() == {"me": {"pendingCount": -1}}
+
+
+def test_send_to_many_skips_friends_pending_and_missing_users(friends):
+    db = friends.db
+    _befriend(db, "me", "a")
+    _request(db, "me", "c")  # already pending
+
+    body = friends.client.post("/friends/requests", json={"uids": ["a", "b", "c", "ghost", "me", "b"]}).json()
+    assert body["sent"] == ["b"]
+    assert sorted(body["skipped"]) == ["a", "c", "ghost"]
+    assert db.docs["users/b/friendRequests/me"]["fromUid"] == "me"
+    assert _pending() == {"b": {"pendingCount": 1}}
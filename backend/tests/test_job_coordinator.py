@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import fake_firestore
+import job_coordinator
+from fake_firestore import FakeFirestore
+from job_coordinator import JobCoordinator
+
+LEASE = 0.4
+BEAT = 0.05
+
+
+@pytest.fixture(autouse=True)
+def fake_transactions(monkeypatch):
+    monkeypatch.setattr(job_coordinator.firestore, "async_transactional", fake_firestore.async_transactional)
+
+
+def _coordinator(db, worker_id, fn, interval=timedelta(hours=1)):
+    jc = JobCoordinator(db, worker_id=worker_id, lease_seconds=LEASE, heartbeat_seconds=BEAT)
+    jc.register("job", fn, interval)
+    return jc
+
+
+def _runs(db):
+    return sorted((d["worker"], d["status"]) for path, d in db.docs.items() if "/runs/" in path)
+
+
+def test_one_leader_runs_the_job_and_hands_over_on_stop():
+    async def run():
+        db = FakeFirestore()
+        calls = []
+
+        async def job_a():
+            calls.append("A")
+            return {"n": 1}
+
+        async def job_b():
+            calls.append("B")
+
+        a, b = _coordinator(db, "A", job_a), _coordinator(db, "B", job_b)
+        a.start()
+        await asyncio.sleep(BEAT * 3)
+        b.start()
+        await asyncio.sleep(BEAT * 4)
+        assert a.is_leader and not b.is_leader
+        assert calls == ["A"]  # B never runs a job A already ran this interval
+
+        await a.stop()
+        assert "scheduler/leader" not in db.docs  # released
+        await asyncio.sleep(BEAT * 4)
+        assert b.is_leader
+        # the schedule lives in Firestore, so the new leader doesn't rerun it early
+        assert calls == ["A"]
+        await b.stop()
+        return db
+
+    db = asyncio.run(run())
+    assert _runs(db) == [("A", "ok")]
+    job = db.docs["scheduler/leader/jobs/job"]
+    assert job["lastRun"]["worker"] == "A" and "running" not in job
+
+
+def test_crashed_leader_is_replaced_after_the_lease_lapses_and_its_run_is_redone():
+    async def run():
+        db = FakeFirestore()
+
+        async def hang():
+            await asyncio.sleep(60)
+
+        async def quick():
+            return None
+
+        a = _coordinator(db, "A", hang)
+        a.start()
+        await asyncio.sleep(BEAT * 3)
+        assert db.docs["scheduler/leader/jobs/job"]["running"]["worker"] == "A"
+        # crash: no release, the lease just stops being renewed
+        a._task.cancel()
+        a._jobs["job"].task.cancel()
+
+        b = _coordinator(db, "B", quick)
+        b.start()
+        await asyncio.sleep(BEAT * 2)
+        assert not b.is_leader  # A's lease hasn't run out yet
+        await asyncio.sleep(LEASE + BEAT * 4)
+        assert b.is_leader
+        await b.stop()
+        return db, b
+
+    db, b = asyncio.run(run())
+    assert _runs(db) == [("A", "abandoned"), ("B", "ok")]
+    assert b.stats["abandoned"] == 1
+
+
+def test_leader_that_loses_the_lease_cancels_its_running_job():
+    async def run():
+        db = FakeFirestore()
+        events = []
+
+        async def slow():
+            events.append("start")
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                events.append("cancelled")
+                raise
+
+        a = _coordinator(db, "A", slow)
+        a.start()
+        await asyncio.sleep(BEAT * 3)
+        # someone else holds a valid lease now (e.g. A stalled past its expiry)
+        db.docs["scheduler/leader"] = {"holder": "B", "expiresAt": datetime.now(timezone.utc) + timedelta(minutes=1)}
+        await asyncio.sleep(BEAT * 3)
+        running = a._jobs["job"].task
+        await a.stop()
+        return events, a, running
+
+    events, a, running = asyncio.run(run())
+    assert events == ["start", "cancelled"]
+    assert not a.is_leader and running is None
+    assert a.stats["lost"] == 1 and a.stats["cancelled"] == 1
+
+
+def test_local_jobs_run_on_every_worker():
+    async def run():
+        db = FakeFirestore()
+        calls = []
+        workers = []
+        for name in ("A", "B"):
+            jc = JobCoordinator(db, worker_id=name, lease_seconds=LEASE, heartbeat_seconds=BEAT)
+
+            async def reload(name=name):
+                calls.append(name)
+
+            jc.register("reload", reload, timedelta(seconds=BEAT), singleton=False)
+            jc.start()
+            workers.append(jc)
+        await asyncio.sleep(BEAT * 5)
+        for jc in workers:
+            await jc.stop()
+        return calls
+
+    calls = asyncio.run(run())
+    assert "A" in calls and "B" in calls
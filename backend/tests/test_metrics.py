@@ -0,0 +1,34 @@
+import asyncio
+
+import metrics
+
+
+class _AiterOnlyStream:
+    """Like api_core's async stream wrapper: __aiter__, but no __anext__."""
+
+    def __init__(self, responses):
+        self._responses = responses
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for response in self._responses:
+            yield response
+
+
+class _FakeAsyncApi:
+    async def batch_get_documents(self, request=None):
+        return _AiterOnlyStream(["found", "missing", "found"])
+
+
+def test_async_streams_with_only_aiter_are_counted():
+    api = metrics._CountingApi(_FakeAsyncApi(), "test-async", is_async=True)
+    before = metrics.FIRESTORE_READS._values.get(("test-async",), 0)
+
+    async def read():
+        stream = await api.batch_get_documents(request={})
+        return [response async for response in stream]
+
+    assert asyncio.run(read()) == ["found", "missing", "found"]
+    assert metrics.FIRESTORE_READS._values[("test-async",)] == before + 3
@@ -0,0 +1,71 @@
+import pytest
+
+import main
+
+
+@pytest.fixture
+def profiles(api, monkeypatch):
+    monkeypatch.setattr(main, "_profile_cache", main.TTLCache(maxsize=100, ttl=main.PROFILE_CACHE_TTL_SECONDS))
+    monkeypatch.setitem(main.PROFILE_CACHE_STATS, "hits", 0)
+    monkeypatch.setitem(main.PROFILE_CACHE_STATS, "misses", 0)
+    fanned_out = []
+    monkeypatch.setattr(main.profile_fanout, "schedule", fanned_out.append)
+    api.fanned_out = fanned_out
+    return api
+
+
+def test_first_get_creates_the_profile_and_later_gets_hit_the_cache(profiles):
+    first = profiles.client.get("/users/me").json()
+    assert first["uid"] == "me" and first["name"] == "Me" and first["createdAt"]
+    stored = profiles.db.docs["users/me"]
+    assert stored["emailLower"] == "me@umass.edu"
+
+    stored["bio"] = "changed on another worker"
+    assert profiles.client.get("/users/me").json() == first  # served from memory until the TTL
+    assert main.PROFILE_CACHE_STATS == {"hits": 1, "misses": 1}
+
+
+def test_patch_writes_through_without_rereading(profiles):
+    profiles.client.get("/users/me")
+    resp = profiles.client.patch("/users/me", json={"bio": "hello", "uid": "someone-else"})
+    assert resp.status_code == 200
+    assert resp.json()["bio"] == "hello" and resp.json()["uid"] == "me"
+    assert profiles.db.docs["users/me"]["bio"] == "hello"
+    assert resp.json()["updatedAt"] is not None
+
+    del profiles.db.docs["users/me"]  # a GET that went to Firestore would recreate it
+    assert profiles.client.get("/users/me").json() == resp.json()
+    assert profiles.fanned_out == []  # bio isn't copied onto friend edges
+
+
+def test_patch_of_a_denormalized_field_schedules_the_fan_out(profiles):
+    profiles.client.get("/users/me")
+    profiles.client.patch("/users/me", json={"name": "Renamed"})
+    assert profiles.db.docs["users/me"]["nameLower"] == "renamed"
+    assert profiles.fanned_out == ["me"]
+
+
+def test_invalid_patch_changes_nothing(profiles):
+    before = profiles.client.get("/users/me").json()
+    assert profiles.client.patch("/users/me", json={"visibility": "everyone"}).status_code == 422
+    assert profiles.db.docs["users/me"]["visibility"] == "campus"
+    assert profiles.client.get("/users/me").json() == before
+
+
+def test_patch_before_any_get_creates_the_profile(profiles):
+    resp = profiles.client.patch("/users/me", json={"major": "CS"})
+    assert resp.status_code == 200
+    assert profiles.db.docs["users/me"]["major"] == "CS"
+    assert profiles.db.docs["users/me"]["roles"] == ["student"]
+
+
+def test_delete_invalidates_the_cached_profile(profiles, monkeypatch):
+    monkeypatch.setattr(main, "_deletion_jobs", {})
+    monkeypatch.setattr(main, "_deletion_finished", {})
+    monkeypatch.setattr(main, "_spawn", lambda coro: coro.close())  # no teardown against the fake
+    profiles.client.get("/users/me")
+    assert profiles.client.delete("/users/me").status_code == 202
+    assert "me" not in main._profile_cache
+
+    profiles.db.docs["users/me"]["bio"] = "from Firestore"
+    assert profiles.client.get("/users/me").json()["bio"] == "from Firestore"
@@ -0,0 +1,36 @@
+import asyncio
+
+from google.cloud import firestore
+
+from fake_firestore import FakeFirestore
+from profile_fanout import ProfileFanout, edge_fields, update_edges
+
+
+def _edge(db, owner, friend):
+    return db.collection("users").document(owner).collection("friends").document(friend)
+
+
+def test_update_edges_skips_edges_removed_meanwhile():
+    db = FakeFirestore()
+    db.docs["users/a/friends/b"] = {"name": "old"}
+    db.docs["users/a/friends/c"] = {"name": "old"}
+    updates = [(_edge(db, "a", f), edge_fields({"name": f.upper(), "photoURL": None})) for f in "bcd"]
+
+    assert asyncio.run(update_edges(db, updates)) == 2
+    assert db.docs["users/a/friends/b"]["name"] == "B"
+    assert db.docs["users/a/friends/c"]["name"] == "C"
+    assert "users/a/friends/d" not in db.docs  # update, never create
+
+
+def test_fan_out_rewrites_the_edge_under_every_friend():
+    db = FakeFirestore()
+    db.docs["users/a"] = {"name": "Ann", "photoURL": "p.png", "email": "a@umass.edu"}
+    for friend in "bc":
+        db.docs[f"users/a/friends/{friend}"] = {"since": 1}
+        db.docs[f"users/{friend}/friends/a"] = {"name": "Anne", "since": 1}
+
+    assert asyncio.run(ProfileFanout(db).fan_out("a")) == 2
+    for friend in "bc":
+        edge = db.docs[f"users/{friend}/friends/a"]
+        assert (edge["name"], edge["photoURL"], edge["since"]) == ("Ann", "p.png", 1)
+        assert edge["lastUpdated"] is not firestore.SERVER_TIMESTAMP  # resolved by the commit
@@ -0,0 +1,20 @@
+from types import SimpleNamespace
+
+import main
+import metrics
+
+
+def _runs(job, outcome="ok"):
+    return metrics.JOB_RUNS._values.get((job, outcome), 0)
+
+
+def test_reaper_run_is_timed_but_per_event_checks_are_not():
+    before = _runs("delete_expired_events")
+    snap = SimpleNamespace(to_dict=lambda: {"recurs": "M1030"})
+    assert main._is_recurring(snap)
+    assert not main._is_recurring(SimpleNamespace(to_dict=lambda: {"recurs": "bogus"}))
+    assert _runs("delete_expired_events") == before
+
+    stats = main.delete_expired_events(keep_going=lambda: False)  # stops before the first page
+    assert stats["events"] == 0 and not stats["complete"]
+    assert _runs("delete_expired_events") == before + 1
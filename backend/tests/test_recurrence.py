@@ -0,0 +1,90 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import recurrence
+from recurrence import compile_rule, getNextOccurance, next_occurrences
+
+DAYS = "MTWtFSs"
+
+
+def _matches(rule_slots, when):
+    return (when.weekday(), when.hour, when.minute) in rule_slots
+
+
+def _random_rule(rng):
+    slots = {(rng.randrange(7), rng.randrange(24), rng.randrange(60)) for _ in range(rng.randint(1, 4))}
+    return "".join(f"{DAYS[d]}{h:02d}{m:02d}" for d, h, m in slots), slots
+
+
+def _random_time(rng):
+    base = datetime(2024, 12, 20, tzinfo=timezone.utc)  # spans a month and a year boundary
+    return base + timedelta(minutes=rng.randrange(60 * 24 * 60), seconds=rng.randrange(60))
+
+
+def test_expand_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(60):
+        src, slots = _random_rule(rng)
+        start = _random_time(rng)
+        end = start + timedelta(minutes=rng.randint(0, 60 * 24 * 3))
+        minute = start.replace(second=0, microsecond=0)
+        if minute < start:
+            minute += timedelta(minutes=1)
+        expected = []
+        while minute < end:
+            if _matches(slots, minute):
+                expected.append(minute)
+            minute += timedelta(minutes=1)
+        assert list(compile_rule(src).expand(start, end)) == expected
+
+
+def test_next_after_matches_brute_force():
+    rng = random.Random(3)
+    for _ in range(60):
+        src, slots = _random_rule(rng)
+        now = _random_time(rng)
+        minute = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        while not _matches(slots, minute):
+            minute += timedelta(minutes=1)
+        assert compile_rule(src).next_after(now) == minute
+
+
+def test_next_occurrence_crosses_month_end():
+    # Friday 31 Jan -> Monday 3 Feb (the old day + dayInc arithmetic crashed here)
+    now = datetime(2025, 1, 31, 12, 0, tzinfo=timezone.utc)
+    assert getNextOccurance("M0900", now) == datetime(2025, 2, 3, 9, 0, tzinfo=timezone.utc)
+    # exactly at an occurrence: the next one is a week later
+    at = datetime(2025, 2, 3, 9, 0, tzinfo=timezone.utc)
+    assert getNextOccurance("M0900", at) == at + timedelta(weeks=1)
+
+
+@pytest.mark.parametrize("recurs", [None, "", "0", " 0 "])
+def test_non_recurring_rules_are_empty(recurs):
+    rule = compile_rule(recurs)
+    assert not rule
+    assert rule.next_after(datetime.now(timezone.utc)) is None
+    assert list(rule.expand(datetime(2025, 1, 1, tzinfo=timezone.utc), datetime(2026, 1, 1, tzinfo=timezone.utc))) == []
+
+
+@pytest.mark.parametrize("recurs", ["X1000", "M100", "M2400", "M1060", "M10a0", "M1000T"])
+def test_malformed_rules_raise(recurs):
+    with pytest.raises(ValueError):
+        compile_rule(recurs)
+
+
+def test_next_occurrences_compiles_each_rule_once(monkeypatch):
+    calls = []
+    real = recurrence.compile_rule
+
+    def counting(recurs):
+        calls.append(recurs)
+        return real(recurs)
+
+    monkeypatch.setattr(recurrence, "compile_rule", counting)
+    now = datetime(2025, 3, 3, 8, 0, tzinfo=timezone.utc)  # Monday
+    out = next_occurrences([("a", "M0900"), ("b", "M0900"), ("c", "bogus"), ("d", "0")], now)
+    assert out == {"a": datetime(2025, 3, 3, 9, 0, tzinfo=timezone.utc),
+                   "b": datetime(2025, 3, 3, 9, 0, tzinfo=timezone.utc), "c": None, "d": None}
+    assert calls == ["M0900", "bogus", "0"]
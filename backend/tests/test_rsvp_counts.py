@@ -0,0 +1,63 @@
+import main
+
+
+def _rsvp(api, uid, event_id, attending=True):
+    api.user["uid"] = uid
+    method = api.client.put if attending else api.client.delete
+    return method(f"/events/{event_id}/rsvp")
+
+
+def _counts(api, *event_ids):
+    resp = api.client.post("/events/rsvp-counts", json={"eventIds": list(event_ids)})
+    assert resp.status_code == 200
+    return resp.json()["counts"]
+
+
+def _shards(db, event_id):
+    prefix = f"events/{event_id}/{main.RSVP_SHARDS_SUBCOLLECTION}/"
+    return {path[len(prefix):]: doc for path, doc in db.docs.items() if path.startswith(prefix)}
+
+
+def test_counts_follow_rsvps_and_cancellations(api):
+    api.db.docs["events/e"] = {"title": "E"}
+    assert _counts(api, "e") == {"e": 0}  # seeds the shards
+
+    for uid in ("u1", "u2", "u3"):
+        assert _rsvp(api, uid, "e").json()["changed"]
+    assert not _rsvp(api, "u1", "e").json()["changed"]  # idempotent
+    assert _rsvp(api, "u2", "e", attending=False).json()["changed"]
+    assert not _rsvp(api, "u2", "e", attending=False).json()["changed"]
+
+    assert _counts(api, "e") == {"e": 2}
+    assert sum(doc["count"] for doc in _shards(api.db, "e").values()) == 2
+    assert api.db.docs["events/e/rsvps/u1"]["uid"] == "u1"
+    assert "users/u1/rsvps/e" in api.db.docs
+    assert "events/e/rsvps/u2" not in api.db.docs and "users/u2/rsvps/e" not in api.db.docs
+
+
+def test_rsvps_from_before_the_shards_are_counted_once(api):
+    db = api.db
+    db.docs["events/old"] = {"title": "Old"}
+    for uid in ("u1", "u2"):
+        db.docs[f"events/old/rsvps/{uid}"] = {"uid": uid}
+    # an increment on unseeded shards is relative to nothing; the first count recounts
+    _rsvp(api, "u3", "old")
+    assert _counts(api, "old") == {"old": 3}
+    assert _shards(db, "old")["0"] == {"count": 3, main.RSVP_SEEDED_FIELD: True}
+
+    _rsvp(api, "u4", "old")
+    assert _counts(api, "old", "old") == {"old": 4}
+
+
+def test_many_events_in_one_request(api):
+    for event_id, n in (("a", 2), ("b", 0), ("c", 1)):
+        api.db.docs[f"events/{event_id}"] = {}
+        _counts(api, event_id)
+        for i in range(n):
+            _rsvp(api, f"u{i}", event_id)
+    assert _counts(api, "a", "b", "c", "missing") == {"a": 2, "b": 0, "c": 1, "missing": 0}
+
+
+def test_rsvp_to_a_missing_event_is_404(api):
+    assert _rsvp(api, "u1", "nope").status_code == 404
+    assert not _shards(api.db, "nope")
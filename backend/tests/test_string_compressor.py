@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from string_compressor import FMIndex, RankBitVector, string_compressor
+
+
+def _texts():
+    rng = random.Random(7)
+    yield ""
+    yield "a"
+    yield "abracadabra"
+    yield "aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"
+    for n in (63, 64, 65, 257, 1000):
+        yield "".join(rng.choice("abcde") for _ in range(n))
+
+
+@pytest.mark.parametrize("n", [0, 1, 63, 64, 65, 255, 256, 257, 2000])
+def test_rank_select_match_brute_force(n):
+    rng = random.Random(n)
+    bits = [rng.random() < 0.3 for _ in range(n)]
+    bv = RankBitVector(bits)
+    assert len(bv) == n
+    assert list(bv) == [int(b) for b in bits]
+    for i in range(n + 1):
+        assert bv.rank1(i) == sum(bits[:i])
+        assert bv.rank0(i) == i - sum(bits[:i])
+    for bit in (0, 1):
+        positions = [i for i, b in enumerate(bits) if b == bit]
+        for k, pos in enumerate(positions, 1):
+            assert bv.select(bit, k) == pos
+        assert bv.select(bit, len(positions) + 1) == -1
+        assert bv.select(bit, 0) == -1
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+@pytest.mark.parametrize("text", list(_texts()))
+def test_wavelet_tree_matches_brute_force(text, weighted):
+    alphabet = "abcdefr"
+    weights = [text.count(c) + 1 for c in alphabet] if weighted else None
+    sc = string_compressor(alphabet, weights)
+    sc.compress(text)
+    assert len(sc) == len(text)
+    if text:
+        assert sc.decompress() == text
+    for i, c in enumerate(text):
+        assert sc.access(i) == c
+        assert sc.access_rank(i) == (c, text[:i].count(c))
+    for c in alphabet:
+        for i in range(0, len(text) + 1, max(1, len(text) // 50)):
+            assert sc.rank(c, i) == text[:i].count(c)
+        positions = [i for i, x in enumerate(text) if x == c]
+        for k, pos in enumerate(positions, 1):
+            assert sc.select(c, k) == pos
+        assert sc.select(c, len(positions) + 1) == -1
+        assert sc.count(c) == len(positions)
+
+
+def test_wavelet_tree_rejects_unknown_characters():
+    with pytest.raises(ValueError):
+        string_compressor("ab").compress("abc")
+    with pytest.raises(ValueError):
+        string_compressor("aba")
+
+
+def test_balanced_round_trip():
+    for text in ("x", "hello world", "mississippi"):
+        arr, alphabet = string_compressor.balanced_compress(text)
+        assert string_compressor.balanced_decompress(arr, alphabet) == text
+
+
+def _occurrences(text, pattern):
+    return [i for i in range(len(text) - len(pattern) + 1) if text.startswith(pattern, i)]
+
+
+@pytest.mark.parametrize("sample_rate", [1, 4, 64])
+def test_fm_index_count_and_locate_match_brute_force(sample_rate):
+    rng = random.Random(sample_rate)
+    text = "".join(rng.choice("abc ") for _ in range(3000))
+    fm = FMIndex(text, sample_rate=sample_rate)
+    assert len(fm) == len(text)
+    patterns = ["a", "ab", "abc", "cab a", " ", "zz", "aaaa"] + [text[i:i + 6] for i in range(0, 3000, 500)]
+    for p in patterns:
+        expected = _occurrences(text, p)
+        assert fm.count(p) == len(expected)
+        assert sorted(fm.locate(p)) == expected
+        assert len(list(fm.locate(p, limit=3))) == min(3, len(expected))
+
+
+def test_fm_index_documents_match_brute_force():
+    rng = random.Random(3)
+    docs = ["".join(rng.choice("xyz") for _ in range(rng.randint(0, 40))) for _ in range(200)]
+    fm = FMIndex("\x02".join(docs), "\x02", sample_rate=8)
+    assert fm.documents() == len(docs)
+    for p in ("x", "xy", "zzy", "yyyy"):
+        expected = sorted((d, off) for d, doc in enumerate(docs) for off in _occurrences(doc, p))
+        assert sorted(fm.locate_docs(p)) == expected
+    # a pattern can't span documents
+    assert fm.count("x\x02y") == 0
+
+
+def test_fm_index_rejects_terminator():
+    with pytest.raises(ValueError):
+        FMIndex("a\0b")
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(main, "_token_cache", main.TLRUCache(
+        maxsize=main.TOKEN_CACHE_MAXSIZE, ttu=lambda _key, value, _now: value[0], timer=time.time))
+    monkeypatch.setitem(main.TOKEN_CACHE_STATS, "hits", 0)
+    monkeypatch.setitem(main.TOKEN_CACHE_STATS, "misses", 0)
+
+
+@pytest.fixture
+def verify(monkeypatch):
+    """Stands in for fb_auth.verify_id_token; tokens map to claims (or an exception)."""
+    tokens = {}
+    calls = []
+
+    def verify_id_token(token):
+        calls.append(token)
+        claims = tokens[token]
+        if isinstance(claims, Exception):
+            raise claims
+        return claims
+
+    monkeypatch.setattr(main.fb_auth, "verify_id_token", verify_id_token)
+    return SimpleNamespace(tokens=tokens, calls=calls)
+
+
+def _claims(email="a@umass.edu", exp_in=3600, **extra):
+    return {"uid": "a", "email": email, "exp": time.time() + exp_in, **extra}
+
+
+def _verify(token):
+    req = SimpleNamespace(headers={"Authorization": f"Bearer {token}"})
+    return asyncio.run(main.verify_token(req))
+
+
+def test_repeat_token_is_verified_once(verify):
+    verify.tokens["t"] = _claims()
+    assert _verify("t")["uid"] == "a"
+    assert _verify("t")["uid"] == "a"
+    assert verify.calls == ["t"]
+    assert main.TOKEN_CACHE_STATS == {"hits": 1, "misses": 1}
+
+
+def test_entry_expires_with_the_token(verify):
+    verify.tokens["t"] = _claims(exp_in=-1)
+    _verify("t")
+    _verify("t")
+    assert verify.calls == ["t", "t"]
+
+
+def test_claim_checks_are_cached_with_the_claims(verify):
+    verify.tokens["gmail"] = _claims(email="a@gmail.com")
+    verify.tokens["unverified"] = _claims(email_verified=False, firebase={"sign_in_provider": "password"})
+    for token in ("gmail", "unverified"):
+        for _ in range(2):
+            with pytest.raises(HTTPException) as err:
+                _verify(token)
+            assert err.value.status_code == 403
+    assert verify.calls == ["gmail", "unverified"]
+
+
+def test_bad_tokens_are_not_cached(verify):
+    verify.tokens["bad"] = ValueError("bad signature")
+    for _ in range(2):
+        with pytest.raises(HTTPException) as err:
+            _verify("bad")
+        assert err.value.status_code == 401
+    assert verify.calls == ["bad", "bad"]
+    assert len(main._token_cache) == 0
+
+
+def test_stats_endpoint_needs_the_metrics_token(monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "s3cret")
+    client = TestClient(main.app)  # not entered: no lifespan, nothing touches Firestore
+    assert client.get("/auth/token-cache").status_code == 401
+    resp = client.get("/auth/token-cache", headers={"Authorization": "Bearer s3cret"})
+    assert resp.status_code == 200
+    assert resp.json() == {"hits": 0, "misses": 0, "size": 0, "maxsize": main.TOKEN_CACHE_MAXSIZE}
+    assert "/auth/token-cache" not in client.get("/openapi.json").json()["paths"]
@@ -0,0 +1,90 @@
+import random
+import re
+
+from user_index import UserPrefixIndex, _tokens
+
+FIRST = ["Ana", "Ben", "Chloé", "Dev", "Eli", "Jane", "Jan", "Omar"]
+LAST = ["Smith", "Smithers", "Lee", "O'Neil", "Nguyen", "Garcia"]
+
+
+def _users(n, seed=2):
+    rng = random.Random(seed)
+    users = {}
+    for i in range(n):
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        users[f"u{i}"] = {
+            "name": f"{first} {last}" if rng.random() < 0.9 else "",
+            "email": f"{first.lower()}.{i}@campus.edu",
+            "photoURL": f"p{i}",
+            "visibility": "private" if rng.random() < 0.1 else "campus",
+        }
+    return users
+
+
+def _brute(users, q, exclude_uid=None):
+    words = [w for w in re.split(r"[^\w]+", q.strip().lower()) if w]
+    out = set()
+    for uid, data in users.items():
+        if uid == exclude_uid or data["visibility"] == "private":
+            continue
+        tokens = _tokens(data["name"], data["email"])
+        if all(any(t.startswith(w) for t in tokens) for w in words):
+            out.add(uid)
+    return out
+
+
+def _index(users):
+    idx = UserPrefixIndex()
+    for uid, data in users.items():
+        idx.upsert(uid, data)
+    return idx
+
+
+QUERIES = ["j", "jan", "jane", "smi", "smith", "jane smi", "smi jane", "o", "neil", "chloé",
+           "ana.3", "@campus", "campus.edu", "zz", "lee ben"]
+
+
+def test_search_matches_brute_force():
+    users = _users(300)
+    idx = _index(users)
+    for q in QUERIES:
+        got = idx.search(q, limit=len(users))
+        assert {r["uid"] for r in got} == _brute(users, q), q
+        assert len(got) == len({r["uid"] for r in got})
+
+
+def test_limit_and_exclude():
+    users = _users(300)
+    idx = _index(users)
+    assert len(idx.search("j", limit=5)) == 5
+    some = next(iter(_brute(users, "jane")))
+    assert some not in {r["uid"] for r in idx.search("jane", limit=1000, exclude_uid=some)}
+
+
+def test_updates_and_removals():
+    users = _users(200)
+    idx = _index(users)
+    rng = random.Random(9)
+    for uid in rng.sample(sorted(users), 60):
+        users[uid] = {**users[uid], "name": "Zed Quinn", "visibility": "campus"}
+        idx.upsert(uid, users[uid])
+    for uid in rng.sample(sorted(users), 40):
+        del users[uid]
+        idx.remove(uid)
+    assert len(idx) == len(users)
+    for q in QUERIES + ["zed", "quinn z"]:
+        assert {r["uid"] for r in idx.search(q, limit=1000)} == _brute(users, q), q
+
+
+def test_removed_tokens_are_pruned():
+    idx = UserPrefixIndex()
+    idx.upsert("u1", {"name": "Xavier Yu", "email": "x@y.z"})
+    idx.remove("u1")
+    assert idx._root.children == {}
+    assert idx.get("u1") is None
+
+
+def test_get_display_fields():
+    idx = UserPrefixIndex()
+    idx.upsert("u1", {"email": "sam@campus.edu", "visibility": "private"})
+    assert idx.get("u1") == {"uid": "u1", "name": "sam", "photoURL": "", "visibility": "private"}
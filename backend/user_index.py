@@ -0,0 +1,229 @@
+"""
+In-process prefix index over users for /friends/search typeahead.
+
+Built from the initial snapshot of an `on_snapshot` listener on `users` and kept
+current by the same listener, so queries never touch Firestore. Every user is
+indexed under several tokens (each word of the name, the full name, the email
+and its local part), which gives word-start matches anywhere in the name, e.g.
+"smi" finds "Jane Smith". Multi-word queries require every query word to prefix
+some token of the user.
+"""
+
+import re
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+
+_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+# Upper bound on candidates pulled for the lead word of a multi-word query
+MULTIWORD_CANDIDATES = 2000
+
+
+class _Node:
+    __slots__ = ("children", "uids")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.uids: Optional[set] = None  # uids whose token ends exactly here
+
+
+class _Entry:
+    __slots__ = ("name", "photoURL", "visibility", "tokens")
+
+    def __init__(self, name: str, photoURL: str, visibility: str, tokens: frozenset):
+        self.name = name
+        self.photoURL = photoURL
+        self.visibility = visibility
+        self.tokens = tokens
+
+
+def _tokens(name: str, email: str) -> frozenset:
+    name = (name or "").strip().lower()
+    email = (email or "").strip().lower()
+    out = set()
+    if name:
+        out.add(name)
+        out.update(w for w in _WORD_RE.split(name) if w)
+    if email:
+        out.add(email)
+        out.add(email.split("@")[0])
+    return frozenset(out)
+
+
+def merge_search_results(snaps: Iterable, exclude_uid: Optional[str] = None, limit: int = 20) -> List[dict]:
+    """
+    Merge user snapshots from several Firestore prefix queries (the fallback
+    while the index loads): first occurrence wins, private profiles skipped.
+    """
+    seen = set()
+    out = []
+    for snap in snaps:
+        if snap.id in seen or snap.id == exclude_uid:
+            continue
+        seen.add(snap.id)
+        d = snap.to_dict() or {}
+        # respect basic visibility ("private" hidden)
+        if d.get("visibility") == "private":
+            continue
+        out.append({
+            "uid": snap.id,
+            "name": d.get("name") or (d.get("email") or "").split("@")[0],
+            "photoURL": d.get("photoURL") or "",
+        })
+        if len(out) >= limit:
+            break
+    return out
+
+
+def _query_words(q: str) -> List[str]:
+    return [w for w in _WORD_RE.split((q or "").strip().lower()) if w]
+
+
+class UserPrefixIndex:
+    def __init__(self):
+        self._root = _Node()
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.RLock()
+        self._watch = None
+        self.ready = threading.Event()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- mutation ---
+
+    def upsert(self, uid: str, data: dict):
+        name = data.get("name") or (data.get("email") or "").split("@")[0]
+        tokens = _tokens(data.get("name") or "", data.get("email") or "")
+        entry = _Entry(name, data.get("photoURL") or "", data.get("visibility") or "campus", tokens)
+        with self._lock:
+            old = self._entries.get(uid)
+            if old is not None:
+                for t in old.tokens - tokens:
+                    self._remove_token(t, uid)
+                added = tokens - old.tokens
+            else:
+                added = tokens
+            for t in added:
+                self._add_token(t, uid)
+            self._entries[uid] = entry
+
+    def remove(self, uid: str):
+        with self._lock:
+            old = self._entries.pop(uid, None)
+            if old is None:
+                return
+            for t in old.tokens:
+                self._remove_token(t, uid)
+
+    def _add_token(self, token: str, uid: str):
+        node = self._root
+        for ch in token:
+            nxt = node.children.get(ch)
+            if nxt is None:
+                nxt = node.children[ch] = _Node()
+            node = nxt
+        if node.uids is None:
+            node.uids = set()
+        node.uids.add(uid)
+
+    def _remove_token(self, token: str, uid: str):
+        path = [self._root]
+        for ch in token:
+            nxt = path[-1].children.get(ch)
+            if nxt is None:
+                return
+            path.append(nxt)
+        leaf = path[-1]
+        if leaf.uids:
+            leaf.uids.discard(uid)
+            if not leaf.uids:
+                leaf.uids = None
+        # prune now-empty branches bottom-up
+        for i in range(len(token), 0, -1):
+            node = path[i]
+            if node.uids or node.children:
+                break
+            del path[i - 1].children[token[i - 1]]
+
+    # --- queries ---
+
+    def get(self, uid: str) -> Optional[dict]:
+        """Display fields for one user, or None if unknown."""
+        with self._lock:
+            e = self._entries.get(uid)
+            if e is None:
+                return None
+            return {"uid": uid, "name": e.name, "photoURL": e.photoURL, "visibility": e.visibility}
+
+    def _find(self, prefix: str) -> Optional[_Node]:
+        node = self._root
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def _iter_uids(self, prefix: str) -> Iterator[str]:
+        """uids with a token starting with prefix, lexicographic by token; may repeat."""
+        start = self._find(prefix)
+        if start is None:
+            return
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            if node.uids:
+                yield from node.uids
+            # reversed so the smallest character is popped first
+            stack.extend(node.children[c] for c in sorted(node.children, reverse=True))
+
+    def search(self, q: str, limit: int = 20, exclude_uid: Optional[str] = None) -> List[dict]:
+        """Users whose tokens match every word of q. Private profiles are skipped."""
+        words = _query_words(q)
+        if not words:
+            return []
+        lead = max(words, key=len)
+        rest = list(words)
+        rest.remove(lead)
+
+        out = []
+        seen = set()
+        with self._lock:
+            for n, uid in enumerate(self._iter_uids(lead)):
+                if rest and n >= MULTIWORD_CANDIDATES:
+                    break
+                if uid in seen or uid == exclude_uid:
+                    continue
+                seen.add(uid)
+                e = self._entries[uid]
+                if e.visibility == "private":
+                    continue
+                if rest and not all(any(t.startswith(w) for t in e.tokens) for w in rest):
+                    continue
+                out.append({"uid": uid, "name": e.name, "photoURL": e.photoURL})
+                if len(out) >= limit:
+                    break
+        return out
+
+    # --- Firestore listener ---
+
+    def _on_snapshot(self, _docs, changes, _read_time):
+        for change in changes:
+            doc = change.document
+            if change.type.name == "REMOVED":
+                self.remove(doc.id)
+            else:
+                self.upsert(doc.id, doc.to_dict() or {})
+        # the first callback carries the whole collection as ADDED changes
+        self.ready.set()
+
+    def watch(self, users_col):
+        """Start the listener; the index answers queries once `ready` is set."""
+        self._watch = users_col.on_snapshot(self._on_snapshot)
+        return self._watch
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        self.ready.clear()
@@ -34,10 +34,6 @@ import {
   Timestamp,
   doc,
   getDoc,
-  setDoc,
-  deleteDoc,
-  serverTimestamp,
-  getCountFromServer,
 } from "firebase/firestore";
 
 type EventItem = {
@@ -1007,17 +1003,24 @@ function EventDetailsModal({
     })();
   }, [eventId]);
 
-  // Load RSVP count
+  // Load RSVP count (sharded counter on the backend)
   useEffect(() => {
     (async () => {
       try {
-        const c = await getCountFromServer(collection(db, "events", eventId, "rsvps"));
-        setRsvpCount(c.data().count);
+        const token = await currentUser.getIdToken();
+        const res = await fetch("/api/events/rsvp-counts", {
+          method: "POST",
+          headers: { "Content-Type": "application/json", Authorization: `Bearer ${token}` },
+          body: JSON.stringify({ eventIds: [eventId] }),
+        });
+        if (!res.ok) return;
+        const data = await res.json();
+        setRsvpCount(Number(data.counts?.[eventId] ?? 0));
       } catch (e) {
         // ignore count errors
       }
     })();
-  }, [eventId]);
+  }, [eventId, currentUser]);
 
   // Check my RSVP doc (existence == attending)
   useEffect(() => {
@@ -1054,16 +1057,17 @@ function EventDetailsModal({
     setSaving(true);
     setErr(null);
     try {
-      // 1. Write to the event's RSVP list (Original logic, used for event attendance count)
-      const myEventRef = doc(db, "events", eventId, "rsvps", currentUser.uid);
-      await setDoc(myEventRef, { uid: currentUser.uid, attending: true, createdAt: serverTimestamp() }, { merge: true });
-
-      // 2. NEW: Write to the user's RSVP list (Denormalized for the Calendar view)
-      const myUserRef = doc(db, "users", currentUser.uid, "rsvps", eventId);
-      await setDoc(myUserRef, { attending: true, createdAt: serverTimestamp() }); // Placeholder doc
+      // Backend writes events/{id}/rsvps/{uid}, the users/{uid}/rsvps mirror and the count shard together
+      const token = await currentUser.getIdToken();
+      const res = await fetch(`/api/events/${encodeURIComponent(eventId)}/rsvp`, {
+        method: "PUT",
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      if (!res.ok) throw new Error(await res.text());
+      const data = await res.json();
 
       setAttending(true);
-      setRsvpCount((c) => c + 1);
+      if (data.changed) setRsvpCount((c) => c + 1);
     } catch (e: any) {
       setErr(e?.message ?? "Failed to RSVP");
     } finally {
@@ -1075,16 +1079,16 @@ function EventDetailsModal({
     setSaving(true);
     setErr(null);
     try {
-      // 1. Delete from the event's RSVP list (Original logic)
-      const myEventRef = doc(db, "events", eventId, "rsvps", currentUser.uid);
-      await deleteDoc(myEventRef);
+      const token = await currentUser.getIdToken();
+      const res = await fetch(`/api/events/${encodeURIComponent(eventId)}/rsvp`, {
+        method: "DELETE",
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      if (!res.ok) throw new Error(await res.text());
+      const data = await res.json();
 
-      // 2. NEW: Delete from the user's RSVP list (Denormalized cleanup)
-      const myUserRef = doc(db, "users", currentUser.uid, "rsvps", eventId);
-      await deleteDoc(myUserRef);
-      
       setAttending(false);
-      setRsvpCount((c) => Math.max(0, c - 1));
+      if (data.changed) setRsvpCount((c) => Math.max(0, c - 1));
     } catch (e: any) {
       setErr(e?.message ?? "Failed to cancel");
     } finally {
@@ -79,6 +79,7 @@ export default function Profile() {
   const [saving, setSaving] = useState(false);
   const [saved, setSaved] = useState(false);
   const [showDeleteModal, setShowDeleteModal] = useState(false);
+  const [deleting, setDeleting] = useState(false);
   
   function openDeleteModal() {
     setShowDeleteModal(true);
@@ -194,22 +195,36 @@ export default function Profile() {
   async function handleDeleteAccount() {
   const auth = getAuth();
   const idToken = await auth.currentUser.getIdToken();
+  const headers = { Authorization: `Bearer ${idToken}` };
+
+  setDeleting(true);
+  try {
+    // the server answers 202 and deletes in the background; poll until it reports an outcome
+    const res = await fetch("/api/users/me", { method: "DELETE", headers });
+    const data = await res.json();
+    if (!res.ok) {
+      alert("Failed to delete account: " + data.detail);
+      return;
+    }
+
+    let job = data.deletion;
+    while (job?.state === "running") {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      const poll = await fetch("/api/users/me/deletion", { headers });
+      if (poll.ok) job = await poll.json();
+    }
 
-  const res = await fetch("/api/users/me", {
-    method: "DELETE",
-    headers: {
-      Authorization: `Bearer ${idToken}`,
-    },
-  });
-
-  const data = await res.json();
-
-  if (res.ok) {
-    alert("Your account has been deleted.");
-    await auth.signOut();
-    window.location.href = "/";
-  } else {
-    alert("Failed to delete account: " + data.detail);
+    if (job?.state === "done") {
+      alert("Your account has been deleted.");
+      await auth.signOut();
+      window.location.href = "/";
+    } else {
+      alert("Failed to delete account: " + (job?.error || "unknown error"));
+    }
+  } catch (e: any) {
+    alert("Failed to delete account: " + (e?.message || e));
+  } finally {
+    setDeleting(false);
   }
 }
 
@@ -530,15 +545,17 @@ export default function Profile() {
                 <div className="flex justify-end space-x-3">
                  <button
                    onClick={closeDeleteModal}
+                    disabled={deleting}
                     className="px-4 py-2 bg-gray-200 hover:bg-gray-300 rounded-lg"
                   >
                     Cancel
                   </button>
                   <button
                     onClick={handleDeleteAccount}
+                    disabled={deleting}
                     className="px-4 py-2 bg-red-600 hover:bg-red-700 text-white rounded-lg"
                   >
-                    Confirm Delete
+                    {deleting ? "Deleting…" : "Confirm Delete"}
                   </button>
                 </div>
               </div>